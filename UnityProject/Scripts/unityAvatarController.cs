@@ -36,6 +36,11 @@ public class UnityAvatarController : MonoBehaviour
             string audioPath = Path.Combine(Application.streamingAssetsPath, "reply.wav");
             StartCoroutine(PlayReply(audioPath));
         }
+        else if (json.type == "mouth")
+        {
+            // Streamed from the Python output bus, already in sync with the audio
+            avatarMouth.SetBlendShapeWeight(0, json.value * 100f);
+        }
         else if (json.type == "head_pose")
         {
             headBone.localRotation = Quaternion.Euler(json.data.pitch, json.data.yaw, json.data.roll);
@@ -91,6 +96,7 @@ public class UnityAvatarController : MonoBehaviour
     {
         public string type;
         public string text;
+        public float value;
         public PoseData data;
     }
 
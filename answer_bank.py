@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+import logging
+from itertools import combinations
+
+from knowledge_base import MINAT_BAKAT_MAPPING
+
+logger = logging.getLogger(__name__)
+
+BANK_VERSION = 2
+
+# Answer templates; the bank's source hashes cover their text and the voice,
+# so editing either rebuilds the affected entries (see template_version)
+SINGLE_TEMPLATE = ("Kalau kamu berminat di bidang {category}, jurusan di Universitas Brawijaya yang cocok "
+                   "antara lain {majors}. Mau saya jelaskan lebih lanjut salah satunya?")
+PAIR_TEMPLATE = ("Minat kamu di bidang {first} dan {second} bisa diarahkan ke jurusan {majors}. "
+                 "Coba pikirkan mata pelajaran yang paling kamu nikmati, lalu kita pilih yang paling pas ya!")
+
+# Words visitors actually use for each interest category
+INTEREST_KEYWORDS = {
+    "teknologi": ["teknologi", "komputer", "coding", "programming", "pemrograman", "informatika", "robot", "elektronik", "it"],
+    "sains": ["sains", "matematika", "fisika", "kimia", "biologi", "statistika", "ipa", "eksperimen"],
+    "sosial": ["sosial", "politik", "masyarakat", "sosiologi", "ips"],
+    "bisnis": ["bisnis", "ekonomi", "manajemen", "akuntansi", "usaha", "wirausaha", "keuangan"],
+    "kesehatan": ["kesehatan", "kedokteran", "dokter", "perawat", "medis", "rumah sakit"],
+    "pendidikan": ["pendidikan", "guru", "mengajar", "keguruan"],
+    "pertanian": ["pertanian", "tanaman", "agronomi", "pangan", "perkebunan"],
+    "seni": ["seni", "menggambar", "desain", "sastra", "musik", "lukis"],
+    "hukum": ["hukum", "pengacara", "hakim", "jaksa", "notaris"],
+    "komunikasi": ["komunikasi", "jurnalistik", "bahasa", "public speaking", "media"],
+}
+# An interest statement needs one of these before the keyword in the same clause
+_INTEREST_CUES = re.compile(r"\b(suka|senang|seneng|minat|berminat|minatku|tertarik|hobi|hobiku|hobinya|passion|"
+                            r"bakat|bakatku|cita-cita|bercita-cita|(?:mau|ingin|pengen|pingin) jadi)\b")
+_NEGATIONS = re.compile(r"\b(tidak|tak|nggak|ngga|gak|ga|enggak|engga|bukan|kurang|benci)\b")
+# Lookups name an interest too ("jurusan apa saja di Fakultas Hukum"); they go to the router or LLM
+_QUESTION = re.compile(r"\?|\b(apa|apakah|mana|kapan|berapa|bagaimana|gimana|siapa|syarat|ada jurusan)\b")
+_CLAUSES = re.compile(r"[,.;!?]|\b(tapi|tetapi|namun|sedangkan|sementara|cuma|hanya saja)\b")
+_KEYWORDS = re.compile(r"\b(" + "|".join(sorted({re.escape(w) for ws in INTEREST_KEYWORDS.values() for w in ws},
+                                                 key=len, reverse=True)) + r")\b")
+_KEYWORD_CATEGORY = {w: c for c, ws in INTEREST_KEYWORDS.items() for w in ws}
+
+
+def entry_key(categories):
+    return "minat:" + "+".join(sorted(categories))
+
+
+def classify_interests(user_input, awaiting_interests=False):
+    """Bank key for an utterance stating one or two interests, else None.
+
+    A keyword counts when an interest cue ("aku suka ...", "minatku ...")
+    precedes it in its clause without a negation ("tidak suka matematika").
+    Right after the assistant asked for the visitor's interests
+    (`awaiting_interests`), bare answers like "matematika dan fisika" count
+    too, unless the utterance is a question.
+    """
+    text = user_input.lower()
+    bare = awaiting_interests and not _QUESTION.search(text)
+    found = []
+    for clause in _CLAUSES.split(text):
+        if not clause:
+            continue
+        for match in _KEYWORDS.finditer(clause):
+            before = clause[:match.start()]
+            if _NEGATIONS.search(before) or not (bare or _INTEREST_CUES.search(before)):
+                continue
+            category = _KEYWORD_CATEGORY[match.group(1)]
+            if category not in found:
+                found.append(category)
+    if not found or len(found) > 2:
+        return None
+    return entry_key(found)
+
+
+def _join(items):
+    items = list(items)
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " dan " + items[-1]
+
+
+def compose_answer(categories, mapping=MINAT_BAKAT_MAPPING):
+    """Deterministic recommendation text for one or two interest categories"""
+    if len(categories) == 1:
+        category = categories[0]
+        return SINGLE_TEMPLATE.format(category=category, majors=_join(mapping[category][:3]))
+    first, second = categories
+    shared = [m for m in mapping[first] if m in mapping[second]]
+    rest = [m for m in mapping[first][:2] + mapping[second][:2] if m not in shared]
+    return PAIR_TEMPLATE.format(first=first, second=second, majors=_join((shared + rest)[:4]))
+
+
+def template_version(voice=None):
+    """Hash of the answer templates and the voice that speaks them"""
+    source = json.dumps([SINGLE_TEMPLATE, PAIR_TEMPLATE, voice], ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def source_entries(mapping=MINAT_BAKAT_MAPPING, voice=None):
+    """Every bank entry with a hash of exactly the data its answer depends on"""
+    entries = {}
+    version = template_version(voice)
+    groups = [(c,) for c in mapping] + list(combinations(sorted(mapping), 2))
+    for categories in groups:
+        source = json.dumps([version] + [[c, mapping[c]] for c in categories], ensure_ascii=False)
+        entries[entry_key(categories)] = {
+            "categories": list(categories),
+            "hash": hashlib.sha256(source.encode("utf-8")).hexdigest()[:16],
+        }
+    return entries
+
+
+def text_key(text):
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerBank:
+    """Read side: index in JSON, PCM in one memory-mapped blob"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.sample_rate = self.index["sample_rate"]
+        self.entries = self.index["entries"]
+        self._by_text = {e["text_key"]: key for key, e in self.entries.items()}
+        self._file = open(os.path.join(directory, "audio.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def text(self, key):
+        return self.entries[key]["text"]
+
+    def audio(self, key):
+        """Zero-copy view of the entry's 16-bit PCM"""
+        entry = self.entries[key]
+        return memoryview(self._blob)[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def audio_for_text(self, text):
+        key = self._by_text.get(text_key(text))
+        return None if key is None else self.audio(key)
+
+    def close(self):
+        if self._blob:
+            self._blob.close()
+        self._file.close()
+
+
+def build(directory, synthesize, sample_rate, mapping=MINAT_BAKAT_MAPPING, voice=None):
+    """Rebuild the bank, synthesizing only entries whose source hash changed.
+
+    `voice` names what `synthesize` speaks with (provider, voice or model);
+    changing it re-synthesizes every entry.
+    """
+    os.makedirs(directory, exist_ok=True)
+    old_index, old_blob = {}, b""
+    try:
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("version") == BANK_VERSION and previous.get("sample_rate") == sample_rate:
+            old_index = previous["entries"]
+            with open(os.path.join(directory, "audio.bin"), "rb") as f:
+                old_blob = f.read()
+    except FileNotFoundError:
+        pass
+
+    entries = {}
+    rebuilt = reused = 0
+    tmp_blob = os.path.join(directory, "audio.bin.tmp")
+    with open(tmp_blob, "wb") as blob:
+        for key, source in source_entries(mapping, voice).items():
+            old = old_index.get(key)
+            if old and old["hash"] == source["hash"]:
+                text = old["text"]
+                audio = old_blob[old["offset"]:old["offset"] + old["length"]]
+                reused += 1
+            else:
+                text = compose_answer(source["categories"], mapping)
+                audio = synthesize(text)
+                rebuilt += 1
+            entries[key] = {"hash": source["hash"], "text": text, "text_key": text_key(text),
+                            "offset": blob.tell(), "length": len(audio)}
+            blob.write(audio)
+
+    tmp_index = os.path.join(directory, "index.json.tmp")
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump({"version": BANK_VERSION, "sample_rate": sample_rate,
+                   "template_version": template_version(voice), "entries": entries},
+                  f, ensure_ascii=False, indent=1)
+    # Swap both files in only once the new bundle is complete
+    os.replace(tmp_blob, os.path.join(directory, "audio.bin"))
+    os.replace(tmp_index, os.path.join(directory, "index.json"))
+    logger.info("Answer bank: %d rebuilt, %d reused", rebuilt, reused)
+    return rebuilt, reused
+
+
+if __name__ == '__main__':
+    # python answer_bank.py [OUT_DIR]; synthesizer order comes from TTS_PROVIDERS
+    from dotenv import load_dotenv
+    from providers import build_pipeline_from_env
+    from tts_pipeline import ParallelTTS
+    from language_id import LANGUAGES, DEFAULT_LANGUAGE
+
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+    out = sys.argv[1] if len(sys.argv) > 1 else "answer_bank"
+    pipeline = build_pipeline_from_env(os.getenv("AZURE_SPEECH_KEY"), os.getenv("AZURE_SPEECH_REGION"))
+    tts = ParallelTTS(pipeline.synthesize)
+    providers = os.getenv("TTS_PROVIDERS", "azure")
+    voice = f"{providers}:{LANGUAGES[DEFAULT_LANGUAGE]['voice']}:{os.getenv('PIPER_MODEL', '')}"
+    print("rebuilt %d, reused %d" % build(out, tts.synthesize_all, tts.sample_rate, voice=voice))
@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("queue", "replace", "duck")
+
+
+class _Voice:
+    """Buffered audio of one reply"""
+
+    __slots__ = ("blocks", "offset", "queued", "finished")
+
+    def __init__(self):
+        self.blocks = deque()
+        self.offset = 0  # samples already played from blocks[0]
+        self.queued = 0
+        self.finished = False
+
+    def pull(self, n):
+        out = np.zeros(n, dtype=np.float32)
+        filled = 0
+        while filled < n and self.blocks:
+            block = self.blocks[0]
+            take = min(n - filled, block.size - self.offset)
+            out[filled:filled + take] = block[self.offset:self.offset + take]
+            filled += take
+            self.offset += take
+            if self.offset == block.size:
+                self.blocks.popleft()
+                self.offset = 0
+        self.queued -= filled
+        return out, filled
+
+    @property
+    def drained(self):
+        return self.finished and self.queued == 0
+
+
+class OutputDevice:
+    """Long-lived output stream shared by every reply.
+
+    The backend pulls audio through render() (PortAudio's callback, or a
+    clock thread for the null device), so PortAudio is initialized once.
+    Each reply writes into its own voice; `policy` decides what happens when
+    a reply arrives while another is still playing:
+
+    - queue: the new reply waits until the current one has drained
+    - replace: older replies are dropped (barge-in)
+    - duck: replies mix, older ones attenuated by `duck_db`
+
+    write() blocks while the device holds more than `max_buffer_s` of audio
+    across all voices, or when a new reply would exceed `max_voices`, so
+    producers can never run arbitrarily far ahead of the device. It only
+    waits while the playing voice has audio to drain: when that voice is
+    starved, its next frames may be queued behind this very write. A write
+    that still finds no room after `write_timeout_s` is dropped rather than
+    waiting forever.
+    """
+
+    def __init__(self, rate, backend="pyaudio", policy="queue", duck_db=-12.0, block_ms=20,
+                 max_buffer_s=30.0, max_voices=8, write_timeout_s=10.0, device_index=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown output policy {policy!r}, expected one of {POLICIES}")
+        self.rate = rate
+        self.policy = policy
+        self.duck_gain = 10 ** (duck_db / 20)
+        self.block = int(rate * block_ms / 1000)
+        self.max_buffer = int(rate * max_buffer_s)
+        self.max_voices = max_voices
+        self.write_timeout = write_timeout_s
+        self._voices = OrderedDict()
+        self._space = threading.Condition()
+        self.rendered = 0
+        self.underruns = 0
+        self.dropped = 0
+        self.peak_queued = 0
+        if backend == "pyaudio":
+            self.backend = PyAudioBackend(self, device_index)
+        elif backend == "null":
+            self.backend = NullBackend(self)
+        else:
+            self.backend = backend  # any object with close(); it calls render() itself
+
+    def write(self, reply_id, pcm):
+        """Queue 16-bit mono PCM for a reply"""
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+        with self._space:
+            voice = self._voices.get(reply_id)
+            if voice is None and self.policy == "replace":
+                for old in self._voices.values():
+                    self.dropped += old.queued
+                self._voices.clear()
+            deadline = time.monotonic() + self.write_timeout
+            while True:
+                self._reap()
+                if voice is not None and reply_id not in self._voices:
+                    return  # replaced or flushed while waiting for space
+                queued = self._queued()
+                if (voice is not None or len(self._voices) < self.max_voices) and \
+                        (queued == 0 or queued + samples.size <= self.max_buffer):
+                    break
+                if not self._draining():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Output device full for %.1fs, dropping %d ms of reply %s",
+                                   self.write_timeout, 1000 * samples.size // self.rate, reply_id)
+                    self.dropped += samples.size
+                    return
+                self._space.wait(min(remaining, 0.5))
+            if voice is None:
+                voice = self._voices[reply_id] = _Voice()
+            voice.blocks.append(samples)
+            voice.queued += samples.size
+            self.peak_queued = max(self.peak_queued, queued + samples.size)
+
+    def _reap(self):
+        for reply_id in [r for r, v in self._voices.items() if v.drained]:
+            del self._voices[reply_id]
+
+    def _queued(self):
+        return sum(v.queued for v in self._voices.values())
+
+    def _draining(self):
+        """Whether render() is currently consuming audio, i.e. waiting will make room"""
+        playing = [v for v in self._voices.values() if not v.drained]
+        if self.policy == "queue":
+            playing = playing[:1]
+        return any(v.queued for v in playing)
+
+    def end(self, reply_id):
+        """No more audio for this reply; under "queue" the next one may start once it drains"""
+        with self._space:
+            voice = self._voices.get(reply_id)
+            if voice is not None:
+                voice.finished = True
+
+    def flush(self):
+        """Drop everything queued, e.g. when the turn is cancelled"""
+        with self._space:
+            for voice in self._voices.values():
+                self.dropped += voice.queued
+            self._voices.clear()
+            self._space.notify_all()
+
+    def render(self, n):
+        """Next n samples as int16 bytes; called from the backend's audio thread"""
+        with self._space:
+            # Drop finished voices first so a queued reply can start in this block
+            self._reap()
+            voices = list(self._voices.values())
+            mix = np.zeros(n, dtype=np.float32)
+            starved = bool(voices)
+            if self.policy == "queue":
+                # The next reply starts in the same block the previous one ends in,
+                # so back-to-back replies are not each padded to a block boundary
+                filled = 0
+                for voice in voices:
+                    samples, pulled = voice.pull(n - filled)
+                    mix[filled:filled + pulled] = samples[:pulled]
+                    filled += pulled
+                    if filled == n or not voice.drained:
+                        break
+                starved = starved and filled < n and not voice.finished
+                overlapping = False
+            else:
+                for i, voice in enumerate(voices):
+                    samples, filled = voice.pull(n)
+                    gain = self.duck_gain if i < len(voices) - 1 else 1.0
+                    mix += gain * samples
+                    starved = starved and filled < n and not voice.finished
+                overlapping = len(voices) > 1
+            if starved:
+                self.underruns += 1
+            self.rendered += n
+            self._space.notify_all()
+        if overlapping:
+            mix = np.tanh(mix)  # soft clip where ducked replies overlap
+        return (np.clip(mix, -1.0, 32767 / 32768) * 32768).astype(np.int16).tobytes()
+
+    def busy(self):
+        with self._space:
+            return any(not v.drained for v in self._voices.values())
+
+    def stats(self):
+        with self._space:
+            return {
+                "policy": self.policy,
+                "voices": len(self._voices),
+                "queued_ms": round(1000 * self._queued() / self.rate),
+                "peak_queued_ms": round(1000 * self.peak_queued / self.rate),
+                "rendered_s": round(self.rendered / self.rate, 1),
+                "underruns": self.underruns,
+                "dropped_ms": round(1000 * self.dropped / self.rate),
+            }
+
+    def close(self):
+        self.backend.close()
+
+
+class PyAudioBackend:
+    """One callback-driven PortAudio stream for the lifetime of the process"""
+
+    def __init__(self, device, device_index=None):
+        import pyaudio
+        self._pyaudio = pyaudio
+        self.device = device
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(format=pyaudio.paInt16, channels=1, rate=device.rate, output=True,
+                                     output_device_index=device_index, frames_per_buffer=device.block,
+                                     stream_callback=self._callback)
+        self._stream.start_stream()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        return self.device.render(frame_count), self._pyaudio.paContinue
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pa.terminate()
+
+
+class NullBackend:
+    """Clock thread standing in for a sound card; `speed` > 1 runs faster than real time"""
+
+    def __init__(self, device, speed=1.0):
+        self.device = device
+        self.speed = speed
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="null-audio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = self.device.block / self.device.rate / self.speed
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            self.device.render(self.device.block)
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_at = time.perf_counter()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), else the peak from getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def soak(replies=2000, reply_ms=20, rate=48000, workers=2, policy="queue", max_buffer_s=1.0, max_voices=4):
+    """Back-to-back replies through the full output path on the null device.
+
+    Thread count and RSS are sampled every 10% of the run; both must stay
+    flat once the fixed pools are warm, and the device backlog must stay
+    within its limits.
+    """
+    from output_bus import OutputBus, BusPlayer, DeviceSink, NullSink
+    from streaming_lipsync import StreamingLipsync, LipsyncPool
+
+    device = OutputDevice(rate, backend="null", policy=policy, max_buffer_s=max_buffer_s, max_voices=max_voices)
+    bus = OutputBus(policy=policy)
+    bus.add_sink(DeviceSink(device))
+    bus.add_sink(NullSink("mouth"))
+    pool = LipsyncPool(workers)
+    t = np.arange(int(16000 * reply_ms / 1000)) / 16000
+    pcm = (6000 * np.sin(2 * np.pi * 200 * t)).astype(np.int16).tobytes()
+
+    samples = []
+    in_flight = deque()
+    start = time.perf_counter()
+    backlog = []
+    for i in range(replies):
+        # Like /generate-speech under load: a new reply every time a worker frees up
+        if len(in_flight) >= workers:
+            in_flight.popleft().join()
+        player = BusPlayer(bus, rate)
+        lipsync = StreamingLipsync(player, player.send_mouth, 16000, rate, prebuffer_ms=20).start(pool)
+        lipsync.feed(pcm)
+        lipsync.close()
+        in_flight.append(lipsync)
+        stats = device.stats()
+        backlog.append((stats["voices"], stats["queued_ms"]))
+        if i % max(1, replies // 10) == 0:
+            samples.append((i, threading.active_count(), round(rss_mb(), 1)))
+    pool.join()
+    elapsed = time.perf_counter() - start
+    samples.append((replies, threading.active_count(), round(rss_mb(), 1)))
+    for i, threads, rss in samples:
+        print(f"reply {i:>5}: {threads} threads, {rss} MB RSS")
+    print(f"{replies} replies in {elapsed:.1f}s, device {device.stats()}, pool {pool.stats()}")
+    pool.shutdown()
+    device.close()
+    voices, queued_ms = max(v for v, _ in backlog), max(q for _, q in backlog)
+    print(f"device backlog: at most {voices} voices, {queued_ms} ms queued")
+    assert voices <= max_voices, voices
+    assert queued_ms <= 1000 * max_buffer_s and device.peak_queued <= device.max_buffer, queued_ms
+    warm = samples[1:]
+    return max(s[1] for s in warm) - min(s[1] for s in warm), max(s[2] for s in warm) - min(s[2] for s in warm)
+
+
+if __name__ == '__main__':
+    replies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    thread_growth, rss_growth = soak(replies)
+    print(f"thread growth {thread_growth}, RSS growth {rss_growth:.1f} MB")
+    # Warm pools are fixed, so any new thread is a leak; RSS may only wobble with the allocator
+    assert thread_growth == 0, f"{thread_growth} threads leaked"
+    assert rss_growth < 4.0, f"RSS grew {rss_growth:.1f} MB over {replies} replies"
@@ -0,0 +1,251 @@
+import time
+from math import gcd
+
+import numpy as np
+
+
+def _kaiser_sinc(length, cutoff, gain, beta=8.0):
+    """Windowed-sinc lowpass; cutoff in cycles/sample"""
+    n = np.arange(length) - (length - 1) / 2
+    return gain * 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+
+
+class Resampler:
+    """Streaming polyphase resampler for mono float32 blocks.
+
+    The prototype filter is split into `up` phases of `taps` coefficients each;
+    every output sample is one dot product over the input history, computed for
+    the whole block at once with fancy indexing.
+    """
+
+    def __init__(self, rate_in, rate_out, taps=24, rolloff=0.92):
+        g = gcd(int(rate_in), int(rate_out))
+        self.rate_in = rate_in
+        self.rate_out = rate_out
+        self.up = int(rate_out) // g
+        self.down = int(rate_in) // g
+        self.taps = taps
+        cutoff = rolloff * 0.5 / max(self.up, self.down)
+        h = _kaiser_sinc(taps * self.up, cutoff, self.up)
+        # phases[p, j] = h[p + j * up]: coefficient for input sample base - j
+        self.phases = h.reshape(taps, self.up).T.astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0  # input samples received so far
+        self._produced = 0  # output samples emitted so far
+
+    @property
+    def delay(self):
+        """Filter group delay in output samples"""
+        return (self.taps * self.up - 1) / 2 / self.down
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if self.up == self.down:
+            return block.copy()
+        buffer = np.concatenate((self._history, block))
+        offset = self._consumed - (self.taps - 1)  # global index of buffer[0]
+        self._consumed += block.size
+
+        # Output k needs input floor(k*down/up), which must already be received
+        last = (self._consumed * self.up - 1) // self.down
+        k = np.arange(self._produced, last + 1, dtype=np.int64)
+        self._produced = last + 1
+        if k.size == 0:
+            self._history = buffer[-(self.taps - 1):]
+            return np.zeros(0, dtype=np.float32)
+
+        position = k * self.down
+        base = position // self.up - offset
+        phase = position % self.up
+        window = base[:, None] - np.arange(self.taps)[None, :]
+        out = np.einsum("ij,ij->i", buffer[window], self.phases[phase])
+        self._history = buffer[-(self.taps - 1):]
+        return out.astype(np.float32)
+
+    def flush(self):
+        """Push out the filter tail at the end of a stream"""
+        tail = int(np.ceil(self.delay * self.down / self.up)) + 1
+        return self.process(np.zeros(tail, dtype=np.float32))
+
+
+def _biquad_response(b, a, freqs, rate):
+    z = np.exp(-2j * np.pi * freqs / rate)
+    return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+
+def k_weighting_fir(rate, length=255):
+    """FIR approximation of the BS.1770 K-weighting curve (shelf + highpass).
+
+    The two reference biquads are defined at 48 kHz; their magnitude response is
+    sampled and turned into a linear-phase FIR so the filter is a convolution.
+    """
+    shelf = ([1.53512485958697, -2.69169618940638, 1.19839281085285],
+             [1.0, -1.69065929318241, 0.73248077421585])
+    highpass = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+    freqs = np.fft.rfftfreq(1024, 1 / rate)
+    ref = np.minimum(freqs, 23999.0)
+    magnitude = np.abs(_biquad_response(*shelf, ref, 48000) * _biquad_response(*highpass, ref, 48000))
+    impulse = np.fft.irfft(magnitude)
+    impulse = np.roll(impulse, length // 2)[:length] * np.hanning(length)
+    return impulse.astype(np.float32)
+
+
+# Gating blocks are binned by loudness so integration needs constant memory and time
+_GATE_FLOOR = -70.0
+_BIN_LU = 0.1
+_BINS = int((10.0 - _GATE_FLOOR) / _BIN_LU)
+
+
+class LoudnessNormalizer:
+    """Block-based EBU R128 style loudness normalization.
+
+    K-weighted energy is measured on 400 ms blocks with 100 ms hop, gated at
+    -70 LUFS absolute and -10 LU relative. Blocks are kept as energy sums in
+    0.1 LU loudness bins rather than a list, so a stream of any length costs
+    the same per block; the relative gate is exact to within one bin. The
+    gain toward `target` is updated every block and ramped within the block;
+    a peak ceiling prevents clipping.
+    """
+
+    def __init__(self, rate, target=-16.0, max_gain_db=12.0, ceiling=0.89):
+        self.rate = rate
+        self.target = target
+        self.max_gain_db = max_gain_db
+        self.ceiling = ceiling
+        self.fir = k_weighting_fir(rate)
+        self.hop = rate // 10
+        self.reset()
+
+    def reset(self):
+        self._fir_state = np.zeros(self.fir.size - 1, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._hops = []  # mean square of each 100 ms hop
+        self._energy = np.zeros(_BINS)  # summed mean square of the gating blocks in each loudness bin
+        self._count = np.zeros(_BINS)
+        self._gain = 1.0
+
+    def _add_block(self, mean_square):
+        if mean_square <= 10 ** ((_GATE_FLOOR + 0.691) / 10):
+            return  # absolute gate
+        lufs = 10 * np.log10(mean_square) - 0.691
+        index = min(_BINS - 1, int((lufs - _GATE_FLOOR) / _BIN_LU))
+        self._energy[index] += mean_square
+        self._count[index] += 1
+
+    def loudness(self):
+        """Gated integrated loudness so far in LUFS, or None before the first block"""
+        count = self._count.sum()
+        if count == 0:
+            return None
+        relative = 10 * np.log10(self._energy.sum() / count) - 0.691 - 10
+        first = max(0, int(np.ceil((relative - _GATE_FLOOR) / _BIN_LU)))
+        count = self._count[first:].sum()
+        if count == 0:
+            return None
+        return float(10 * np.log10(self._energy[first:].sum() / count) - 0.691)
+
+    def _measure(self, block):
+        filtered = np.convolve(np.concatenate((self._fir_state, block)), self.fir, mode="valid")
+        self._fir_state = np.concatenate((self._fir_state, block))[-(self.fir.size - 1):]
+        pending = np.concatenate((self._pending, filtered))
+        n = pending.size // self.hop
+        if n:
+            hops = pending[:n * self.hop].reshape(n, self.hop)
+            self._hops.extend(np.mean(hops.astype(np.float64) ** 2, axis=1))
+            while len(self._hops) >= 4:
+                self._add_block(float(np.mean(self._hops[:4])))
+                self._hops.pop(0)
+        self._pending = pending[n * self.hop:]
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self._measure(block)
+        loudness = self.loudness()
+        gain = self._gain
+        if loudness is not None:
+            gain_db = min(self.max_gain_db, self.target - loudness)
+            gain = 10 ** (gain_db / 20)
+        peak = float(np.max(np.abs(block))) if block.size else 0.0
+        if peak * gain > self.ceiling:
+            gain = self.ceiling / peak
+        ramp = np.linspace(self._gain, gain, block.size, dtype=np.float32)
+        self._gain = gain
+        return block * ramp
+
+
+def process_pcm16(pcm, rate_in, rate_out, target=-16.0, block=4096):
+    """Resample and loudness-normalize a whole int16 reply, block by block"""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+    resampler = Resampler(rate_in, rate_out)
+    normalizer = LoudnessNormalizer(rate_out, target=target)
+    out = []
+    for start in range(0, samples.size, block):
+        out.append(normalizer.process(resampler.process(samples[start:start + block])))
+    out.append(normalizer.process(resampler.flush()))
+    out = np.concatenate(out)
+    return (np.clip(out, -1.0, 32767 / 32768) * 32768).astype(np.int16).tobytes()
+
+
+def sine_error(rate_in, rate_out, freq=1000.0, seconds=1.0, block=1000):
+    """Max error of a resampled sine against the ideal one (ignoring edges)"""
+    t = np.arange(int(rate_in * seconds)) / rate_in
+    x = np.sin(2 * np.pi * freq * t).astype(np.float32)
+    resampler = Resampler(rate_in, rate_out)
+    y = np.concatenate([resampler.process(x[i:i + block]) for i in range(0, x.size, block)])
+    t_out = (np.arange(y.size) - resampler.delay) / rate_out
+    expected = np.sin(2 * np.pi * freq * t_out)
+    edge = int(resampler.delay) + resampler.taps * 2
+    return float(np.max(np.abs(y[edge:-edge] - expected[edge:-edge])))
+
+
+def benchmark(rate_in=16000, rate_out=48000, seconds=30.0, block=1024):
+    """Real-time factor (processing time / audio time) of resample + loudness"""
+    rng = np.random.default_rng(0)
+    x = (0.1 * rng.standard_normal(int(rate_in * seconds))).astype(np.float32)
+    resampler = Resampler(rate_in, rate_out)
+    normalizer = LoudnessNormalizer(rate_out)
+    start = time.perf_counter()
+    for i in range(0, x.size, block):
+        normalizer.process(resampler.process(x[i:i + block]))
+    return (time.perf_counter() - start) / seconds
+
+
+if __name__ == '__main__':
+    for rate_in, rate_out in ((24000, 48000), (16000, 44100), (48000, 16000), (24000, 18000)):
+        error = sine_error(rate_in, rate_out)
+        print(f"{rate_in} -> {rate_out}: sine max error {error:.4f}, RTF {benchmark(rate_in, rate_out):.4f}")
+        assert error < 1e-3, (rate_in, rate_out, error)
+
+    def measure(samples):
+        meter = LoudnessNormalizer(rate)
+        meter._measure(samples)
+        return meter.loudness()
+
+    # A -20 dBFS 1 kHz sine reads about -23 LUFS; normalized output should land on the target
+    rate = 48000
+    t = np.arange(rate * 5) / rate
+    tone = (0.1 * np.sin(2 * np.pi * 1000 * t)).astype(np.float32)
+    normalizer = LoudnessNormalizer(rate, target=-16.0)
+    out = np.concatenate([normalizer.process(tone[i:i + 4800]) for i in range(0, tone.size, 4800)])
+    before, after = measure(tone), measure(out[rate:])
+    print(f"input {before:.1f} LUFS -> output {after:.1f} LUFS (target -16.0)")
+    assert abs(before + 23.0) < 0.3 and abs(after + 16.0) < 0.3, (before, after)
+
+    # Silence falls under the absolute gate and a tone 30 dB down under the relative one
+    gated = np.concatenate((tone, np.zeros(rate * 5, dtype=np.float32), tone * 10 ** (-30 / 20)))
+    assert abs(measure(gated) - before) < 0.3, measure(gated)
+
+    # Ten minutes of audio: per-block cost does not grow with the length of the stream
+    normalizer = LoudnessNormalizer(rate)
+    block = tone[:4800]
+    timings = []
+    for minute in range(10):
+        start = time.perf_counter()
+        for _ in range(600):
+            normalizer.process(block)
+        timings.append(time.perf_counter() - start)
+    print(f"loudness per minute of audio: first {1000 * timings[0]:.1f} ms, tenth {1000 * timings[-1]:.1f} ms")
+    assert timings[-1] < 3 * timings[0], timings
@@ -0,0 +1,263 @@
+import os
+import wave
+import struct
+import threading
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Sizes written by streaming encoders that do not know the final length
+_PLACEHOLDER_SIZES = (0xFFFFFFFF, 0x7FFFFFFF)
+# WAVE_FORMAT_EXTENSIBLE, the largest fmt chunk of the formats read here
+_MAX_FMT_SIZE = 40
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+class WavInfo:
+    """Layout of the sample data inside a RIFF/WAVE file"""
+
+    def __init__(self, channels, sample_rate, sample_width, is_float, data_offset, nframes):
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.is_float = is_float
+        self.data_offset = data_offset
+        self.nframes = nframes
+
+    @property
+    def frame_size(self):
+        return self.channels * self.sample_width
+
+    @property
+    def duration(self):
+        return self.nframes / self.sample_rate
+
+    @property
+    def dtype(self):
+        """NumPy dtype of one stored sample; 24-bit is read as raw bytes"""
+        if self.is_float:
+            return np.dtype("<f4" if self.sample_width == 4 else "<f8")
+        return np.dtype({1: "u1", 2: "<i2", 3: "u1", 4: "<i4"}[self.sample_width])
+
+    def __repr__(self):
+        return (f"WavInfo(channels={self.channels}, sample_rate={self.sample_rate}, "
+                f"sample_width={self.sample_width}, is_float={self.is_float}, nframes={self.nframes})")
+
+
+def read_header(f, file_size=None):
+    """Parse the RIFF header of an open binary file.
+
+    Placeholder or oversized RIFF/data sizes (as written by streaming
+    synthesizers) are clamped to what is actually on disk, and a partial
+    trailing frame is ignored.
+    """
+    if file_size is None:
+        file_size = os.fstat(f.fileno()).st_size
+    header = f.read(12)
+    if len(header) < 12 or header[:4] not in (b"RIFF", b"RF64") or header[8:12] != b"WAVE":
+        raise WavFormatError("Not a RIFF/WAVE file")
+
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise WavFormatError("No data chunk found")
+        chunk_id, size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"fmt ":
+            if size < 16:
+                raise WavFormatError("fmt chunk too short")
+            if size > _MAX_FMT_SIZE:
+                raise WavFormatError(f"fmt chunk of {size} bytes is larger than any supported format")
+            body = f.read(size)
+            if len(body) < 16:
+                raise WavFormatError("Truncated fmt chunk")
+            tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE:
+                if len(body) < 26:
+                    raise WavFormatError("Truncated WAVE_FORMAT_EXTENSIBLE header")
+                tag = struct.unpack("<H", body[24:26])[0]  # first two bytes of the subformat GUID
+            fmt = (tag, channels, rate, bits)
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise WavFormatError("data chunk before fmt chunk")
+            break
+        else:
+            if size in _PLACEHOLDER_SIZES:
+                raise WavFormatError(f"Unbounded {chunk_id!r} chunk before data")
+            f.seek(size + (size % 2), os.SEEK_CUR)
+
+    tag, channels, rate, bits = fmt
+    if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise WavFormatError(f"Unsupported format tag {tag:#x}")
+    if channels < 1 or rate < 1:
+        raise WavFormatError("Invalid channel count or sample rate")
+    is_float = tag == WAVE_FORMAT_IEEE_FLOAT
+    width = (bits + 7) // 8
+    if (is_float and width not in (4, 8)) or (not is_float and width not in (1, 2, 3, 4)):
+        raise WavFormatError(f"Unsupported sample format: {bits}-bit {'float' if is_float else 'PCM'}")
+
+    data_offset = f.tell()
+    available = max(0, file_size - data_offset)
+    if size in _PLACEHOLDER_SIZES or size > available:
+        size = available
+    frame_size = channels * width
+    return WavInfo(channels, rate, width, is_float, data_offset, size // frame_size)
+
+
+def open_wav(path):
+    """Return (info, samples) with samples a read-only memory-mapped view.
+
+    The array has shape (nframes, channels) in the stored dtype; no sample data
+    is copied. 24-bit files come back as (nframes, channels, 3) raw bytes, use
+    to_float32() to decode them.
+    """
+    with open(path, "rb") as f:
+        info = read_header(f)
+    if info.nframes == 0:
+        shape = (0, info.channels) if info.sample_width != 3 else (0, info.channels, 3)
+        return info, np.zeros(shape, dtype=info.dtype)
+    shape = (info.nframes, info.channels)
+    if info.sample_width == 3:
+        shape += (3,)
+    samples = np.memmap(path, dtype=info.dtype, mode="r", offset=info.data_offset, shape=shape)
+    return info, samples
+
+
+def to_float32(block, info):
+    """Decode a block of stored samples to float32 in [-1, 1)"""
+    if info.is_float:
+        return block.astype(np.float32)
+    if info.sample_width == 1:
+        return (block.astype(np.float32) - 128.0) / 128.0
+    if info.sample_width == 3:
+        raw = block.astype(np.int32)
+        value = raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)
+        value = np.where(value >= 1 << 23, value - (1 << 24), value)
+        return value.astype(np.float32) / float(1 << 23)
+    scale = float(1 << (8 * info.sample_width - 1))
+    return block.astype(np.float32) / scale
+
+
+def pyaudio_format(info, pyaudio):
+    """PortAudio sample format for the stored data (get_format_from_width maps 4 bytes to float)"""
+    if info.is_float:
+        if info.sample_width != 4:
+            raise WavFormatError("PortAudio cannot play 64-bit float directly")
+        return pyaudio.paFloat32
+    return {1: pyaudio.paUInt8, 2: pyaudio.paInt16, 3: pyaudio.paInt24, 4: pyaudio.paInt32}[info.sample_width]
+
+
+def read_pcm16(path):
+    """Any WAV open_wav() reads, as mono 16-bit PCM bytes (channels averaged) and its sample rate"""
+    info, samples = open_wav(path)
+    mono = to_float32(samples, info).mean(axis=1)
+    return (np.clip(mono, -1.0, 32767 / 32768) * 32768).astype(np.int16).tobytes(), info.sample_rate
+
+
+def write_wav(path, pcm, sample_rate, channels=1, sample_width=2):
+    """Write PCM bytes with a header that matches the data actually written.
+
+    The file is written under a temporary name and renamed into place, so an
+    interrupted write never leaves a truncated WAV at `path`.
+    """
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with wave.open(tmp, 'wb') as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(sample_width)
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+if __name__ == '__main__':
+    # Self-check: well-formed files in every stored format, then malformed and truncated headers
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix="audio-io-")
+
+    def riff(*chunks, riff_size=None):
+        body = b"WAVE" + b"".join(chunks)
+        return b"RIFF" + struct.pack("<I", len(body) if riff_size is None else riff_size) + body
+
+    def chunk(chunk_id, body, size=None):
+        return chunk_id + struct.pack("<I", len(body) if size is None else size) + body + b"\0" * (len(body) % 2)
+
+    def fmt(tag=WAVE_FORMAT_PCM, channels=1, rate=16000, bits=16, extensible=False):
+        width = (bits + 7) // 8
+        body = struct.pack("<HHIIHH", WAVE_FORMAT_EXTENSIBLE if extensible else tag, channels, rate,
+                           rate * channels * width, channels * width, bits)
+        if extensible:
+            body += struct.pack("<HHI", 22, bits, 0) + struct.pack("<H", tag) + bytes(14)
+        return chunk(b"fmt ", body)
+
+    def load(name, data):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return open_wav(path)
+
+    ramp = np.array([-32768, -16384, 0, 16384, 32767], dtype="<i2")
+    info, samples = load("pcm16.wav", riff(fmt(), chunk(b"data", ramp.tobytes())))
+    assert info.nframes == 5 and np.allclose(to_float32(samples, info)[:, 0], ramp / 32768)
+
+    # Streaming synthesizers: placeholder RIFF and data sizes, cut mid-frame
+    info, samples = load("streamed.wav", riff(fmt(), chunk(b"data", ramp.tobytes(), size=0xFFFFFFFF)[:-1],
+                                              riff_size=0xFFFFFFFF))
+    assert info.nframes == 4, info
+
+    # 24-bit PCM and extensible float decode to the same ramp
+    packed = b"".join((int(v) << 8).to_bytes(3, "little", signed=True) for v in ramp)
+    info, samples = load("pcm24.wav", riff(fmt(bits=24), chunk(b"LIST", b"INFOxyz"), chunk(b"data", packed)))
+    assert np.allclose(to_float32(samples, info)[:, 0], ramp / 32768)
+    info, samples = load("float.wav", riff(fmt(WAVE_FORMAT_IEEE_FLOAT, bits=32, extensible=True),
+                                           chunk(b"data", (ramp / 32768).astype("<f4").tobytes())))
+    assert info.is_float and np.allclose(to_float32(samples, info)[:, 0], ramp / 32768)
+    info, samples = load("empty.wav", riff(fmt(channels=2), chunk(b"data", b"")))
+    assert samples.shape == (0, 2)
+
+    # Written files round-trip exactly, stereo reads back as the channel mean, no temp file is left
+    written = os.path.join(directory, "written.wav")
+    write_wav(written, ramp.tobytes(), 16000)
+    assert read_pcm16(written) == (ramp.tobytes(), 16000)
+    stereo = np.stack((ramp, np.zeros_like(ramp)), axis=1)
+    write_wav(written, stereo.tobytes(), 22050, channels=2)
+    assert np.array_equal(np.frombuffer(read_pcm16(written)[0], dtype="<i2"), ramp // 2)
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+    malformed = {
+        "empty": b"",
+        "truncated riff": riff(fmt())[:10],
+        "not wave": b"RIFF\0\0\0\0AVI " + fmt(),
+        "no data": riff(fmt()),
+        "data before fmt": riff(chunk(b"data", ramp.tobytes()), fmt()),
+        "short fmt": riff(chunk(b"fmt ", bytes(12)), chunk(b"data", b"")),
+        "truncated fmt": riff()[:12] + b"fmt " + struct.pack("<I", 16) + bytes(8),
+        "placeholder fmt": riff()[:12] + b"fmt " + struct.pack("<I", 0xFFFFFFFF) + fmt()[8:],
+        "oversized fmt": riff(chunk(b"fmt ", fmt()[8:] + bytes(100)), chunk(b"data", b"")),
+        "truncated extensible": riff(chunk(b"fmt ", fmt(extensible=True)[8:32]), chunk(b"data", b"")),
+        "unbounded chunk": riff(fmt(), chunk(b"LIST", b"", size=0xFFFFFFFF)),
+        "mu-law": riff(fmt(tag=0x0007, bits=8), chunk(b"data", b"\0")),
+        "16-bit float": riff(fmt(WAVE_FORMAT_IEEE_FLOAT, bits=16), chunk(b"data", b"\0\0")),
+        "no channels": riff(fmt(channels=0), chunk(b"data", b"")),
+    }
+    for name, data in malformed.items():
+        try:
+            load(name.replace(" ", "-") + ".wav", data)
+        except WavFormatError as e:
+            print(f"{name}: {e}")
+        else:
+            raise AssertionError(f"{name} was accepted")
+    print("all WAV checks passed")
@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from deadline import Deadline
+from audio_io import read_pcm16, write_wav
+
+logger = logging.getLogger(__name__)
+
+INDEX = "results.jsonl"
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+def _manifest_lines(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.strip() and not line.startswith("#"):
+                yield line.split("\t")
+
+
+def audio_items(source):
+    """(id, wav path, reference or None) from a directory of WAVs or a
+    ``path<TAB>reference transcript`` manifest (paths relative to it)"""
+    if os.path.isdir(source):
+        for root, _, files in sorted(os.walk(source)):
+            for name in sorted(files):
+                if name.lower().endswith(".wav"):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path, None
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    for fields in _manifest_lines(source):
+        path = os.path.join(base, fields[0])
+        yield fields[0], path, fields[1] if len(fields) > 1 else None
+
+
+def text_items(source):
+    """(id, text) from a directory of .txt files or an ``[id<TAB>]text`` manifest.
+
+    Lines without an id are keyed by a hash of their text, so reordering or
+    extending the manifest does not invalidate results already on disk.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(".txt"):
+                with open(os.path.join(source, name), encoding="utf-8") as f:
+                    yield os.path.splitext(name)[0], f.read().strip()
+        return
+    for fields in _manifest_lines(source):
+        if len(fields) > 1:
+            yield fields[0], fields[1]
+        else:
+            yield hashlib.sha1(fields[0].encode("utf-8")).hexdigest()[:12], fields[0]
+
+
+def _safe_name(item_id):
+    return re.sub(r"[^\w.-]+", "_", os.path.splitext(item_id)[0]).strip("_") or "item"
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def _words(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance and reference length, for WER"""
+    ref, hyp = _words(reference), _words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+class ResultIndex:
+    """Append-only JSON lines index of finished items; the resume point of a run"""
+
+    def __init__(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        self.path = os.path.join(out_dir, INDEX)
+        self.done = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    if "error" not in result:
+                        self.done[result["id"]] = result
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if "error" not in result:
+                self.done[result["id"]] = result
+
+    def close(self):
+        self._file.close()
+
+
+def run(items, process, out_dir, workers=4, progress_every=25):
+    """Process items on a bounded pool, skipping ones the index already has.
+
+    `process(item)` returns a result dict with "audio_seconds"; at most
+    2 * workers items are in flight, so inputs and outputs stream through
+    instead of being held in memory. Returns the run summary.
+    """
+    index = ResultIndex(out_dir)
+    summary = {"done": 0, "failed": 0, "skipped": 0, "audio_seconds": 0.0, "busy_seconds": 0.0}
+    errors = refs = 0
+    start = time.perf_counter()
+
+    def finish(future):
+        nonlocal errors, refs
+        result = future.result()
+        index.add(result)
+        if "error" in result:
+            summary["failed"] += 1
+            logger.warning("%s failed: %s", result["id"], result["error"])
+            return
+        summary["done"] += 1
+        summary["audio_seconds"] += result.get("audio_seconds", 0.0)
+        summary["busy_seconds"] += result.get("seconds", 0.0)
+        if "word_errors" in result:
+            errors += result["word_errors"]
+            refs += result["reference_words"]
+        if summary["done"] % progress_every == 0:
+            logger.info("%d done, %d failed, %.1f items/s", summary["done"], summary["failed"],
+                        summary["done"] / (time.perf_counter() - start))
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        for item in items:
+            if item[0] in index.done:
+                summary["skipped"] += 1
+                continue
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(future)
+            pending.add(pool.submit(_timed, process, item))
+        for future in wait(pending).done:
+            finish(future)
+    index.close()
+
+    wall = time.perf_counter() - start
+    summary["wall_seconds"] = round(wall, 2)
+    summary["items_per_second"] = round(summary["done"] / wall, 2) if wall else None
+    # Wall-clock RTF is what the batch costs; per-item RTF is what a single turn would see
+    summary["rtf"] = round(wall / summary["audio_seconds"], 3) if summary["audio_seconds"] else None
+    summary["rtf_per_item"] = (round(summary["busy_seconds"] / summary["audio_seconds"], 3)
+                               if summary["audio_seconds"] else None)
+    if refs:
+        summary["wer"] = round(errors / refs, 4)
+    summary["audio_seconds"] = round(summary["audio_seconds"], 2)
+    summary["busy_seconds"] = round(summary["busy_seconds"], 2)
+    summary["index"] = index.path
+    return summary
+
+
+def _timed(process, item):
+    start = time.perf_counter()
+    try:
+        result = process(item)
+    except Exception as e:
+        return {"id": item[0], "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def transcribe(pipeline, source, out_dir, workers=4, timeout=60.0):
+    """Transcribe a WAV directory or manifest with the kiosk's recognizer chain"""
+    def process(item):
+        item_id, path, reference = item
+        pcm, rate = read_pcm16(path)
+        text = pipeline.recognize_pcm(pcm, rate, deadline=Deadline(timeout, name=item_id))
+        result = {"id": item_id, "text": text, "audio_seconds": round(len(pcm) / 2 / rate, 3)}
+        if reference is not None:
+            result["reference"] = reference
+            result["word_errors"], result["reference_words"] = word_errors(reference, text)
+        return result
+
+    return run(audio_items(source), process, out_dir, workers)
+
+
+def synthesize(tts, source, out_dir, workers=4, timeout=60.0):
+    """Synthesize a text manifest to one WAV per line with the kiosk's voice and lexicon"""
+    audio_dir = os.path.join(out_dir, "audio")
+    os.makedirs(audio_dir, exist_ok=True)
+
+    def process(item):
+        item_id, text = item
+        pcm = tts.synthesize_all(text, Deadline(timeout, name=item_id))
+        if not pcm:
+            raise ValueError("synthesis produced no audio")
+        path = os.path.join(audio_dir, _safe_name(item_id) + ".wav")
+        write_wav(path, pcm, tts.sample_rate)
+        return {"id": item_id, "text": text, "audio": os.path.relpath(path, out_dir),
+                "audio_seconds": round(len(pcm) / 2 / tts.sample_rate, 3)}
+
+    return run(text_items(source), process, out_dir, workers)
+
+
+def build_from_env(workers):
+    """Same providers, recognition language, voice and lexicon as main.py"""
+    from dotenv import load_dotenv
+    from providers import build_pipeline_from_env
+    from tts_pipeline import ParallelTTS
+    from ssml import SSMLBuilder, lexicon_from_knowledge_base
+    from knowledge_base import UB_KNOWLEDGE_BASE
+
+    load_dotenv()
+    ssml_builder = SSMLBuilder(lexicon_from_knowledge_base(UB_KNOWLEDGE_BASE), voice="id-ID-GadisNeural")
+    pipeline = build_pipeline_from_env(os.getenv("AZURE_SPEECH_KEY"), os.getenv("AZURE_SPEECH_REGION"),
+                                       ssml_builder=ssml_builder)
+    # Sentences of every line share one pool, so upstream concurrency stays at `workers`
+    return pipeline, ParallelTTS(pipeline.synthesize, max_workers=workers)
+
+
+def demo(items=40, workers=4):
+    """Fake providers end to end: a full run, then a resumed run that skips everything"""
+    from providers import Pipeline
+    from fake_providers import FakeRecognizer, FakeChatModel, FakeTTS
+    from tts_pipeline import ParallelTTS, SAMPLE_RATE
+
+    work = tempfile.mkdtemp(prefix="batch-demo-")
+    wav_dir = os.path.join(work, "wav")
+    os.makedirs(wav_dir)
+    tone = (2000 * np.sin(2 * np.pi * 180 * np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE)).astype(np.int16).tobytes()
+    with open(os.path.join(wav_dir, "manifest.tsv"), "w", encoding="utf-8") as f:
+        for i in range(items):
+            write_wav(os.path.join(wav_dir, f"utt{i:03d}.wav"), tone, SAMPLE_RATE)
+            f.write(f"utt{i:03d}.wav\tapa itu AI Center\n")
+    lines = os.path.join(work, "lines.txt")
+    with open(lines, "w", encoding="utf-8") as f:
+        for i in range(items):
+            f.write(f"Fakultas nomor {i} ada di Universitas Brawijaya.\n")
+
+    pipeline = Pipeline([FakeRecognizer(["apa itu AI Center", "apa itu AI"], delay=0.1)], [FakeChatModel()],
+                        [FakeTTS(base_latency=0.1, per_char=0.001)])
+    tts = ParallelTTS(pipeline.synthesize, max_workers=workers)
+    manifest = os.path.join(wav_dir, "manifest.tsv")
+    return {
+        "transcribe": transcribe(pipeline, manifest, os.path.join(work, "stt"), workers),
+        "transcribe_resumed": transcribe(pipeline, manifest, os.path.join(work, "stt"), workers),
+        "synthesize": synthesize(tts, lines, os.path.join(work, "tts"), workers),
+        "synthesize_resumed": synthesize(tts, lines, os.path.join(work, "tts"), workers),
+    }
+
+
+USAGE = """usage:
+  python batch.py transcribe WAV_DIR_OR_MANIFEST OUT_DIR [WORKERS]
+  python batch.py synthesize TXT_DIR_OR_MANIFEST OUT_DIR [WORKERS]
+  python batch.py demo
+Providers come from STT_PROVIDERS / TTS_PROVIDERS (``fake`` runs offline).
+Re-running with the same OUT_DIR resumes from its results.jsonl."""
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command in ("transcribe", "synthesize") and len(args) in (2, 3):
+        workers = int(args[2]) if len(args) > 2 else 4
+        pipeline, tts = build_from_env(workers)
+        if command == "transcribe":
+            summary = transcribe(pipeline, args[0], args[1], workers)
+        else:
+            summary = synthesize(tts, args[0], args[1], workers)
+        print(json.dumps(summary, indent=2))
+    elif command == "demo":
+        for name, summary in demo().items():
+            print(name, summary)
+    else:
+        print(USAGE)
+        sys.exit(1)
@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationLog:
+    """Append-only log of recognitions, replies and speech with their timings.
+
+    log() only appends to an in-memory deque (never blocks; records are
+    counted as dropped while `max_queue` are pending). One writer thread
+    wakes every `flush_seconds`, or as soon as `batch_size` records are
+    pending, and appends everything pending as one gzip member to the
+    current segment, so every flushed batch is readable even if the process
+    dies. Segments rotate once they reach `segment_bytes`.
+    """
+
+    def __init__(self, directory, segment_bytes=8 * 2 ** 20, batch_size=256, flush_seconds=1.0,
+                 max_queue=10000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._segment = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.segments = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+        self._thread.start()
+
+    def log(self, record):
+        record.setdefault("ts", time.time())
+        pending = len(self._pending)
+        if pending >= self.max_queue:
+            self.dropped += 1
+            return
+        self._pending.append(record)  # deque appends are atomic, no lock on the request path
+        if pending + 1 == self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while not (self._closed.is_set() and not self._pending):
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.warning("Could not write %d conversation records: %s", len(batch), e)
+
+    def _write(self, batch):
+        if self._segment is None or os.path.getsize(self._segment) >= self.segment_bytes:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            self._segment = os.path.join(self.directory, f"conversation-{stamp}-{self.segments:04d}.jsonl.gz")
+            self.segments += 1
+        data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in batch)
+        with open(self._segment, "ab") as f:
+            f.write(gzip.compress(data.encode("utf-8")))
+        self.written += len(batch)
+        self.batches += 1
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the writer"""
+        self._closed.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"segment": self._segment, "written": self.written, "dropped": self.dropped,
+                "queued": len(self._pending), "batches": self.batches}
+
+
+# ---------------------------------------------------------------------------
+# Query tool
+# ---------------------------------------------------------------------------
+
+def read_records(directory, since=None):
+    """Every record in the log's segments, oldest first"""
+    for path in sorted(glob.glob(os.path.join(directory, "conversation-*.jsonl.gz"))):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if since is None or record.get("ts", 0) >= since:
+                        yield record
+        except (EOFError, OSError) as e:
+            # A batch cut short when the process died; earlier batches are intact
+            logger.warning("Truncated segment %s: %s", path, e)
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+class Columns:
+    """Records as NumPy columns: one array per field, None/NaN where a record lacks it"""
+
+    def __init__(self, records):
+        records = list(records)
+        self.size = len(records)
+        fields = sorted({k for r in records for k in r})
+        self._columns = {}
+        for field in fields:
+            values = [r.get(field) for r in records]
+            if all(v is None or isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                self._columns[field] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                self._columns[field] = np.array(["" if v is None else str(v) for v in values], dtype=object)
+
+    def __getitem__(self, field):
+        if field not in self._columns:
+            return np.full(self.size, np.nan) if self.size else np.zeros(0)
+        return self._columns[field]
+
+    def has(self, field):
+        return field in self._columns
+
+
+def latency_percentiles(columns, percentiles=(50, 90, 95, 99)):
+    """Per record kind and timing field: count and percentiles in ms"""
+    result = {}
+    kinds = columns["kind"]
+    for field in ("ms", "llm_ms", "first_token_ms", "first_chunk_ms"):
+        values = columns[field]
+        for kind in np.unique(kinds[~np.isnan(values)]) if columns.size else []:
+            picked = values[(kinds == kind) & ~np.isnan(values)]
+            result[f"{kind}.{field}"] = {"n": int(picked.size),
+                                         **{f"p{p}": round(float(v), 1)
+                                            for p, v in zip(percentiles, np.percentile(picked, percentiles))}}
+    return result
+
+
+def top_intents(columns, n=10):
+    """Most frequent intents of answered turns, with the share each takes"""
+    intents = columns["intent"][columns["kind"] == "response"] if columns.has("intent") else np.zeros(0)
+    if intents.size == 0:
+        return []
+    names, counts = np.unique(intents, return_counts=True)
+    order = np.argsort(-counts)[:n]
+    return [(names[i], int(counts[i]), round(float(counts[i]) / intents.size, 3)) for i in order]
+
+
+def cache_opportunities(columns, min_count=3, n=10):
+    """Questions that keep going to the LLM and replies that keep being synthesized.
+
+    Each entry counts its repeats and the time a cached answer would have
+    saved (every occurrence after the first).
+    """
+    result = {}
+    kinds = columns["kind"]
+    for label, kind, text_field, route_field, routed, ms_field in (
+            ("llm", "response", "user_input", "route", "llm", "llm_ms"),
+            ("tts", "speech", "text", "route", "tts", "ms")):
+        mask = (kinds == kind) & (columns[route_field] == routed) if columns.has(route_field) else np.zeros(columns.size, bool)
+        if not mask.any():
+            result[label] = []
+            continue
+        keys = np.array([_normalize(t) for t in columns[text_field][mask]], dtype=object)
+        ms = columns[ms_field][mask]
+        names, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        # Time spent on all repeats of each key, minus the first (uncacheable) one
+        spent = np.bincount(inverse, weights=np.nan_to_num(ms), minlength=names.size)
+        saved = spent * (counts - 1) / counts
+        order = [i for i in np.argsort(-saved) if counts[i] >= min_count][:n]
+        result[label] = [{"text": names[i], "count": int(counts[i]), "saved_s": round(float(saved[i]) / 1000, 1)}
+                         for i in order]
+    return result
+
+
+def summarize(directory, since=None):
+    columns = Columns(read_records(directory, since))
+    routes = Counter(columns["route"][columns["kind"] == "response"]) if columns.has("route") else Counter()
+    return {
+        "records": columns.size,
+        "latency_ms": latency_percentiles(columns),
+        "routes": dict(routes.most_common()),
+        "top_intents": top_intents(columns),
+        "cache_opportunities": cache_opportunities(columns),
+    }
+
+
+def benchmark(records=50000, rate=5000):
+    """Enqueue cost on the request path and writer throughput for synthetic turns.
+
+    Records arrive at `rate` per second, orders of magnitude above a kiosk's
+    few records per turn; nothing may be dropped.
+    """
+    import tempfile
+    rng = np.random.default_rng(0)
+    questions = ["apa itu AI Center", "fakultas apa saja di UB", "aku suka matematika", "di mana FILKOM",
+                 "berapa biaya kuliah"]
+    directory = tempfile.mkdtemp(prefix="conversation-log-")
+    log = ConversationLog(directory, segment_bytes=2 ** 20)
+    enqueue = []
+    start = time.perf_counter()
+    for i in range(records):
+        record = {"kind": "response", "turn": str(i), "user_input": questions[i % len(questions)],
+                  "route": "llm" if i % 3 else "template", "intent": "open" if i % 3 else "greeting",
+                  "ms": float(rng.gamma(4, 200)), "llm_ms": float(rng.gamma(4, 180))}
+        t = time.perf_counter()
+        log.log(record)
+        enqueue.append(time.perf_counter() - t)
+        if i % 100 == 99:
+            time.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+    log.close(timeout=60)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    summary = summarize(directory)
+    query = time.perf_counter() - start
+    size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(directory, "*.gz")))
+    return {
+        "records": records,
+        "enqueue_us_p99": round(float(np.percentile(enqueue, 99)) * 1e6, 1),
+        "written": log.written,
+        "dropped": log.dropped,
+        "segments": log.segments,
+        "bytes_per_record": round(size / max(1, log.written), 1),
+        "write_s": round(elapsed, 2),
+        "query_s": round(query, 2),
+        "queried_records": summary["records"],
+    }
+
+
+if __name__ == '__main__':
+    # python conversation_log.py [LOG_DIR [HOURS]] ; without arguments, a benchmark
+    logging.basicConfig(level=logging.WARNING)
+    if len(sys.argv) > 1:
+        since = time.time() - float(sys.argv[2]) * 3600 if len(sys.argv) > 2 else None
+        print(json.dumps(summarize(sys.argv[1], since), indent=2, ensure_ascii=False))
+    else:
+        print(benchmark())
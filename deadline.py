@@ -0,0 +1,210 @@
+import time
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(RuntimeError):
+    """The turn was cancelled (client abort, barge-in) before this stage finished"""
+
+
+class DeadlineExceeded(Cancelled, TimeoutError):
+    """The turn ran out of time"""
+
+
+class _Watchdog:
+    """One daemon thread that expires every scheduled deadline on time, so SDK
+    cancel hooks run even when nobody is polling the deadline"""
+
+    def __init__(self):
+        self._heap = []
+        self._ready = threading.Condition()
+        self._thread = None
+
+    def schedule(self, deadline):
+        with self._ready:
+            heapq.heappush(self._heap, (deadline.expires_at, id(deadline), deadline))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="deadline-watchdog", daemon=True)
+                self._thread.start()
+            self._ready.notify()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._heap:
+                    self._ready.wait()
+                expires_at, _, deadline = self._heap[0]
+                delay = expires_at - time.monotonic()
+                if delay > 0:
+                    self._ready.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            deadline.cancel("deadline", expired=True)
+
+
+_watchdog = _Watchdog()
+
+
+class _Hook:
+    def __init__(self, deadline, callback, on_expiry):
+        self.deadline = deadline
+        self.callback = callback
+        self.on_expiry = on_expiry
+
+    def remove(self):
+        with self.deadline._lock:
+            self.deadline._hooks.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+
+
+class Deadline:
+    """Time budget and cancellation token shared by every stage of one turn.
+
+    Stages pass it down to whatever may block: remaining() bounds waits,
+    check() raises once the turn is over, and hook(callback) registers an
+    upstream cancel (closing an SDK connection, killing a subprocess) that
+    runs the moment the deadline expires or cancel() is called. `seconds=None`
+    never expires but can still be cancelled.
+    """
+
+    def __init__(self, seconds=None, name=""):
+        self.name = name
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.reason = None
+        self._expired = False
+        self._explicit = False
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._hooks = set()
+        self.trace = None  # the turn's session_recorder.TurnTrace while recording
+        if seconds is not None:
+            _watchdog.schedule(self)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def remaining(self, cap=None):
+        """Seconds left (never negative), optionally capped for a single stage"""
+        left = None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+        if cap is not None:
+            left = cap if left is None else min(left, cap)
+        return left
+
+    def cancel(self, reason="cancelled", expired=False):
+        with self._lock:
+            if self._explicit or (expired and self._event.is_set()):
+                return
+            if not self._event.is_set():
+                self.reason = reason
+                self._expired = expired
+                self._event.set()
+            # Expiry leaves playback-style hooks for a later explicit cancel
+            self._explicit = not expired
+            hooks = [h for h in self._hooks if h.on_expiry or not expired]
+            self._hooks.difference_update(hooks)
+        for hook in hooks:
+            try:
+                hook.callback()
+            except Exception as e:
+                logger.debug("Cancel hook failed: %s", e)
+
+    def error(self):
+        if self._expired:
+            return DeadlineExceeded(f"{self.name or 'turn'} exceeded its deadline")
+        return Cancelled(f"{self.name or 'turn'} {self.reason}")
+
+    def check(self):
+        """Raise Cancelled/DeadlineExceeded if the turn is over"""
+        if self.expires_at is not None and not self._event.is_set() and time.monotonic() >= self.expires_at:
+            self.cancel("deadline", expired=True)
+        if self._event.is_set():
+            raise self.error()
+
+    def wait(self, seconds=None):
+        """Sleep up to `seconds` (or the deadline); True if the turn ended meanwhile"""
+        return self._event.wait(self.remaining(seconds))
+
+    def hook(self, callback, on_expiry=True):
+        """Run callback on cancel; use as a context manager around the blocking call.
+
+        With on_expiry=False only an explicit cancel() runs it, e.g. to stop a
+        reply's playback on barge-in without cutting it off at the deadline.
+        """
+        hook = _Hook(self, callback, on_expiry)
+        with self._lock:
+            pending = not self._event.is_set() or (self._expired and not on_expiry and not self._explicit)
+            if pending:
+                self._hooks.add(hook)
+        if not pending:
+            callback()
+        return hook
+
+
+def sleep(seconds, deadline=None):
+    """time.sleep that wakes up and raises when the deadline ends first"""
+    if deadline is None:
+        time.sleep(seconds)
+    elif deadline.wait(seconds):
+        deadline.check()
+
+
+class TurnRegistry:
+    """Deadlines of recent turns by client-supplied turn id.
+
+    All requests of one turn share one Deadline. A new turn supersedes the
+    previous one, so its in-flight work and playback stop (barge-in); the
+    client can also cancel a turn explicitly, e.g. when its fetch aborts.
+    """
+
+    def __init__(self, seconds, keep=32):
+        self.seconds = seconds
+        self.keep = keep
+        self._turns = OrderedDict()
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def get(self, turn_id):
+        """The turn's deadline, starting its clock on first use"""
+        if not turn_id:
+            return Deadline(self.seconds)
+        superseded = None
+        with self._lock:
+            deadline = self._turns.get(turn_id)
+            if deadline is None:
+                deadline = self._turns[turn_id] = Deadline(self.seconds, name=f"turn {turn_id}")
+                while len(self._turns) > self.keep:
+                    self._turns.popitem(last=False)
+            if self._latest != turn_id and self._latest in self._turns:
+                superseded = self._turns[self._latest]
+            self._latest = turn_id
+        if superseded is not None and superseded is not deadline:
+            superseded.cancel("superseded")
+        return deadline
+
+    def cancel(self, turn_id, reason="cancelled by client"):
+        with self._lock:
+            deadline = self._turns.get(turn_id)
+            if deadline is None:
+                # Cancelled before its first request arrived: remember that
+                deadline = self._turns[turn_id] = Deadline(None, name=f"turn {turn_id}")
+        deadline.cancel(reason)
+
+    def recent(self):
+        """The kept turns' deadlines by turn id, oldest first"""
+        with self._lock:
+            return dict(self._turns)
+
+    def is_cancelled(self, turn_id):
+        with self._lock:
+            deadline = self._turns.get(turn_id)
+        return deadline is not None and deadline.cancelled
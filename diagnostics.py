@@ -0,0 +1,356 @@
+import os
+import re
+import sys
+import gc
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+# Modules whose live objects are counted by sdk_objects(); a count that only
+# grows across turns is a leak of per-request SDK objects
+SDK_MODULES = ("azure.cognitiveservices.speech", "openai", "httpx", "websocket", "websockets", "pyaudio",
+               "faster_whisper", "socket", "ssl")
+
+
+def memory():
+    """Resident set size now and at its peak, in MB (None where the OS does not say)"""
+    rss = peak = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        try:
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 1024
+        except ImportError:
+            pass
+    return {
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "gc_objects": sum(gc.get_count()),
+        "gc_collections": [s["collections"] for s in gc.get_stats()],
+    }
+
+
+def thread_origin(thread):
+    """Where a thread comes from: its name without the per-instance counter.
+
+    Pools name workers ``prefix_N`` and unnamed threads are ``Thread-N (target)``,
+    so e.g. every TTS worker counts as "tts" and every leaked
+    ``WebSocketApp.run_forever`` thread as "run_forever".
+    """
+    name = thread.name
+    match = re.match(r"Thread-\d+ \((.+)\)$", name)
+    if match:
+        return match.group(1)
+    return re.sub(r"[-_]\d+$", "", name)
+
+
+def threads():
+    """Live thread count by origin"""
+    live = threading.enumerate()
+    origins = Counter(thread_origin(t) for t in live)
+    return {"total": len(live), "daemon": sum(t.daemon for t in live), "by_origin": dict(origins.most_common())}
+
+
+def open_files():
+    """Open file descriptors by kind (socket, pipe, file, ...); None where /proc is unavailable"""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    kinds = Counter()
+    for fd in fds:
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except OSError:
+            continue  # closed while listing (the listdir handle itself)
+        match = re.match(r"(\w+):", target)
+        kinds[match.group(1) if match else "file"] += 1
+    return {"total": sum(kinds.values()), **dict(kinds.most_common())}
+
+
+def sdk_objects(modules=SDK_MODULES):
+    """Live instances per class of the SDK modules. Walks the whole heap: on demand only"""
+    counts = Counter()
+    for obj in gc.get_objects():
+        module = getattr(type(obj), "__module__", None) or ""
+        if module.startswith(modules):
+            counts[f"{module}.{type(obj).__qualname__}"] += 1
+    return dict(counts.most_common(50))
+
+
+def deep_size(obj, limit=100000):
+    """Approximate bytes held by a container and everything it references (up to `limit` objects)"""
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, type(sys), type(deep_size))):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+    return size
+
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+
+class Allocations:
+    """tracemalloc on demand: top allocation sites, and growth since tracing started.
+
+    Tracing slows every allocation and its memory grows with `frames`, so it
+    is off until start(), keeps at most `max_frames` frames per trace and
+    stops by itself after `max_seconds` if nobody calls stop().
+    """
+
+    def __init__(self, max_seconds=600, max_frames=25):
+        self.max_seconds = max_seconds
+        self.max_frames = max_frames
+        self._baseline = None
+        self._timer = None
+        self.started = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=10, seconds=None):
+        frames = max(1, min(int(frames), self.max_frames))
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = tracemalloc.take_snapshot()
+        self.started = time.time()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(seconds, self._expire, args=(seconds,))
+        self._timer.name = "tracemalloc-timeout"
+        self._timer.daemon = True
+        self._timer.start()
+        return frames
+
+    def _expire(self, seconds):
+        logger.warning("tracemalloc ran for its %ss limit, stopping it", seconds)
+        self.stop()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        tracemalloc.stop()
+        self._baseline = None
+        self.started = None
+
+    def top(self, limit=20, group_by="lineno"):
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {GROUP_BY}")
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        growth = snapshot.compare_to(self._baseline, group_by) if self._baseline else []
+        return {
+            "traced_mb": round(current / 2 ** 20, 2),
+            "traced_peak_mb": round(peak / 2 ** 20, 2),
+            "tracing_for_s": round(time.time() - self.started, 1) if self.started else None,
+            "top": [{"site": str(s.traceback), "kb": round(s.size / 1024, 1), "count": s.count}
+                    for s in snapshot.statistics(group_by)[:limit]],
+            "growth": [{"site": str(s.traceback), "kb": round(s.size_diff / 1024, 1), "count": s.count_diff}
+                       for s in growth[:limit] if s.size_diff > 0],
+        }
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at `interval` seconds into collapsed stacks.
+
+    The output is the "folded" format (``thread;outer;...;inner count`` per
+    line) that flamegraph.pl, speedscope and inferno read. No thread runs
+    while the profiler is off, and a run stops by itself after `seconds`.
+    """
+
+    def __init__(self, directory, max_seconds=300):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.path = None
+        self.started = None
+        self.overhead = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=30.0, interval=0.01):
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.overhead = 0.0
+            self.path = None
+            self.started = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(min(seconds, self.max_seconds), interval),
+                                            name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling; returns the path of the written stacks"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.path
+
+    def _run(self, seconds, interval):
+        own = threading.get_ident()
+        end = time.monotonic() + seconds
+        while not self._stop.wait(interval) and time.monotonic() < end:
+            t = time.perf_counter()
+            names = {thread.ident: thread_origin(thread) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "unknown"))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            self.overhead += time.perf_counter() - t
+        self.path = self._write()
+
+    def _write(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            return path
+        except OSError as e:
+            logger.warning("Could not write profile: %s", e)
+            return None
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "overhead_ms_per_sample": round(1000 * self.overhead / self.samples, 3) if self.samples else None,
+            "started": self.started,
+            "path": self.path,
+        }
+
+
+class Diagnostics:
+    """Process health for long-running kiosks.
+
+    `accounts` maps a name to a callable returning the object(s) one part of
+    the app keeps between requests (conversation history, pending traces,
+    sink buffers); snapshot() reports each one's size, so the part that keeps
+    growing stands out. Everything here is computed only when asked for.
+    """
+
+    def __init__(self, directory="diagnostics"):
+        self.accounts = {}
+        self.allocations = Allocations()
+        self.profiler = SamplingProfiler(directory)
+        self.started = time.time()
+
+    def account(self, name, held):
+        self.accounts[name] = held
+
+    def memory_accounts(self):
+        result = {}
+        for name, held in self.accounts.items():
+            try:
+                obj = held()
+                result[name] = {"items": len(obj) if hasattr(obj, "__len__") else None,
+                                "kb": round(deep_size(obj) / 1024, 1)}
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+    def snapshot(self, objects=False):
+        return {
+            "uptime_s": round(time.time() - self.started),
+            "memory": memory(),
+            "accounts": self.memory_accounts(),
+            "threads": threads(),
+            "open_files": open_files(),
+            "sdk_objects": sdk_objects() if objects else None,
+            "tracemalloc": self.allocations.tracing,
+            "profiler": self.profiler.stats(),
+        }
+
+
+if __name__ == '__main__':
+    # Self-check: cost of a snapshot, and a profile of a busy thread
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    logging.basicConfig(level=logging.WARNING)
+    history = []
+    diagnostics = Diagnostics(tempfile.mkdtemp(prefix="diagnostics-"))
+    diagnostics.account("history", lambda: history)
+
+    def busy(n):
+        total = 0
+        for i in range(n):
+            total += sum(range(200))
+            history.append({"role": "user", "content": f"pertanyaan {i}" * 4})
+        return total
+
+    start = time.perf_counter()
+    for _ in range(20):
+        diagnostics.snapshot()
+    print("snapshot ms", round(1000 * (time.perf_counter() - start) / 20, 2))
+
+    assert diagnostics.allocations.start(frames=10 ** 6) == diagnostics.allocations.max_frames
+    diagnostics.profiler.start(seconds=5, interval=0.005)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts") as pool:
+        list(pool.map(busy, [20000, 20000]))
+    path = diagnostics.profiler.stop()
+    allocations = diagnostics.allocations.top(limit=3)
+    diagnostics.allocations.stop()
+    diagnostics.allocations.start(frames=1, seconds=0.2)
+    time.sleep(0.5)
+    assert not diagnostics.allocations.tracing, "tracemalloc outlived its time limit"
+
+    snapshot = diagnostics.snapshot(objects=True)
+    print("threads", snapshot["threads"])
+    print("accounts", snapshot["accounts"])
+    print("memory", snapshot["memory"], "open files", snapshot["open_files"])
+    print("profiler", diagnostics.profiler.stats())
+    with open(path, encoding="utf-8") as f:
+        hottest = f.readline().rsplit(" ", 1)
+    print("hottest stack", hottest[0][-100:], hottest[1].strip())
+    print("allocation growth", [(g["site"], g["kb"]) for g in allocations["growth"]])
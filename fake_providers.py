@@ -0,0 +1,190 @@
+import time
+import threading
+
+from deadline import Cancelled, sleep
+from providers import Recognizer, ChatModel, Pipeline, AzureChatModel, ProviderError
+from tts_pipeline import FakeSynthesizer, SAMPLE_RATE
+
+# ---------------------------------------------------------------------------
+# Fakes: no network or models, for offline runs, demos and STT_PROVIDERS=fake
+# ---------------------------------------------------------------------------
+
+class FakeRecognizer(Recognizer):
+    """Returns scripted transcripts in order; for offline runs and tests"""
+
+    name = "fake-stt"
+
+    def __init__(self, transcripts=("halo",), delay=0.0):
+        self.transcripts = list(transcripts)
+        self.delay = delay
+        self._index = 0
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        for _ in chunks:
+            pass
+        sleep(self.delay, deadline)
+        text = self.transcripts[self._index % len(self.transcripts)]
+        self._index += 1
+        return text
+
+    def recognize_microphone(self, deadline=None):
+        return self.recognize_stream([], SAMPLE_RATE, deadline=deadline)
+
+
+class FakeChatModel(ChatModel):
+    name = "fake-llm"
+
+    def __init__(self, reply="Halo! Saya Brava, asisten AI Universitas Brawijaya.", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        sleep(self.delay, deadline)
+        if on_token is not None:
+            for word in self.reply.split(" "):
+                on_token(word + " ", time.monotonic())
+        return self.reply
+
+
+class FakeTTS(FakeSynthesizer):
+    name = "fake-tts"
+
+    def cost(self, text):
+        return 0.0
+
+
+# ---------------------------------------------------------------------------
+# Fault injection: upstreams that stall until their call is cancelled
+# (`python fake_providers.py` checks that no stage leaks a thread)
+# ---------------------------------------------------------------------------
+
+def _hang(deadline):
+    """Block like a stalled SDK call; only the deadline's cancel hook releases it"""
+    released = threading.Event()
+    if deadline is None:
+        released.wait()  # forever, as the stalled SDK call would
+        return
+    with deadline.hook(released.set):
+        released.wait()
+    deadline.check()
+
+
+class HangingRecognizer(Recognizer):
+    name = "hanging-stt"
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        _hang(deadline)
+
+
+class HangingChatModel(ChatModel):
+    name = "hanging-llm"
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        _hang(deadline)
+
+
+class _StalledStream:
+    """OpenAI stream whose next chunk never arrives; close() drops the connection"""
+
+    def __init__(self):
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        self._closed.wait()
+        raise ProviderError("connection closed")
+        yield
+
+    def close(self):
+        self._closed.set()
+
+
+class HangingOpenAIClient:
+    """Stands in for AzureOpenAI in LLMRouter: every streaming request stalls"""
+
+    def __init__(self):
+        create = lambda **kwargs: _StalledStream()
+        self.chat = type("Chat", (), {"completions": type("Completions", (), {"create": staticmethod(create)})})
+
+
+class HangingTTS:
+    """Synthesizes the first `ok_chunks` calls, then stalls (a mid-reply outage)"""
+
+    name = "hanging-tts"
+
+    def __init__(self, ok_chunks=1):
+        self.ok_chunks = ok_chunks
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, deadline=None):
+        with self._lock:
+            self._calls += 1
+            ok = self._calls % (self.ok_chunks + 1) != 0
+        if ok:
+            return FakeSynthesizer(base_latency=0.01, per_char=0.0)(text)
+        _hang(deadline)
+
+
+def fault_injection(turns=40, deadline_seconds=0.3):
+    """Run turns against hanging upstreams and report the thread count.
+
+    Every stage must give up at the deadline and release its worker, so the
+    number of live threads after the run stays at the pools' fixed sizes
+    instead of growing with the number of stalled turns.
+    """
+    from deadline import Deadline
+    from tts_pipeline import ParallelTTS
+    from streaming_lipsync import StreamingLipsync, ClockPlayer
+    from llm_router import LLMRouter, Deployment
+
+    router = LLMRouter([Deployment("stalled-a", HangingOpenAIClient()), Deployment("stalled-b", HangingOpenAIClient())])
+    pipeline = Pipeline([HangingRecognizer()], [HangingChatModel()], [HangingTTS()])
+    routed = Pipeline([HangingRecognizer()], [AzureChatModel(router)], [HangingTTS()])
+    tts = ParallelTTS(pipeline.synthesize, max_workers=4)
+    stages = ("stt", "llm", "llm-router", "tts")
+    # Warm the fixed-size pools once so only leaked threads show up below
+    for _ in range(2):
+        try:
+            routed.complete([{"role": "user", "content": "halo"}], "halo", deadline=Deadline(0.05))
+        except Cancelled:
+            pass
+    baseline = threading.active_count()
+    outcomes = dict.fromkeys(stages, 0)
+    start = time.perf_counter()
+    for _ in range(turns):
+        for stage in stages:
+            deadline = Deadline(deadline_seconds)
+            try:
+                if stage == "stt":
+                    pipeline.recognize_pcm(b"\0\0" * 1600, deadline=deadline)
+                elif stage == "llm":
+                    pipeline.complete([{"role": "user", "content": "halo"}], "halo", deadline=deadline)
+                elif stage == "llm-router":
+                    routed.complete([{"role": "user", "content": "halo"}], "halo", deadline=deadline)
+                else:
+                    lipsync = StreamingLipsync(ClockPlayer(16000), lambda value: None, 16000, 16000).start()
+                    try:
+                        with deadline.hook(lipsync.cancel):
+                            for chunk in tts.stream("Kalimat pertama. Kalimat kedua. Kalimat ketiga.", deadline):
+                                lipsync.feed(chunk)
+                    finally:
+                        lipsync.close()
+            except Cancelled:
+                outcomes[stage] += 1
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)  # let cancelled workers and lipsync threads wind down
+    peak_extra = threading.active_count() - baseline
+    result = {
+        "turns": turns,
+        "timed_out": outcomes,
+        "seconds_per_stage": round(elapsed / (len(stages) * turns), 3),
+        "extra_threads_after": peak_extra,
+    }
+    # 4 TTS workers + the deadline watchdog are created once; nothing may pile up
+    assert peak_extra <= 5, result
+    assert all(n == turns for n in outcomes.values()), result
+    return result
+
+
+if __name__ == '__main__':
+    print(fault_injection())
@@ -0,0 +1,359 @@
+import re
+import sys
+import math
+import time
+import threading
+from collections import Counter, defaultdict, deque
+
+from knowledge_base import UB_KNOWLEDGE_BASE, MINAT_BAKAT_MAPPING
+
+# Intents the n-gram model may decide alone; knowledge intents need a keyword or entity
+SMALL_TALK = ("greeting", "identity", "thanks", "goodbye")
+
+
+class AhoCorasick:
+    """Multi-pattern matcher compiled once; finds every whole-word pattern in one pass"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, pattern, value):
+        node = 0
+        for ch in pattern.lower():
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        return self
+
+    def find(self, text):
+        """(start, end, value) for each match that starts and ends on a word boundary"""
+        text = text.lower()
+        node = 0
+        matches = []
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start, end = i - length + 1, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    matches.append((start, end, value))
+        return matches
+
+
+def _faculty_entities(kb):
+    """Faculty code -> (full name, [majors]) parsed from the knowledge base descriptions"""
+    faculties = {}
+    for code, description in kb["fakultas"].items():
+        name, _, rest = description.partition(" - ")
+        majors = []
+        if rest:
+            listed = re.sub(r"^memiliki (?:jurusan|Program Studi)\s+", "", rest)
+            # Only commas separate majors: "Teknologi Pangan dan Gizi" is one major
+            majors = [re.sub(r"^dan\s+", "", m.strip()) for m in listed.split(",") if m.strip()]
+        faculties[code] = (name.strip(), majors)
+    return faculties
+
+
+def _tokens(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _ngrams(text):
+    """Word unigrams/bigrams plus character trigrams, so typos from STT still overlap"""
+    words = _tokens(text)
+    features = words + [a + "_" + b for a, b in zip(words, words[1:])]
+    joined = " " + " ".join(words) + " "
+    features += [joined[i:i + 3] for i in range(len(joined) - 2)]
+    return features
+
+
+class NgramClassifier:
+    """Multinomial naive Bayes over word and character n-grams"""
+
+    def __init__(self, examples):
+        self.counts = defaultdict(Counter)
+        self.totals = Counter()
+        docs = Counter()
+        for text, intent in examples:
+            features = _ngrams(text)
+            self.counts[intent].update(features)
+            self.totals[intent] += len(features)
+            docs[intent] += 1
+        self.vocab = len({f for c in self.counts.values() for f in c})
+        self.priors = {intent: math.log(n / sum(docs.values())) for intent, n in docs.items()}
+
+    def predict(self, text):
+        """(intent, probability) of the best-scoring intent"""
+        features = _ngrams(text)
+        scores = {}
+        for intent, counts in self.counts.items():
+            denom = math.log(self.totals[intent] + self.vocab)
+            scores[intent] = self.priors[intent] + sum(math.log(counts[f] + 1) - denom for f in features)
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / norm
+
+
+# Seed utterances for the n-gram model; "open" teaches it what not to answer locally
+TRAINING_EXAMPLES = [
+    ("halo", "greeting"), ("hai brava", "greeting"), ("selamat pagi", "greeting"),
+    ("selamat siang", "greeting"), ("halo apa kabar", "greeting"), ("hi", "greeting"),
+    ("kamu siapa", "identity"), ("siapa kamu", "identity"), ("kamu itu apa", "identity"),
+    ("perkenalkan dirimu", "identity"), ("namamu siapa", "identity"),
+    ("terima kasih", "thanks"), ("makasih ya", "thanks"), ("thanks brava", "thanks"),
+    ("sampai jumpa", "goodbye"), ("dadah", "goodbye"), ("bye", "goodbye"), ("sudah cukup itu saja", "goodbye"),
+    ("fakultas apa saja di ub", "faculty_list"), ("ada fakultas apa aja", "faculty_list"),
+    ("sebutkan semua fakultas", "faculty_list"), ("daftar fakultas universitas brawijaya", "faculty_list"),
+    ("berapa jumlah fakultas di ub", "faculty_list"),
+    ("jurusan apa saja di fakultas teknik", "faculty_info"), ("fmipa itu apa", "faculty_info"),
+    ("ceritakan tentang fisip", "faculty_info"), ("di fakultas hukum ada apa", "faculty_info"),
+    ("informatika ada di fakultas apa", "major_lookup"), ("akuntansi masuk fakultas mana", "major_lookup"),
+    ("kalau sosiologi di fakultas apa", "major_lookup"), ("jurusan agronomi itu fakultas apa", "major_lookup"),
+    ("apa itu ai center", "ai_center_info"), ("ai center ub itu apa", "ai_center_info"),
+    ("ceritakan tentang ai center", "ai_center_info"),
+    ("program ai center apa saja", "ai_center_program"), ("ada pelatihan apa di ai center", "ai_center_program"),
+    ("kegiatan ai center", "ai_center_program"),
+    ("fasilitas ai center apa saja", "ai_center_facility"), ("ai center punya lab apa", "ai_center_facility"),
+    ("apakah ada gpu di ai center", "ai_center_facility"),
+    ("aku stres karena skripsi", "open"), ("bagaimana cara belajar efektif", "open"),
+    ("aku bingung mau kuliah di mana", "open"), ("apa bedanya informatika dan sistem informasi", "open"),
+    ("tips wawancara kerja dong", "open"), ("bagaimana prospek kerja lulusan teknik sipil", "open"),
+    ("aku suka menggambar cocoknya jurusan apa", "open"), ("kenapa langit biru", "open"),
+    ("berapa biaya kuliah kedokteran", "open"), ("bisa bantu buat jadwal belajar", "open"),
+]
+
+GREETING = re.compile(r"^(halo|hai|hi|hello|hey|selamat (pagi|siang|sore|malam)|assalamu\S*)\b")
+THANKS = re.compile(r"\b(terima ?kasih|makasih|thanks?|thank you|tengkyu)\b")
+GOODBYE = re.compile(r"\b(sampai jumpa|dadah|bye|selamat tinggal|sudah cukup)\b")
+FACULTY_LIST = re.compile(r"\b(fakultas (apa|apa saja|apa aja)|daftar fakultas|semua fakultas|jumlah fakultas|berapa fakultas)\b")
+# "X di fakultas apa" asks where X is; with no known X it is not a request for the faculty list
+ASKS_WHERE = re.compile(r"\b(di|masuk|ikut|termasuk) fakultas (apa|mana)\b")
+WHERE = re.compile(r"\b(fakultas (apa|mana)|di mana|dimana|masuk mana)\b")
+# Naming a faculty is not enough for its description template: the sentence must ask
+# what it is or what it offers ("syarat masuk fakultas kedokteran" goes to the LLM)
+FACULTY_LOOKUP = re.compile(r"\b((jurusan|jurusannya|prodi|prodinya|program studi) (apa|apa saja|apa aja)|"
+                            r"(apa|apa saja|apa aja) (jurusan|prodi|program studi)|ada apa|itu apa|"
+                            r"(ceritakan|ceritain|jelaskan|jelasin|info|informasi) (tentang|soal|mengenai)|"
+                            r"^(ceritakan|ceritain|jelaskan|jelasin)\b)")
+AI_CENTER = re.compile(r"\bai ?center\b")
+PROGRAM = re.compile(r"\b(program|pelatihan|workshop|kegiatan|acara)\b")
+FACILITY = re.compile(r"\b(fasilitas|lab|laboratorium|gpu|server|ruang)\b")
+# Asking for help choosing a major: answered with the interests question
+COUNSELING = re.compile(r"\b((pilih|memilih|milih|menentukan|nentuin|cari|mencari) jurusan|konsultasi jurusan|"
+                        r"jurusan (apa )?yang (cocok|pas|tepat)|cocok(nya)? (masuk |di |ambil )?jurusan)\b")
+# Anything reflective or comparative is left to the LLM even if it names a faculty
+OPEN_CUES = re.compile(r"\b(kenapa|mengapa|bagaimana|bedanya|perbedaan|prospek|bingung|cocok|saran|biaya|stres)\b")
+
+
+class IntentRouter:
+    """Answers known intents from templates in a few milliseconds; the rest go to the LLM.
+
+    Keyword rules and Aho-Corasick entity matches decide first; the n-gram
+    model only fills in when the rules find nothing and must be confident.
+    """
+
+    def __init__(self, kb=UB_KNOWLEDGE_BASE, examples=TRAINING_EXAMPLES, min_confidence=0.8):
+        self.kb = kb
+        self.faculties = _faculty_entities(kb)
+        self.matcher = AhoCorasick()
+        offered = {}  # major -> every faculty offering it, e.g. Administrasi Publik in FISIP and FIA
+        for code, (name, majors) in self.faculties.items():
+            self.matcher.add(code, ("faculty", code))
+            self.matcher.add(name, ("faculty", code))
+            for major in majors:
+                offered.setdefault(major, []).append(code)
+        for major, codes in offered.items():
+            self.matcher.add(major, ("major", (major, tuple(codes))))
+        self.matcher.build()
+        self.model = NgramClassifier(examples)
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._classify_seconds = 0.0
+        self._turns = 0
+        self._llm_seconds = None  # EWMA of what a routed-to-LLM turn costs
+
+    def entities(self, text):
+        """Longest non-overlapping faculty/major matches, in order of appearance"""
+        chosen = []
+        for start, end, value in sorted(self.matcher.find(text), key=lambda m: (m[0], m[0] - m[1])):
+            if not chosen or start >= chosen[-1][1]:
+                chosen.append((start, end, value))
+        return [value for _, _, value in chosen]
+
+    def classify(self, text):
+        """(intent, entities); intent is "open" when the LLM should answer"""
+        lowered = " ".join(_tokens(text))
+        entities = self.entities(lowered)
+        if COUNSELING.search(lowered) and not entities:
+            return "counseling", entities
+        if OPEN_CUES.search(lowered):
+            return "open", entities
+        majors = [v for kind, v in entities if kind == "major"]
+        faculties = [v for kind, v in entities if kind == "faculty"]
+        if AI_CENTER.search(lowered):
+            if FACILITY.search(lowered):
+                return "ai_center_facility", entities
+            if PROGRAM.search(lowered):
+                return "ai_center_program", entities
+            return "ai_center_info", entities
+        if majors and WHERE.search(lowered):
+            return "major_lookup", entities
+        if faculties and len(faculties) == 1 and not majors and FACULTY_LOOKUP.search(lowered):
+            return "faculty_info", entities
+        if FACULTY_LIST.search(lowered) and not entities and not ASKS_WHERE.search(lowered):
+            return "faculty_list", entities
+        if GOODBYE.search(lowered):
+            return "goodbye", entities
+        if THANKS.search(lowered):
+            return "thanks", entities
+        if GREETING.search(lowered) and len(lowered.split()) <= 4:
+            return "greeting", entities
+        intent, confidence = self.model.predict(lowered)
+        # Knowledge intents need their keyword or entity; the model only covers small talk
+        if confidence < self.min_confidence or intent not in SMALL_TALK:
+            return "open", entities
+        return intent, entities
+
+    def answer(self, intent, entities):
+        """Template reply for a local intent"""
+        ai = self.kb["ai_center"]
+        if intent == "greeting":
+            return ("Halo! Saya Brava, asisten AI Universitas Brawijaya. Saya siap membantu dengan informasi "
+                    "tentang UB, AI Center, bantuan personal, atau konsultasi pemilihan jurusan. "
+                    "Ada yang bisa saya bantu hari ini?")
+        if intent == "identity":
+            return ("Saya Brava, singkatan dari Brawijaya Assistant, asisten AI Universitas Brawijaya. "
+                    "Saya bisa membantu soal fakultas, AI Center, bantuan personal, dan konsultasi jurusan.")
+        if intent == "thanks":
+            return "Sama-sama! Kalau ada yang ingin ditanyakan lagi tentang UB, saya siap membantu."
+        if intent == "goodbye":
+            return "Sampai jumpa! Semoga harimu menyenangkan dan sukses selalu."
+        if intent == "counseling":
+            categories = list(MINAT_BAKAT_MAPPING)
+            return (f"Tentu, saya bantu pilih jurusan! Minat utama kamu di bidang apa? Misalnya "
+                    f"{', '.join(categories[:-1])}, atau {categories[-1]}.")
+        if intent == "faculty_list":
+            codes = list(self.faculties)
+            return (f"Universitas Brawijaya memiliki {len(codes)} fakultas, yaitu "
+                    f"{', '.join(codes[:-1])}, dan {codes[-1]}. Mau tahu jurusan di salah satu fakultas?")
+        if intent == "faculty_info":
+            code = next(v for kind, v in entities if kind == "faculty")
+            name, majors = self.faculties[code]
+            if not majors:
+                return f"{code} adalah {name} di Universitas Brawijaya. Mau saya bantu cari informasi lebih lanjut?"
+            return f"{code} adalah {name}, dengan jurusan {', '.join(majors[:-1])}, dan {majors[-1]}."
+        if intent == "major_lookup":
+            major, codes = next(v for kind, v in entities if kind == "major")
+            places = [f"{self.faculties[code][0]} ({code})" for code in codes]
+            if len(places) > 1:
+                places = [f"{', '.join(places[:-1])} dan {places[-1]}"]
+            return f"Jurusan {major} ada di {places[0]} Universitas Brawijaya."
+        if intent == "ai_center_info":
+            return ai["deskripsi"] + "."
+        if intent == "ai_center_program":
+            return f"Program AI Center UB antara lain {', '.join(ai['program'][:-1])}, dan {ai['program'][-1]}."
+        if intent == "ai_center_facility":
+            return f"Fasilitas AI Center UB meliputi {', '.join(ai['fasilitas'][:-1])}, dan {ai['fasilitas'][-1]}."
+        raise ValueError(f"No template for intent {intent!r}")
+
+    def route(self, text):
+        """(intent, reply); reply is None when the turn should go to the LLM"""
+        start = time.perf_counter()
+        intent, entities = self.classify(text)
+        reply = self.answer(intent, entities) if intent != "open" else None
+        with self._lock:
+            self._hits[intent] += 1
+            self._turns += 1
+            self._classify_seconds += time.perf_counter() - start
+        return intent, reply
+
+    def record_llm_latency(self, seconds):
+        with self._lock:
+            self._llm_seconds = seconds if self._llm_seconds is None else 0.8 * self._llm_seconds + 0.2 * seconds
+
+    def stats(self):
+        with self._lock:
+            local = sum(n for intent, n in self._hits.items() if intent != "open")
+            return {
+                "turns": self._turns,
+                "hit_rate": round(local / self._turns, 3) if self._turns else None,
+                "intents": {intent: {"hits": n, "rate": round(n / self._turns, 3)}
+                            for intent, n in self._hits.most_common()},
+                "avg_classify_ms": round(1000 * self._classify_seconds / self._turns, 3) if self._turns else None,
+                "avg_llm_ms": round(1000 * self._llm_seconds) if self._llm_seconds is not None else None,
+                # Each local answer skipped one LLM round trip of about avg_llm_ms
+                "latency_saved_s": round(local * self._llm_seconds, 1) if self._llm_seconds is not None else None,
+            }
+
+
+def load_labeled(path):
+    """Tab-separated `intent<TAB>utterance` lines; # starts a comment"""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                intent, text = line.split("\t", 1)
+                examples.append((text, intent))
+    return examples
+
+
+def evaluate(router, examples):
+    """Accuracy, per-intent precision/recall and classify latency over a labeled set"""
+    predicted = Counter()
+    actual = Counter()
+    correct = Counter()
+    errors = []
+    start = time.perf_counter()
+    for text, label in examples:
+        intent, _ = router.classify(text)
+        predicted[intent] += 1
+        actual[label] += 1
+        if intent == label:
+            correct[label] += 1
+        else:
+            errors.append((label, intent, text))
+    elapsed = time.perf_counter() - start
+    print(f"accuracy {sum(correct.values()) / len(examples):.3f} on {len(examples)} utterances, "
+          f"{1000 * elapsed / len(examples):.3f} ms per utterance")
+    for intent in sorted(actual):
+        precision = correct[intent] / predicted[intent] if predicted[intent] else 0.0
+        print(f"  {intent:<20} precision {precision:.2f}  recall {correct[intent] / actual[intent]:.2f}  n={actual[intent]}")
+    for label, intent, text in errors:
+        print(f"  MISS {label} -> {intent}: {text}")
+    return sum(correct.values()) / len(examples)
+
+
+if __name__ == '__main__':
+    # The held-out set was written without looking at the rules; report it separately
+    router = IntentRouter()
+    # Majors whose names contain "dan" stay whole, and a shared major names every faculty
+    assert "Teknologi Pangan dan Gizi" in router.faculties["FTP"][1], router.faculties["FTP"]
+    assert "Nutrisi dan Makanan Ternak" in router.faculties["FPet"][1], router.faculties["FPet"]
+    shared = router.route("administrasi publik ada di fakultas mana")[1]
+    assert "(FISIP)" in shared and "(FIA)" in shared, shared
+    for path in sys.argv[1:] or ["intent_testset.tsv", "intent_heldout.tsv"]:
+        print(path)
+        evaluate(router, load_labeled(path))
@@ -0,0 +1,55 @@
+# Knowledge base for Universitas Brawijaya
+UB_KNOWLEDGE_BASE = {
+    "fakultas": {
+        "FMIPA": "Fakultas Matematika dan Ilmu Pengetahuan Alam - memiliki jurusan Matematika, Fisika, Kimia, Biologi, dan Statistika",
+        "FT": "Fakultas Teknik - memiliki jurusan Teknik Sipil, Teknik Mesin, Teknik Elektro, Teknik Pengairan, Teknik Industri, Teknik Informatika, dan Perencanaan Wilayah Kota",
+        "FTP": "Fakultas Teknologi Pertanian - memiliki jurusan Teknologi Hasil Pertanian, Teknik Pertanian dan Biosistem, Teknologi Industri Pertanian, dan Teknologi Pangan dan Gizi",
+        "FP": "Fakultas Pertanian - memiliki jurusan Agronomi, Proteksi Tanaman, Tanah, Sosial Ekonomi Pertanian, dan Budidaya Perairan",
+        "FPet": "Fakultas Peternakan - memiliki jurusan Produksi Ternak, Nutrisi dan Makanan Ternak, Sosial Ekonomi Peternakan, dan Teknologi Hasil Ternak",
+        "FK": "Fakultas Kedokteran - memiliki Program Studi Kedokteran, Kebidanan, dan Keperawatan",
+        "FKG": "Fakultas Kedokteran Gigi",
+        "FKIP": "Fakultas Keguruan dan Ilmu Pendidikan",
+        "FISIP": "Fakultas Ilmu Sosial dan Ilmu Politik - memiliki jurusan Sosiologi, Ilmu Politik, Administrasi Publik, dan Hubungan Internasional",
+        "FIA": "Fakultas Ilmu Administrasi - memiliki jurusan Administrasi Bisnis, Administrasi Publik, dan Perpustakaan",
+        "FE": "Fakultas Ekonomi dan Bisnis - memiliki jurusan Ekonomi Pembangunan, Manajemen, dan Akuntansi",
+        "FH": "Fakultas Hukum",
+        "FIB": "Fakultas Ilmu Budaya - memiliki jurusan Sastra Indonesia, Sastra Inggris, Sastra Jepang, Sastra Cina, dan Seni Rupa",
+        "FKKMK": "Fakultas Kedokteran Hewan",
+        "FPIK": "Fakultas Perikanan dan Ilmu Kelautan"
+    },
+    "ai_center": {
+        "deskripsi": "AI Center Universitas Brawijaya adalah pusat penelitian dan pengembangan kecerdasan buatan yang berfokus pada inovasi teknologi AI untuk mendukung pendidikan dan penelitian",
+        "program": [
+            "Pelatihan AI dan Machine Learning",
+            "Workshop AI",
+            "Penelitian kolaboratif"
+        ],
+        "fasilitas": [
+            "Lab AI dengan GPU high-end",
+            "Ruang kolaborasi",
+            "Server komputasi cloud",
+            "Perpustakaan digital AI",
+            "Ruang meeting virtual reality"
+        ]
+    },
+    "bantuan_personal": {
+        "akademik": "Konseling akademik, bimbingan skripsi, tips belajar efektif",
+        "mental": "Dukungan kesehatan mental, manajemen stress, motivasi",
+        "karir": "Perencanaan karir, pengembangan soft skill, persiapan kerja",
+        "organisasi": "Informasi organisasi kemahasiswaan, leadership training"
+    }
+}
+
+# Minat dan bakat mapping
+MINAT_BAKAT_MAPPING = {
+    "teknologi": ["Teknik Informatika", "Teknik Elektro", "Sistem Informasi", "Teknik Industri"],
+    "sains": ["Matematika", "Fisika", "Kimia", "Biologi", "Statistika"],
+    "sosial": ["Sosiologi", "Ilmu Politik", "Administrasi Publik", "Hubungan Internasional"],
+    "bisnis": ["Manajemen", "Akuntansi", "Ekonomi Pembangunan", "Administrasi Bisnis"],
+    "kesehatan": ["Kedokteran", "Kedokteran Gigi", "Keperawatan", "Kedokteran Hewan"],
+    "pendidikan": ["FKIP - berbagai jurusan keguruan"],
+    "pertanian": ["Agronomi", "Proteksi Tanaman", "Teknologi Hasil Pertanian"],
+    "seni": ["Seni Rupa", "Sastra Indonesia", "Sastra Inggris"],
+    "hukum": ["Ilmu Hukum"],
+    "komunikasi": ["Sastra", "Hubungan Internasional", "Administrasi Publik"]
+}
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Candidate languages: recognizer locale, synthesis voice and, for anything
+# but Indonesian, an instruction so the reply comes back in the same language
+LANGUAGES = {
+    "id": {"locale": "id-ID", "voice": "id-ID-GadisNeural", "instruction": None},
+    "en": {"locale": "en-US", "voice": "en-US-JennyNeural",
+           "instruction": "The visitor is speaking English. Reply in English."},
+}
+DEFAULT_LANGUAGE = "id"
+
+
+def candidate_languages():
+    """Codes from LANGUAGES (e.g. ``id,en``), default language first"""
+    codes = [c.strip() for c in os.getenv("LANGUAGES", DEFAULT_LANGUAGE).split(",") if c.strip()]
+    unknown = [c for c in codes if c not in LANGUAGES]
+    if unknown:
+        raise ValueError(f"Unsupported languages {unknown}, expected some of {list(LANGUAGES)}")
+    return [DEFAULT_LANGUAGE] + [c for c in codes if c != DEFAULT_LANGUAGE]
+
+
+def language_for_locale(locale):
+    for code, language in LANGUAGES.items():
+        if language["locale"].lower() == (locale or "").lower():
+            return code
+    return None
+
+
+class Transcript(str):
+    """Recognized text that also carries the language it was recognized in"""
+
+    def __new__(cls, text, language=None):
+        transcript = super().__new__(cls, text)
+        transcript.language = language
+        return transcript
+
+
+def head_and_rest(chunks, sample_rate, seconds=1.0):
+    """Buffer the first `seconds` of a PCM chunk stream.
+
+    Returns the buffered audio and an iterator over the whole stream (the
+    buffered chunks first), so the recognizer still gets every byte.
+    """
+    chunks = iter(chunks)
+    head, size = [], 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= 2 * sample_rate * seconds:
+            break
+
+    def rest():
+        yield from head
+        yield from chunks
+
+    return b"".join(head), rest()
+
+
+class WhisperLanguageID:
+    """Local language ID on the first second with a small faster-whisper model.
+
+    Only the language detection pass runs; segments are never decoded.
+    """
+
+    name = "whisper-lid"
+
+    def __init__(self, model="tiny", threads=2, seconds=1.0):
+        from faster_whisper import WhisperModel
+        self.seconds = seconds
+        self.model = WhisperModel(model, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def identify(self, pcm, sample_rate, candidates):
+        import audio_dsp
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+        if sample_rate != 16000:
+            resampler = audio_dsp.Resampler(sample_rate, 16000)
+            audio = np.concatenate((resampler.process(audio), resampler.flush()))
+        _, info = self.model.transcribe(audio, language=None, beam_size=1, vad_filter=False)
+        probs = {code: p for code, p in (info.all_language_probs or [(info.language, info.language_probability)])}
+        code = max(candidates, key=lambda c: probs.get(c, 0.0))
+        total = sum(probs.get(c, 0.0) for c in candidates)
+        return code, probs.get(code, 0.0) / total if total else 0.0
+
+
+class FakeLanguageID:
+    """Scripted languages in order; for offline runs"""
+
+    name = "fake-lid"
+
+    def __init__(self, languages=(DEFAULT_LANGUAGE,), delay=0.0, seconds=1.0):
+        self.languages = list(languages)
+        self.delay = delay
+        self.seconds = seconds
+        self._index = 0
+
+    def identify(self, pcm, sample_rate, candidates):
+        time.sleep(self.delay)
+        code = self.languages[self._index % len(self.languages)]
+        self._index += 1
+        return code, 1.0
+
+
+def build_language_id_from_env():
+    """Local identifier from LANGUAGE_ID; None leaves detection to the recognizers (Azure at-start auto-detect)"""
+    name = os.getenv("LANGUAGE_ID", "azure")
+    if name == "whisper":
+        return WhisperLanguageID(os.getenv("LANGUAGE_ID_MODEL", "tiny"))
+    if name == "fake":
+        return FakeLanguageID()
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Evaluation on a labeled clip set
+# ---------------------------------------------------------------------------
+
+def load_clips(manifest):
+    """(language, wav path) pairs from a ``language<TAB>wav path`` manifest"""
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                code, path = line.rstrip("\n").split("\t")[:2]
+                yield code, os.path.join(base, path)
+
+
+def pinned_recognizers(speech_key, speech_region, languages):
+    """One recognizer per language with the language fixed, the baseline for evaluate().
+
+    Built from the first STT_PROVIDERS entry, so the baseline uses the same
+    backend as the detecting pipeline but never identifies the language.
+    """
+    from providers import AzureRecognizer, WhisperRecognizer
+
+    provider = (os.getenv("STT_PROVIDERS", "azure").split(",")[0].strip() or "azure")
+    if provider == "azure":
+        return {code: AzureRecognizer(speech_key, speech_region, LANGUAGES[code]["locale"]) for code in languages}
+    if provider == "local":
+        model = os.getenv("WHISPER_MODEL", "small")
+        return {code: WhisperRecognizer(model, language=code) for code in languages}
+    raise ValueError(f"No pinned baseline for STT provider {provider!r}")
+
+
+def evaluate(pipeline, manifest, pinned):
+    """Detection accuracy, and the latency it adds over recognition pinned to the right language.
+
+    `pinned` maps each language to a recognizer fixed to it (see
+    pinned_recognizers()); the pipeline's own chains cannot serve as the
+    baseline, since with LANGUAGE_ID=azure every language shares the one
+    auto-detecting recognizer.
+    """
+    from audio_io import read_pcm16
+
+    confusion = {}
+    added = []
+    correct = total = 0
+    for expected, path in load_clips(manifest):
+        pcm, rate = read_pcm16(path)
+        start = time.perf_counter()
+        text = pipeline.recognize_pcm(pcm, rate)
+        detected_at = time.perf_counter() - start
+        start = time.perf_counter()
+        pinned[expected].recognize_pcm(pcm, rate)
+        pinned_at = time.perf_counter() - start
+        detected = getattr(text, "language", None)
+        confusion.setdefault(expected, {}).setdefault(detected, 0)
+        confusion[expected][detected] += 1
+        correct += detected == expected
+        total += 1
+        added.append(detected_at - pinned_at)
+    ms = 1000 * np.array(added or [0.0])
+    return {
+        "clips": total,
+        "accuracy": round(correct / total, 3) if total else None,
+        "confusion": confusion,
+        "added_latency_ms_p50": round(float(np.percentile(ms, 50)), 1),
+        "added_latency_ms_p95": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+def build_clips(pipeline, testset, out_dir):
+    """Synthesize a ``language<TAB>text`` test set with each language's voice into a clip manifest.
+
+    Synthetic clips are cleaner than visitors' speech; add real recordings
+    to the manifest as they are collected.
+    """
+    from audio_io import write_wav
+    from tts_pipeline import SAMPLE_RATE
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = os.path.join(out_dir, "manifest.tsv")
+    with open(testset, encoding="utf-8") as f, open(manifest, "w", encoding="utf-8") as out:
+        for i, line in enumerate(line for line in f if line.strip() and not line.startswith("#")):
+            code, text = line.rstrip("\n").split("\t")[:2]
+            name = f"{code}-{i:03d}.wav"
+            write_wav(os.path.join(out_dir, name), pipeline.synthesize(text, language=code), SAMPLE_RATE)
+            out.write(f"{code}\t{name}\n")
+    return manifest
+
+
+USAGE = """usage:
+  python language_id.py build-clips language_testset.tsv OUT_DIR
+  python language_id.py evaluate OUT_DIR/manifest.tsv
+Candidates come from LANGUAGES (e.g. id,en), detection from LANGUAGE_ID (azure or whisper)."""
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from providers import build_pipeline_from_env
+
+    logging.basicConfig(level=logging.WARNING)
+    load_dotenv()
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command not in ("build-clips", "evaluate") or len(args) != (2 if command == "build-clips" else 1):
+        print(USAGE)
+        sys.exit(1)
+    speech_key, speech_region = os.getenv("AZURE_SPEECH_KEY"), os.getenv("AZURE_SPEECH_REGION")
+    pipeline = build_pipeline_from_env(speech_key, speech_region)
+    if command == "build-clips":
+        print(build_clips(pipeline, *args))
+    else:
+        print(evaluate(pipeline, args[0], pinned_recognizers(speech_key, speech_region, candidate_languages())))
@@ -0,0 +1,349 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Hedge deadline used until a deployment has enough samples for a p95
+DEFAULT_HEDGE_SECONDS = 1.5
+MIN_HEDGE_SECONDS = 0.3
+MIN_SAMPLES_FOR_P95 = 10
+
+# Factual questions about UB that the fast model answers from the system prompt well enough
+FAQ_KEYWORDS = re.compile(r"\b(fakultas|jurusan|prodi|program studi|ai ?center|brawijaya|ub|kampus|gedung|alamat|"
+                          r"lokasi|kontak|jam|pendaftaran|daftar|snbp|snbt|mandiri|ukt|biaya|beasiswa|akreditasi|"
+                          r"fasilitas|lab|laboratorium|program|pelatihan|workshop)\b")
+# Turns that need reasoning, comparison or care stay on the main deployments however short they are
+REASONING_CUES = re.compile(r"\b(kenapa|mengapa|bagaimana|gimana|bedanya|perbedaan|dibandingkan|bandingkan|"
+                            r"prospek|bingung|cocok|saran|sebaiknya|menurutmu|pendapat|jelaskan|stres|sedih|"
+                            r"cemas|takut|why|how|compare|should)\b")
+
+
+class Deployment:
+    """One chat deployment plus its latency statistics"""
+
+    def __init__(self, name, client, alpha=0.2, window=200):
+        self.name = name
+        self.client = client
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=window)  # recent time-to-first-token samples
+        self.ttft_ewma = None
+        self.total_ewma = None
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    def _ewma(self, current, sample):
+        if current is None:
+            return sample
+        return self.alpha * sample + (1 - self.alpha) * current
+
+    def observe_first_token(self, seconds):
+        with self._lock:
+            self._ttft.append(seconds)
+            self.ttft_ewma = self._ewma(self.ttft_ewma, seconds)
+
+    def observe_total(self, seconds):
+        with self._lock:
+            self.total_ewma = self._ewma(self.total_ewma, seconds)
+
+    def p95(self):
+        with self._lock:
+            if len(self._ttft) < MIN_SAMPLES_FOR_P95:
+                return None
+            samples = sorted(self._ttft)
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def hedge_deadline(self):
+        """Seconds to wait for a first token before firing a hedged request"""
+        p95 = self.p95()
+        if p95 is None:
+            return DEFAULT_HEDGE_SECONDS
+        return max(MIN_HEDGE_SECONDS, p95)
+
+    def score(self):
+        # Unmeasured deployments sort first so every one gets sampled
+        with self._lock:
+            ewma = self.ttft_ewma if self.ttft_ewma is not None else 0.0
+            # Penalise deployments that keep failing
+            return ewma * (1 + self.errors / max(1, self.requests))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "deployment": self.name,
+                "ttft_ewma_ms": None if self.ttft_ewma is None else round(self.ttft_ewma * 1000, 1),
+                "total_ewma_ms": None if self.total_ewma is None else round(self.total_ewma * 1000, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "wins": self.wins,
+                "cancelled": self.cancelled,
+            }
+
+
+class _Attempt:
+    """State of a single streaming request against one deployment"""
+
+    def __init__(self, deployment, progress):
+        self.deployment = deployment
+        self.progress = progress  # shared event set on first token / completion
+        self.first_token = threading.Event()
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self.parts = []
+        self.token_times = []
+        self.error = None
+        self.stream = None
+        self.started = time.monotonic()
+
+    def text(self):
+        return "".join(self.parts)
+
+
+class LLMRouter:
+    """Latency-aware routing with hedged requests across chat deployments.
+
+    The fastest deployment (by time-to-first-token EWMA) is tried first. If it
+    has not produced a token by its p95-based deadline, a hedged request goes to
+    the next deployment; whichever streams a token first wins and the other is
+    cancelled. FAQ turns (a factual UB keyword, no reasoning cue) go to an
+    optional smaller fast model.
+    """
+
+    def __init__(self, deployments, fast_deployment=None, max_tokens=250,
+                 fast_max_tokens=120, faq_max_words=20, temperature=0.7):
+        if not deployments:
+            raise ValueError("LLMRouter needs at least one deployment")
+        self.deployments = list(deployments)
+        self.fast_deployment = fast_deployment
+        self.max_tokens = max_tokens
+        self.fast_max_tokens = fast_max_tokens
+        self.faq_max_words = faq_max_words
+        self.temperature = temperature
+        workers = 2 * (len(self.deployments) + (1 if fast_deployment else 0))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+
+    def ranked(self):
+        return sorted(self.deployments, key=lambda d: d.score())
+
+    def is_faq_turn(self, user_input):
+        """Single factual questions about UB are cheap enough for the fast model; length alone is not a signal"""
+        lowered = user_input.lower()
+        return (len(lowered.split()) <= self.faq_max_words and lowered.count("?") <= 1
+                and FAQ_KEYWORDS.search(lowered) is not None and REASONING_CUES.search(lowered) is None)
+
+    def _run(self, attempt, messages, max_tokens, timeout=None):
+        dep = attempt.deployment
+        stream = None
+        try:
+            stream = dep.client.chat.completions.create(
+                model=dep.name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                timeout=timeout,
+            )
+            attempt.stream = stream
+            if attempt.cancelled.is_set():
+                return
+            for chunk in stream:
+                if attempt.cancelled.is_set():
+                    break
+                if not chunk.choices:
+                    continue  # Azure sends content-filter only chunks
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not attempt.first_token.is_set():
+                    dep.observe_first_token(time.monotonic() - attempt.started)
+                    attempt.first_token.set()
+                    attempt.progress.set()
+                attempt.parts.append(delta)
+                attempt.token_times.append(time.monotonic())
+                if attempt.first_token.is_set():
+                    attempt.progress.set()  # wakes a caller streaming the winner's tokens
+            if not attempt.cancelled.is_set():
+                dep.observe_total(time.monotonic() - attempt.started)
+        except Exception as e:
+            attempt.error = e
+            if attempt.cancelled.is_set():
+                return  # the stream was closed under us on purpose
+            with dep._lock:
+                dep.errors += 1
+            logger.warning("Deployment %s failed: %s", dep.name, e)
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                try:
+                    stream.close()  # drops the HTTP connection of a cancelled loser
+                except Exception:
+                    pass
+            attempt.done.set()
+            attempt.progress.set()
+
+    def _start(self, deployment, messages, max_tokens, progress, deadline=None):
+        attempt = _Attempt(deployment, progress)
+        with deployment._lock:
+            deployment.requests += 1
+        self._pool.submit(self._run, attempt, messages, max_tokens,
+                          None if deadline is None else deadline.remaining())
+        return attempt
+
+    def _cancel(self, attempt):
+        if not attempt.done.is_set():
+            attempt.cancelled.set()
+            with attempt.deployment._lock:
+                attempt.deployment.cancelled += 1
+            stream = attempt.stream
+            if stream is not None and hasattr(stream, "close"):
+                try:
+                    stream.close()  # unblocks a read stuck on a stalled connection
+                except Exception:
+                    pass
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        """Return the reply text, hedging across deployments as needed.
+
+        With a deadline, every attempt is bounded by it and all of them are
+        cancelled (their HTTP streams closed) as soon as it ends. on_token(delta,
+        at) receives the winner's tokens with their arrival times as they stream
+        in, from the moment it wins the race.
+        """
+        if deadline is not None:
+            deadline.check()
+        candidates = self.ranked()
+        max_tokens = self.max_tokens
+        if self.fast_deployment is not None and self.is_faq_turn(user_input):
+            candidates = [self.fast_deployment] + candidates
+            max_tokens = self.fast_max_tokens
+
+        progress = threading.Event()
+        attempts = [self._start(candidates[0], messages, max_tokens, progress, deadline)]
+        hook = deadline.hook(progress.set) if deadline is not None else None
+        try:
+            winner = self._race(attempts, candidates, messages, max_tokens, progress, deadline, on_token)
+        except BaseException:
+            for attempt in attempts:
+                self._cancel(attempt)
+            raise
+        finally:
+            if hook is not None:
+                hook.remove()
+        if winner is None:
+            return ""
+        return winner.text()
+
+    def _race(self, attempts, candidates, messages, max_tokens, progress, deadline, on_token=None):
+        backups = candidates[1:]
+        hedge_at = time.monotonic() + candidates[0].hedge_deadline()
+
+        winner = None
+        while winner is None:
+            timeout = None
+            if backups:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            if deadline is not None:
+                timeout = deadline.remaining(timeout)
+            progress.wait(timeout)
+            progress.clear()
+            if deadline is not None:
+                deadline.check()
+
+            for attempt in attempts:
+                if attempt.first_token.is_set() and attempt.error is None:
+                    winner = attempt
+                    break
+            if winner is not None:
+                break
+
+            live = [a for a in attempts if not a.done.is_set()]
+            # Fire the hedge on deadline, or immediately if everything in flight failed
+            if backups and (not live or time.monotonic() >= hedge_at):
+                dep = backups.pop(0)
+                logger.info("Hedging request to %s", dep.name)
+                attempts.append(self._start(dep, messages, max_tokens, progress, deadline))
+                hedge_at = time.monotonic() + dep.hedge_deadline()
+            elif not live and not backups:
+                errors = [a.error for a in attempts if a.error is not None]
+                if errors:
+                    raise errors[-1]
+                # Every deployment finished without emitting any content
+                return None
+
+        for attempt in attempts:
+            if attempt is not winner:
+                self._cancel(attempt)
+        with winner.deployment._lock:
+            winner.deployment.wins += 1
+
+        # The winner sets progress on every token and when it finishes; cancel also sets it
+        sent = 0
+        while True:
+            done = winner.done.is_set()
+            if on_token is not None:
+                # token_times is appended after parts, so its length bounds both
+                received = len(winner.token_times)
+                for delta, at in zip(winner.parts[sent:received], winner.token_times[sent:received]):
+                    on_token(delta, at)
+                sent = received
+            if done or (deadline is not None and deadline.cancelled):
+                break
+            progress.wait(None if deadline is None else deadline.remaining())
+            progress.clear()
+        if deadline is not None:
+            deadline.check()
+        if winner.error is not None:
+            raise winner.error
+        return winner
+
+    def stats(self):
+        stats = {"deployments": [d.stats() for d in self.deployments]}
+        if self.fast_deployment is not None:
+            stats["fast_deployment"] = self.fast_deployment.stats()
+        return stats
+
+
+def build_router_from_env(default_client, default_deployment, api_version):
+    """Build a router from AZURE_OPENAI_DEPLOYMENTS / AZURE_OPENAI_FAST_DEPLOYMENT.
+
+    AZURE_OPENAI_DEPLOYMENTS is a comma separated list of ``name`` or
+    ``name@https://endpoint`` entries; entries without an endpoint use the
+    default client. Falls back to the single AZURE_OPENAI_DEPLOYMENT; with
+    neither set it raises ValueError naming both settings.
+    """
+    clients = {}
+
+    def make(entry):
+        name, _, endpoint = entry.strip().partition("@")
+        if not name:
+            raise ValueError(f"Deployment entry {entry!r} has no deployment name")
+        if not endpoint:
+            return Deployment(name, default_client)
+        if endpoint not in clients:
+            clients[endpoint] = AzureOpenAI(
+                api_key=os.getenv("AZURE_OPENAI_KEY"),
+                api_version=api_version,
+                azure_endpoint=endpoint,
+            )
+        return Deployment(name, clients[endpoint])
+
+    entries = [e for e in os.getenv("AZURE_OPENAI_DEPLOYMENTS", "").split(",") if e.strip()]
+    if not entries:
+        if not default_deployment or not default_deployment.strip():
+            raise ValueError("No chat deployment configured: set AZURE_OPENAI_DEPLOYMENT "
+                             "or AZURE_OPENAI_DEPLOYMENTS")
+        entries = [default_deployment]
+    fast = os.getenv("AZURE_OPENAI_FAST_DEPLOYMENT")
+    return LLMRouter(
+        [make(e) for e in entries],
+        fast_deployment=make(fast) if fast else None,
+        max_tokens=int(os.getenv("AZURE_OPENAI_MAX_TOKENS", "250")),
+    )
@@ -1,18 +1,41 @@
 import os
 import time
-from flask import Flask, request, render_template_string, send_file
-import azure.cognitiveservices.speech as speechsdk
+import math
+import hmac
+import atexit
+from flask import Flask, request, render_template_string, send_file, jsonify, Response, stream_with_context
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 import base64
 from io import BytesIO
 import websocket  # <-- change back to this
 import json
+import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pyaudio
-import wave
+import wakeword
+import vad
+from providers import build_pipeline_from_env
+from streaming_lipsync import StreamingLipsync, LipsyncPool
+from audio_device import OutputDevice
+from output_bus import OutputBus, BusPlayer, DeviceSink, MouthSink, UnityWebSocketSink, HTTPStreamSink
 import logging
+from llm_router import build_router_from_env
+from knowledge_base import UB_KNOWLEDGE_BASE, MINAT_BAKAT_MAPPING
+from answer_bank import AnswerBank, classify_interests, compose_answer
+from intent_router import IntentRouter
+from speculative import SpeculativeTTS, counseling_predictions
+from deadline import TurnRegistry
+from session_recorder import SessionRecorder, span
+from conversation_log import ConversationLog, summarize as summarize_log
+from diagnostics import Diagnostics
+from tts_pipeline import ParallelTTS
+from language_id import LANGUAGES
+from functools import partial
+from ssml import SSMLBuilder, lexicon_from_knowledge_base
+from codec import negotiate, codec_for_mime
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -29,72 +52,122 @@ AZURE_SPEECH_REGION = os.getenv("AZURE_SPEECH_REGION")
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+AZURE_OPENAI_API_VERSION = "2025-01-01-preview"
 
-# Initialize clients
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_KEY,
-    api_version="2025-01-01-preview",
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-)
+# Latency-aware routing across one or more deployments (see llm_router.py). Only built
+# when LLM_PROVIDERS includes azure, so local-only kiosks start without Azure OpenAI settings
+LLM_PROVIDERS = [n.strip() for n in os.getenv("LLM_PROVIDERS", "azure").split(",") if n.strip()]
+if "azure" in LLM_PROVIDERS:
+    client = AzureOpenAI(
+        api_key=AZURE_OPENAI_KEY,
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    )
+    llm_router = build_router_from_env(client, AZURE_OPENAI_DEPLOYMENT, AZURE_OPENAI_API_VERSION)
+else:
+    llm_router = None
 
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # Disable caching
 
-# Knowledge base for Universitas Brawijaya
-UB_KNOWLEDGE_BASE = {
-    "fakultas": {
-        "FMIPA": "Fakultas Matematika dan Ilmu Pengetahuan Alam - memiliki jurusan Matematika, Fisika, Kimia, Biologi, dan Statistika",
-        "FT": "Fakultas Teknik - memiliki jurusan Teknik Sipil, Teknik Mesin, Teknik Elektro, Teknik Pengairan, Teknik Industri, Teknik Informatika, dan Perencanaan Wilayah Kota",
-        "FTP": "Fakultas Teknologi Pertanian - memiliki jurusan Teknologi Hasil Pertanian, Teknik Pertanian dan Biosistem, Teknologi Industri Pertanian, dan Teknologi Pangan dan Gizi",
-        "FP": "Fakultas Pertanian - memiliki jurusan Agronomi, Proteksi Tanaman, Tanah, Sosial Ekonomi Pertanian, dan Budidaya Perairan",
-        "FPet": "Fakultas Peternakan - memiliki jurusan Produksi Ternak, Nutrisi dan Makanan Ternak, Sosial Ekonomi Peternakan, dan Teknologi Hasil Ternak",
-        "FK": "Fakultas Kedokteran - memiliki Program Studi Kedokteran, Kebidanan, dan Keperawatan",
-        "FKG": "Fakultas Kedokteran Gigi",
-        "FKIP": "Fakultas Keguruan dan Ilmu Pendidikan",
-        "FISIP": "Fakultas Ilmu Sosial dan Ilmu Politik - memiliki jurusan Sosiologi, Ilmu Politik, Administrasi Publik, dan Hubungan Internasional",
-        "FIA": "Fakultas Ilmu Administrasi - memiliki jurusan Administrasi Bisnis, Administrasi Publik, dan Perpustakaan",
-        "FE": "Fakultas Ekonomi dan Bisnis - memiliki jurusan Ekonomi Pembangunan, Manajemen, dan Akuntansi",
-        "FH": "Fakultas Hukum",
-        "FIB": "Fakultas Ilmu Budaya - memiliki jurusan Sastra Indonesia, Sastra Inggris, Sastra Jepang, Sastra Cina, dan Seni Rupa",
-        "FKKMK": "Fakultas Kedokteran Hewan",
-        "FPIK": "Fakultas Perikanan dan Ilmu Kelautan"
-    },
-    "ai_center": {
-        "deskripsi": "AI Center Universitas Brawijaya adalah pusat penelitian dan pengembangan kecerdasan buatan yang berfokus pada inovasi teknologi AI untuk mendukung pendidikan dan penelitian",
-        "program": [
-            "Pelatihan AI dan Machine Learning",
-            "Workshop AI",
-            "Penelitian kolaboratif"
-        ],
-        "fasilitas": [
-            "Lab AI dengan GPU high-end",
-            "Ruang kolaborasi",
-            "Server komputasi cloud",
-            "Perpustakaan digital AI",
-            "Ruang meeting virtual reality"
-        ]
-    },
-    "bantuan_personal": {
-        "akademik": "Konseling akademik, bimbingan skripsi, tips belajar efektif",
-        "mental": "Dukungan kesehatan mental, manajemen stress, motivasi",
-        "karir": "Perencanaan karir, pengembangan soft skill, persiapan kerja",
-        "organisasi": "Informasi organisasi kemahasiswaan, leadership training"
-    }
-}
-
-# Minat dan bakat mapping
-MINAT_BAKAT_MAPPING = {
-    "teknologi": ["Teknik Informatika", "Teknik Elektro", "Sistem Informasi", "Teknik Industri"],
-    "sains": ["Matematika", "Fisika", "Kimia", "Biologi", "Statistika"],
-    "sosial": ["Sosiologi", "Ilmu Politik", "Administrasi Publik", "Hubungan Internasional"],
-    "bisnis": ["Manajemen", "Akuntansi", "Ekonomi Pembangunan", "Administrasi Bisnis"],
-    "kesehatan": ["Kedokteran", "Kedokteran Gigi", "Keperawatan", "Kedokteran Hewan"],
-    "pendidikan": ["FKIP - berbagai jurusan keguruan"],
-    "pertanian": ["Agronomi", "Proteksi Tanaman", "Teknologi Hasil Pertanian"],
-    "seni": ["Seni Rupa", "Sastra Indonesia", "Sastra Inggris"],
-    "hukum": ["Ilmu Hukum"],
-    "komunikasi": ["Sastra", "Hubungan Internasional", "Administrasi Publik"]
-}
+# SSML with UB abbreviation lexicon and Indonesian number/date normalization
+ssml_builder = SSMLBuilder(lexicon_from_knowledge_base(UB_KNOWLEDGE_BASE), voice="id-ID-GadisNeural")
+
+# STT / chat / TTS providers with config-based fallback order (see providers.py)
+pipeline = build_pipeline_from_env(AZURE_SPEECH_KEY, AZURE_SPEECH_REGION, llm_router, ssml_builder)
+
+# Sentence-chunked TTS synthesized on a bounded worker pool (see tts_pipeline.py)
+tts = ParallelTTS(pipeline.synthesize, max_workers=int(os.getenv("TTS_WORKERS", "4")))
+# Replies are spoken in the language the visitor spoke (LANGUAGES, see language_id.py)
+tts_by_language = {code: tts if code == pipeline.default_language else
+                   ParallelTTS(partial(pipeline.synthesize, language=code), max_workers=int(os.getenv("TTS_WORKERS", "4")))
+                   for code in pipeline.languages}
+
+def request_language(data):
+    language = (data or {}).get('language')
+    return language if language in tts_by_language else pipeline.default_language
+
+# Precomputed major-counseling answers; build with `python answer_bank.py`
+ANSWER_BANK_DIR = os.getenv("ANSWER_BANK_DIR", "answer_bank")
+try:
+    answer_bank = AnswerBank(ANSWER_BANK_DIR)
+    logger.info("Answer bank loaded: %d entries", len(answer_bank.entries))
+except FileNotFoundError:
+    logger.info("No answer bank in %s, counseling replies go through the LLM", ANSWER_BANK_DIR)
+    answer_bank = None
+
+# Every request of a turn shares one deadline (X-Turn-Id header); upstream calls are
+# cancelled when it expires, the client aborts, or a newer turn starts
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "25"))
+turns = TurnRegistry(TURN_DEADLINE_SECONDS)
+
+# Record turns (input audio, transcripts, token/TTS/lipsync timings) for offline
+# replay with `python session_replay.py`; off unless SESSION_RECORD_DIR is set
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR")
+if SESSION_RECORD_DIR:
+    session_recorder = SessionRecorder(SESSION_RECORD_DIR,
+                                       min_turn_seconds=float(os.getenv("SESSION_RECORD_MIN_SECONDS", "0")))
+    atexit.register(session_recorder.close)
+else:
+    session_recorder = None
+
+# Transcripts, replies and stage timings for analytics: `python conversation_log.py DIR`.
+# Visitors' words are personal data, so this is off unless CONVERSATION_LOG_DIR is set.
+# Requests only enqueue; a background writer batches, compresses and rotates segments
+CONVERSATION_LOG_DIR = os.getenv("CONVERSATION_LOG_DIR")
+if CONVERSATION_LOG_DIR:
+    conversation_log = ConversationLog(CONVERSATION_LOG_DIR)
+    atexit.register(conversation_log.close)
+else:
+    conversation_log = None
+
+def log_record(kind, started, **fields):
+    """Queue a conversation log record for this request's turn; never blocks"""
+    if conversation_log is not None:
+        conversation_log.log({"kind": kind, "turn": request.headers.get('X-Turn-Id'),
+                              "ms": round(1000 * (time.perf_counter() - started), 1), **fields})
+
+def turn_deadline():
+    turn_id = request.headers.get('X-Turn-Id')
+    deadline = turns.get(turn_id)
+    if session_recorder is not None and deadline.trace is None:
+        deadline.trace = session_recorder.trace(turn_id)
+    return deadline
+
+# Pre-synthesizes the likely answers to Brava's own counseling question while the user talks
+speculative = SpeculativeTTS(tts.synthesize_all,
+                             top_k=int(os.getenv("SPECULATIVE_TOP_K", "3")),
+                             budget_chars=int(os.getenv("SPECULATIVE_BUDGET_CHARS", "20000")))
+
+# Greetings, faculty lookups and AI Center facts are answered from templates (see intent_router.py)
+intent_router = IntentRouter()
+
+def output_device_rate():
+    """Native sample rate of the default output device, so PortAudio never resamples"""
+    p = pyaudio.PyAudio()
+    try:
+        return int(p.get_default_output_device_info()["defaultSampleRate"])
+    except Exception as e:
+        logger.warning("Could not query output device rate, using 48000 Hz: %s", e)
+        return 48000
+    finally:
+        p.terminate()
+
+OUTPUT_SAMPLE_RATE = int(os.getenv("OUTPUT_SAMPLE_RATE", "0")) or output_device_rate()
+OUTPUT_LOUDNESS_LUFS = float(os.getenv("OUTPUT_LOUDNESS_LUFS", "-16"))
+# What a new reply does while one is still playing: queue, replace (barge-in) or duck
+OUTPUT_POLICY = os.getenv("OUTPUT_POLICY", "queue")
+# Fixed playback workers instead of a lipsync thread per reply
+lipsync_pool = LipsyncPool(int(os.getenv("LIPSYNC_WORKERS", "2")))
+
+# On-device "Halo Brava" spotting; templates are short WAV recordings of the phrase
+WAKEWORD_TEMPLATES = os.getenv("WAKEWORD_TEMPLATES", "wakeword_templates")
+try:
+    wake_templates = wakeword.load_templates(WAKEWORD_TEMPLATES)
+except FileNotFoundError:
+    logger.info("No wake word templates in %s, /listen is disabled", WAKEWORD_TEMPLATES)
+    wake_templates = None
+wake_lock = threading.Lock()
 
 # Enhanced conversation history with better system prompt
 conversation_history = [{
@@ -139,6 +212,10 @@ ATURAN PENTING:
 """
 }]
 
+# Session dialogue state, set from the route each turn took rather than parsed from reply text:
+# awaiting_interests holds right after the counseling template asked for the visitor's interests
+dialogue_state = {"awaiting_interests": False}
+
 # HTML Template with improved UI
 HTML_PAGE = '''
 <!DOCTYPE html>
@@ -309,11 +386,6 @@ HTML_PAGE = '''
         .user-label { color: #2196f3; }
         .assistant-label { color: #4caf50; }
         
-        audio {
-            width: 100%;
-            margin-top: 10px;
-        }
-        
         .conversation-area {
             max-height: 400px;
             overflow-y: auto;
@@ -389,84 +461,177 @@ HTML_PAGE = '''
         <div class="conversation-area" id="conversationArea"></div>
     </div>
     
+    <script src="{{ url_for('static', filename='brava_client.js') }}"></script>
     <script>
         let isProcessing = false;
         
-        document.getElementById('activateBtn').addEventListener('click', async function() {
-            if (isProcessing) return;
+        // Messages stay as text; only the latest window of them is in the DOM
+        const transcript = new BravaClient.Transcript(document.getElementById('conversationArea'));
+        // Perceived latency (ms after the visitor's words appear) and client memory of recent turns
+        const turnMetrics = window.bravaMetrics = [];
+        let audioQueue = null;
+        
+        // Remote kiosks (?remote) record in the browser and play replies locally,
+        // so audio crosses the network compressed (Opus) instead of as raw WAV
+        const remoteMode = new URLSearchParams(window.location.search).has('remote');
+        const RECORD_MS = 6000;
+        
+        // ?remote&stream plays the server's audio frames as they are produced
+        // (raw PCM from /output-stream) instead of one encoded reply per turn
+        const streamAudio = remoteMode && new URLSearchParams(window.location.search).has('stream');
+        const OUTPUT_SAMPLE_RATE = {{ output_sample_rate }};
+        
+        // Audio can only start after a user gesture, so the queue is made on the first click
+        function ensureAudioQueue() {
+            if (audioQueue || !remoteMode) return;
+            audioQueue = BravaClient.AudioQueue.create();
+            if (audioQueue && streamAudio) {
+                const frames = new EventSource('/output-stream');
+                frames.onmessage = event => {
+                    const frame = JSON.parse(event.data);
+                    if (frame.audio) audioQueue.enqueuePcm16(BravaClient.decodeBase64(frame.audio), OUTPUT_SAMPLE_RATE);
+                };
+            }
+        }
+        
+        // Hands-free kiosks (?handsfree) wait for "Halo Brava" on the server instead of a click
+        const handsfreeMode = new URLSearchParams(window.location.search).has('handsfree');
+        
+        // Every request of a turn carries its id; the server cancels upstream work
+        // when the turn is aborted here or its deadline passes
+        const TURN_DEADLINE_MS = {{ turn_deadline_ms }};
+        let currentTurn = null;
+        
+        function newTurnId() {
+            return (window.crypto && crypto.randomUUID) ? crypto.randomUUID()
+                : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+        
+        function cancelTurn(turn) {
+            if (turn) navigator.sendBeacon('/cancel-turn', turn.id);
+        }
+        
+        window.addEventListener('pagehide', () => {
+            if (currentTurn) {
+                currentTurn.controller.abort();
+                cancelTurn(currentTurn);
+            }
+        });
+        
+        function supportedCodecs() {
+            const probe = document.createElement('audio');
+            const codecs = [];
+            if (probe.canPlayType('audio/ogg; codecs=opus')) codecs.push('opus');
+            codecs.push('wav');
+            return codecs;
+        }
+        
+        async function recognizeFromBrowser(turnFetch) {
+            const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+            const mimeType = ['audio/ogg;codecs=opus', 'audio/webm;codecs=opus']
+                .find(type => MediaRecorder.isTypeSupported(type)) || '';
+            const recorder = new MediaRecorder(stream, mimeType ? { mimeType } : {});
+            const chunks = [];
+            recorder.ondataavailable = event => chunks.push(event.data);
+            const stopped = new Promise(resolve => recorder.onstop = resolve);
+            recorder.start();
+            setTimeout(() => recorder.stop(), RECORD_MS);
+            await stopped;
+            stream.getTracks().forEach(track => track.stop());
+            
+            const body = new Blob(chunks, { type: recorder.mimeType });
+            return turnFetch('/recognize-upload', {
+                method: 'POST',
+                headers: { 'Content-Type': recorder.mimeType },
+                body
+            });
+        }
+        
+        async function runTurn(button, recognize, listeningText, waitsForWakeWord = false) {
+            if (isProcessing) return false;
+            
+            const turn = { id: newTurnId(), controller: new AbortController(), timer: null };
+            currentTurn = turn;
+            // The clock starts now, or once the wake word is heard in hands-free mode
+            const armDeadline = () => {
+                turn.timer = setTimeout(() => turn.controller.abort(), TURN_DEADLINE_MS);
+            };
+            const turnFetch = (url, options = {}) => fetch(url, {
+                ...options,
+                signal: turn.controller.signal,
+                headers: { ...(options.headers || {}), 'X-Turn-Id': turn.id }
+            });
+            if (!waitsForWakeWord) armDeadline();
             
             isProcessing = true;
-            this.disabled = true;
-            this.textContent = '⏳ Sedang Memproses...';
+            button.disabled = true;
+            button.textContent = '⏳ Sedang Memproses...';
+            let ok = false;
             
-            // Remove previous audio elements
-            document.querySelectorAll('audio').forEach(audio => audio.remove());
+            // A new turn silences whatever is still playing
+            if (audioQueue) audioQueue.stop();
+            const metrics = new BravaClient.TurnMetrics();
             
             const statusDiv = document.getElementById('status');
-            const conversationArea = document.getElementById('conversationArea');
             
             statusDiv.className = 'status listening';
-            statusDiv.innerHTML = '🎤 Mendengarkan... Silakan bicara sekarang!';
+            statusDiv.textContent = listeningText;
             
             try {
                 // Step 1: Speech Recognition
-                const recognitionResponse = await fetch('/recognize', { method: 'POST' });
+                const recognitionResponse = await recognize(turnFetch);
                 const recognitionData = await recognitionResponse.json();
+                if (waitsForWakeWord) armDeadline();
                 
                 if (!recognitionData.success) {
                     throw new Error(recognitionData.message);
                 }
                 
                 const userInput = recognitionData.text;
-                
-                // Display user message
-                const userMessage = document.createElement('div');
-                userMessage.className = 'conversation';
-                userMessage.innerHTML = `
-                    <div class="message user-message">
-                        <div class="message-label user-label">Anda:</div>
-                        <div>${userInput}</div>
-                    </div>
-                `;
-                conversationArea.appendChild(userMessage);
+                // The reply is written and spoken in the language the visitor used
+                const language = recognitionData.language;
+                // Perceived latency is measured from the moment the visitor's words are on screen
+                metrics.started = metrics.now();
+                transcript.add('user', userInput);
                 
                 statusDiv.className = 'status processing';
-                statusDiv.innerHTML = '🔄 Brava sedang memikirkan jawaban...';
+                statusDiv.textContent = '🔄 Brava sedang memikirkan jawaban...';
                 
-                // Step 2: Generate AI Response
-                const aiResponse = await fetch('/generate-response', {
+                // Step 2: Generate AI Response, shown token by token as it streams in
+                const aiResponse = await turnFetch('/generate-response-stream', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ text: userInput })
+                    body: JSON.stringify({ text: userInput, language })
                 });
                 
-                const aiData = await aiResponse.json();
-                
-                if (!aiData.success) {
-                    throw new Error(aiData.message);
+                const assistantMessage = transcript.add('assistant');
+                let reply = null;
+                for await (const event of BravaClient.readEvents(aiResponse)) {
+                    if (event.type === 'token') {
+                        metrics.mark('first_token');
+                        transcript.append(assistantMessage, event.text);
+                    } else if (event.type === 'done') {
+                        reply = event.reply;
+                        transcript.settle(assistantMessage, reply);
+                    } else if (event.type === 'error') {
+                        throw new Error(event.message);
+                    }
                 }
-                
-                const reply = aiData.reply;
-                
-                // Display assistant message
-                const assistantMessage = document.createElement('div');
-                assistantMessage.className = 'conversation';
-                assistantMessage.innerHTML = `
-                    <div class="message assistant-message">
-                        <div class="message-label assistant-label">Brava:</div>
-                        <div>${reply}</div>
-                    </div>
-                `;
-                conversationArea.appendChild(assistantMessage);
+                if (reply === null) {
+                    throw new Error('Respons terputus');
+                }
+                metrics.mark('reply');
                 
                 statusDiv.className = 'status processing';
-                statusDiv.innerHTML = '🔊 Brava sedang mempersiapkan suara...';
+                statusDiv.textContent = '🔊 Brava sedang mempersiapkan suara...';
                 
                 // Step 3: Generate Speech
-                const speechResponse = await fetch('/generate-speech', {
+                const speechResponse = await turnFetch('/generate-speech', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ text: reply })
+                    body: JSON.stringify(remoteMode && !streamAudio
+                        ? { text: reply, language, codecs: supportedCodecs() }
+                        : { text: reply, language })
                 });
                 
                 const speechData = await speechResponse.json();
@@ -475,45 +640,106 @@ HTML_PAGE = '''
                     throw new Error(speechData.message);
                 }
                 
-                // Create audio element
-                if (speechData.audio) {
-                    const audioElement = document.createElement('audio');
-                    audioElement.controls = true;
-                    audioElement.autoplay = true;
-                    audioElement.src = `data:audio/wav;base64,${speechData.audio}`;
-                    assistantMessage.querySelector('.message').appendChild(audioElement);
-                    
+                // Remote replies and streamed frames play through the Web Audio queue
+                if (speechData.audio && audioQueue) {
+                    await audioQueue.enqueueEncoded(BravaClient.decodeBase64(speechData.audio));
+                    metrics.mark('audio');
+                }
+                if (audioQueue && audioQueue.playing) {
                     statusDiv.className = 'status speaking';
-                    statusDiv.innerHTML = '🔊 Brava sedang berbicara...';
+                    statusDiv.textContent = '🔊 Brava sedang berbicara...';
                     
-                    audioElement.onended = () => {
+                    audioQueue.onidle = () => {
                         statusDiv.className = 'status';
-                        statusDiv.innerHTML = '✅ Selesai! Klik tombol untuk berbicara lagi.';
+                        statusDiv.textContent = '✅ Selesai! Klik tombol untuk berbicara lagi.';
                     };
                 } else {
                     statusDiv.className = 'status';
-                    statusDiv.innerHTML = '✅ Respons selesai! Klik tombol untuk berbicara lagi.';
+                    statusDiv.textContent = '✅ Respons selesai! Klik tombol untuk berbicara lagi.';
                 }
                 
-                // Scroll to bottom
-                conversationArea.scrollTop = conversationArea.scrollHeight;
+                turnMetrics.push({ ...metrics.marks, ...BravaClient.clientMemory(transcript) });
+                if (turnMetrics.length > 100) turnMetrics.shift();
+                console.debug('Turn metrics', turnMetrics[turnMetrics.length - 1]);
+                ok = true;
                 
             } catch (error) {
                 statusDiv.className = 'status error';
-                statusDiv.innerHTML = `❌ Error: ${error.message}`;
+                if (error.name === 'AbortError') {
+                    // Tell the server too, so it stops waiting on the upstream services
+                    cancelTurn(turn);
+                    statusDiv.textContent = '⌛ Waktu habis, silakan coba lagi.';
+                } else {
+                    statusDiv.textContent = `❌ Error: ${error.message}`;
+                }
                 console.error('Error:', error);
             } finally {
+                clearTimeout(turn.timer);
                 isProcessing = false;
-                this.disabled = false;
-                this.textContent = '🎤 Mulai Bicara dengan Brava';
+                button.disabled = false;
+                button.textContent = '🎤 Mulai Bicara dengan Brava';
             }
+            return ok;
+        }
+        
+        const activateBtn = document.getElementById('activateBtn');
+        activateBtn.addEventListener('click', function() {
+            ensureAudioQueue();
+            runTurn(this,
+                turnFetch => remoteMode ? recognizeFromBrowser(turnFetch) : turnFetch('/recognize', { method: 'POST' }),
+                '🎤 Mendengarkan... Silakan bicara sekarang!');
         });
+        
+        if (handsfreeMode) {
+            ensureAudioQueue();
+            (async () => {
+                while (true) {
+                    const ok = await runTurn(activateBtn,
+                        turnFetch => turnFetch('/listen', { method: 'POST' }),
+                        '👂 Ucapkan "Halo Brava" untuk mulai...', true);
+                    // Back off after failures so a broken mic does not spin the loop
+                    if (!ok) await new Promise(resolve => setTimeout(resolve, 2000));
+                }
+            })();
+        }
     </script>
 </body>
 </html>
 '''
 
-def start_lipsync_with_ws(wav_path):
+class VTSMouth:
+    """VTube Studio connection that accepts MouthOpen values once authenticated"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.ws = None
+
+    def send_mouth(self, mouth_value):
+        # Values produced before the model is ready are dropped, never queued
+        if not self.ready.is_set():
+            return
+        param = {
+            "apiName": "VTubeStudioPublicAPI",
+            "apiVersion": "1.0",
+            "requestID": "lipsync",
+            "messageType": "InjectParameterDataRequest",
+            "data": {
+                "faceFound": True,
+                "mode": "set",
+                "parameterValues": [
+                    {
+                        "id": "MouthOpen",
+                        "value": mouth_value
+                    }
+                ]
+            }
+        }
+        self.ws.send(json.dumps(param))
+
+
+def connect_vts():
+    vts = VTSMouth()
+
     def on_message(ws, message):
         response = json.loads(message)
         if response.get("messageType") == "AuthenticationResponse" and response["data"].get("authenticated"):
@@ -525,7 +751,7 @@ def start_lipsync_with_ws(wav_path):
             }
             ws.send(json.dumps(model_info))
         elif response.get("messageType") == "CurrentModelResponse":
-            threading.Thread(target=lipsync_wav, args=(ws, wav_path), daemon=True).start()
+            vts.ready.set()
 
     def on_open(ws):
         auth = {
@@ -541,79 +767,96 @@ def start_lipsync_with_ws(wav_path):
         }
         ws.send(json.dumps(auth))
 
-    ws = websocket.WebSocketApp(
+    vts.ws = websocket.WebSocketApp(
         "ws://localhost:8001",
         on_open=on_open,
         on_message=on_message
     )
 
-    threading.Thread(target=ws.run_forever, daemon=True).start()
+    threading.Thread(target=vts.ws.run_forever, name="vts-ws", daemon=True).start()
+    return vts
 
+def build_output_bus():
+    """Sinks from OUTPUT_SINKS (pyaudio,vts,unity); browsers attach via /output-stream"""
+    bus = OutputBus(policy=OUTPUT_POLICY)
+    for name in [n.strip() for n in os.getenv("OUTPUT_SINKS", "pyaudio,vts").split(",") if n.strip()]:
+        offset = int(os.getenv(f"{name.upper()}_OFFSET_MS", "0"))
+        try:
+            if name == "pyaudio":
+                device = OutputDevice(OUTPUT_SAMPLE_RATE, policy=OUTPUT_POLICY)
+                bus.add_sink(DeviceSink(device, offset_ms=offset))
+            elif name == "vts":
+                bus.add_sink(MouthSink(connect_vts().send_mouth, offset_ms=offset))
+            elif name == "unity":
+                bus.add_sink(UnityWebSocketSink(port=int(os.getenv("UNITY_WS_PORT", "8765")), offset_ms=offset))
+            else:
+                logger.warning("Unknown output sink: %s", name)
+        except ValueError:
+            raise  # a bad setting such as PYAUDIO_OFFSET_MS, not a missing device: fail loudly
+        except Exception as e:
+            logger.warning("Output sink %s unavailable: %s", name, e)
+    return bus
 
-def lipsync_wav(ws, wav_path):
-    wf = wave.open(wav_path, 'rb')
-    chunk = 1024
-    # Setup audio playback
-    p = pyaudio.PyAudio()
-    stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
-                    channels=wf.getnchannels(),
-                    rate=wf.getframerate(),
-                    output=True)
-    try:
-        while True:
-            data = wf.readframes(chunk)
-            if not data:
-                break
-            # Play audio chunk
-            stream.write(data)
-            audio = np.frombuffer(data, dtype=np.int16)
-            volume = np.linalg.norm(audio) / chunk
-            mouth_value = min(volume / 500, 1.0)
-            param = {
-                "apiName": "VTubeStudioPublicAPI",
-                "apiVersion": "1.0",
-                "requestID": "lipsync",
-                "messageType": "InjectParameterDataRequest",
-                "data": {
-                    "faceFound": True,
-                    "mode": "set",
-                    "parameterValues": [
-                        {
-                            "id": "MouthOpen",
-                            "value": mouth_value
-                        }
-                    ]
-                }
-            }
-            ws.send(json.dumps(param))
-            time.sleep(chunk / wf.getframerate())
-    finally:
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-        wf.close()
+output_bus = build_output_bus()
+
+# Live memory, thread and socket accounting for kiosks that run for days (/diagnostics);
+# tracemalloc and the sampling profiler only run while switched on
+diagnostics = Diagnostics(os.getenv("DIAGNOSTICS_DIR", "diagnostics"))
+diagnostics.account("conversation_history", lambda: conversation_history)
+diagnostics.account("turns", turns.recent)
+diagnostics.account("output_bus", lambda: output_bus)
+diagnostics.account("speculative", lambda: speculative)
+if conversation_log is not None:
+    diagnostics.account("conversation_log", lambda: conversation_log)
+# /diagnostics can switch on tracing and profiling, so it only answers requests from this
+# machine, or, when DIAGNOSTICS_TOKEN is set, requests carrying it in X-Diagnostics-Token
+DIAGNOSTICS_TOKEN = os.getenv("DIAGNOSTICS_TOKEN")
+
+def diagnostics_denied():
+    """403 response unless the caller may use /diagnostics, else None"""
+    if DIAGNOSTICS_TOKEN:
+        if hmac.compare_digest(request.headers.get('X-Diagnostics-Token', ''), DIAGNOSTICS_TOKEN):
+            return None
+    elif request.remote_addr in ('127.0.0.1', '::1'):
+        return None
+    return jsonify({
+        "success": False,
+        "message": "Diagnostics are only available locally or with X-Diagnostics-Token"
+    }), 403
+
+def number_params(source, **defaults):
+    """Numeric request parameters cast like their defaults; ValueError names the bad one"""
+    values = {}
+    for name, default in defaults.items():
+        try:
+            value = type(default)(source.get(name, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number")
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f"{name} must be a positive number")
+        values[name] = value
+    return values
 
 @app.route("/")
 def index():
-    return render_template_string(HTML_PAGE)
+    return render_template_string(HTML_PAGE, turn_deadline_ms=int(TURN_DEADLINE_SECONDS * 1000),
+                                  output_sample_rate=OUTPUT_SAMPLE_RATE)
 
 # Speech recognition endpoint
 @app.route('/recognize', methods=['POST'])
 def recognize():
     """Capture and transcribe speech from microphone"""
-    config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-    config.speech_recognition_language = "id-ID"
-    audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
-    recognizer = speechsdk.SpeechRecognizer(speech_config=config, audio_config=audio_config)
-    
     try:
         print("Listening...")
-        result = recognizer.recognize_once_async().get()
+        started = time.perf_counter()
+        text = pipeline.recognize_microphone(deadline=turn_deadline())
+        log_record("stt", started, source="microphone", text=text or None, language=getattr(text, "language", None))
         
-        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+        if text:
             return {
                 "success": True,
-                "text": result.text
+                "text": text,
+                "language": getattr(text, "language", None) or pipeline.default_language
             }
         else:
             return {
@@ -626,6 +869,175 @@ def recognize():
             "message": f"Recognition error: {str(e)}"
         }
 
+# Hands-free speech recognition gated by the local wake word spotter
+@app.route('/listen', methods=['POST'])
+def listen():
+    """Wait for "Halo Brava" locally, then stream pre-roll plus live audio to the recognizer"""
+    if wake_templates is None:
+        return {
+            "success": False,
+            "message": "Wake word is not configured"
+        }
+    if not wake_lock.acquire(blocking=False):
+        return {
+            "success": False,
+            "message": "Already listening"
+        }
+    
+    turn_id = request.headers.get('X-Turn-Id')
+    block = wakeword.SAMPLE_RATE // 10
+    p = pyaudio.PyAudio()
+    mic = p.open(format=pyaudio.paInt16, channels=1, rate=wakeword.SAMPLE_RATE,
+                 input=True, frames_per_buffer=block)
+    try:
+        # Nothing leaves the device until the wake word is heard
+        detector = wakeword.WakeWordDetector(wake_templates)
+        while True:
+            # The client gave up waiting (page closed, kiosk stopped): free the mic
+            if turn_id and turns.is_cancelled(turn_id):
+                return {
+                    "success": False,
+                    "message": "Listening cancelled"
+                }
+            data = mic.read(block, exception_on_overflow=False)
+            if detector.feed(np.frombuffer(data, dtype=np.int16) / 32768.0):
+                break
+        
+        # The turn (and its deadline) starts when the wake word is heard
+        deadline = turn_deadline()
+        
+        # Pre-roll first so the words right after "Halo Brava" are not clipped
+        preroll = detector.preroll()
+        
+        # Local endpointing: stop streaming as soon as the VAD sees the utterance end
+        detector_vad = vad.VoiceActivityDetector(wakeword.SAMPLE_RATE)
+        utterance_done = threading.Event()
+        detector_vad.subscribe("speech_end", lambda event, t: utterance_done.set())
+        detector_vad.process(np.frombuffer(preroll, dtype=np.int16) / 32768.0)
+        utterance_done.clear()  # the wake word itself may have ended inside the pre-roll
+        
+        def live_audio():
+            yield preroll
+            while not utterance_done.is_set() and not deadline.cancelled:
+                data = mic.read(block, exception_on_overflow=False)
+                detector_vad.process(np.frombuffer(data, dtype=np.int16) / 32768.0)
+                yield data
+        
+        started = time.perf_counter()
+        text = pipeline.recognize_stream(live_audio(), wakeword.SAMPLE_RATE, deadline=deadline)
+        log_record("stt", started, source="wakeword", text=text or None, language=getattr(text, "language", None))
+        
+        if text:
+            return {
+                "success": True,
+                "text": text,
+                "language": getattr(text, "language", None) or pipeline.default_language
+            }
+        else:
+            return {
+                "success": False,
+                "message": "Speech not recognized. Please try again."
+            }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Recognition error: {str(e)}"
+        }
+    finally:
+        mic.stop_stream()
+        mic.close()
+        p.terminate()
+        wake_lock.release()
+
+# Speech recognition from audio recorded in the browser (Opus or WAV upload)
+@app.route('/recognize-upload', methods=['POST'])
+def recognize_upload():
+    """Transcribe an uploaded recording instead of the server microphone"""
+    try:
+        codec = codec_for_mime(request.content_type)
+        pcm, sample_rate = codec.decode(request.get_data(), sample_rate=16000)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Audio upload error: {str(e)}"
+        }
+    
+    # Only speech is sent (and billed); leading/trailing silence is dropped locally
+    pcm = vad.trim_pcm16(pcm, sample_rate)
+    if not pcm:
+        return {
+            "success": False,
+            "message": "Speech not recognized. Please try again."
+        }
+    
+    try:
+        started = time.perf_counter()
+        text = pipeline.recognize_pcm(pcm, sample_rate, deadline=turn_deadline())
+        log_record("stt", started, source="upload", text=text or None, language=getattr(text, "language", None),
+                   audio_seconds=round(len(pcm) / 2 / sample_rate, 2))
+        
+        if text:
+            return {
+                "success": True,
+                "text": text,
+                "language": getattr(text, "language", None) or pipeline.default_language
+            }
+        else:
+            return {
+                "success": False,
+                "message": "Speech not recognized. Please try again."
+            }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Recognition error: {str(e)}"
+        }
+
+def compose_reply(user_input, language, deadline, on_token=None):
+    """Reply to one visitor turn: (reply, route, intent, llm_ms).
+
+    Banked, speculated and template replies arrive whole; LLM replies stream
+    through on_token(delta, at) as they are generated.
+    """
+    llm_ms = None
+    conversation_history.append({"role": "user", "content": user_input})
+    
+    # Banked answers and templates are Indonesian; other languages go to the LLM
+    indonesian = language == pipeline.default_language
+    intent, reply = intent_router.route(user_input) if indonesian else ("open", None)
+    route = "template"
+    # Lookups keep their templates; only a stated interest (or the answer to our
+    # interests question) gets a banked or speculated counseling answer
+    counseling_key = None
+    if indonesian and intent in ("open", "counseling"):
+        counseling_key = classify_interests(user_input, awaiting_interests=dialogue_state["awaiting_interests"])
+    banked = counseling_key is not None and answer_bank is not None and counseling_key in answer_bank
+    speculated = None if banked else speculative.take(counseling_key, deadline)
+    if banked:
+        route, intent = "bank", "counseling"
+        reply = answer_bank.text(counseling_key)
+    elif speculated:
+        route, intent = "speculative", "counseling"
+        reply = speculated[0]
+    elif reply is None:
+        route = "llm"
+        messages = conversation_history
+        if LANGUAGES[language]["instruction"]:
+            messages = messages + [{"role": "system", "content": LANGUAGES[language]["instruction"]}]
+        start = time.perf_counter()
+        reply = pipeline.complete(messages, user_input, deadline=deadline, on_token=on_token)
+        intent_router.record_llm_latency(time.perf_counter() - start)
+        llm_ms = round(1000 * (time.perf_counter() - start), 1)
+    dialogue_state["awaiting_interests"] = route == "template" and intent == "counseling"
+    conversation_history.append({"role": "assistant", "content": reply})
+    
+    # Start on the answers to the question we just asked (none if it was not one)
+    speculative.speculate(counseling_predictions(dialogue_state["awaiting_interests"], speculative.popularity,
+                                                 MINAT_BAKAT_MAPPING,
+                                                 compose_answer,
+                                                 exclude=answer_bank.entries if answer_bank else ()))
+    return reply, route, intent, llm_ms
+
 # AI response generation endpoint
 @app.route('/generate-response', methods=['POST'])
 def generate_response():
@@ -639,22 +1051,17 @@ def generate_response():
             "message": "No input provided"
         }
     
+    started = time.perf_counter()
+    deadline = turn_deadline()
+    language = request_language(data)
     try:
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT,
-            messages=conversation_history,
-            temperature=0.7,
-            max_tokens=250
-        )
-        
-        reply = response.choices[0].message.content
-        conversation_history.append({"role": "assistant", "content": reply})
-        
+        reply, route, intent, llm_ms = compose_reply(user_input, language, deadline)
+        log_record("response", started, user_input=user_input, reply=reply, route=route, intent=intent,
+                   language=language, llm_ms=llm_ms)
         return {
             "success": True,
-            "reply": reply
+            "reply": reply,
+            "language": language
         }
     except Exception as e:
         return {
@@ -662,12 +1069,62 @@ def generate_response():
             "message": f"AI error: {str(e)}"
         }
 
+# Streamed replies: the page shows tokens as they arrive instead of after the whole reply
+reply_streams = ThreadPoolExecutor(max_workers=int(os.getenv("REPLY_STREAM_WORKERS", "4")),
+                                   thread_name_prefix="reply-stream")
+
+def sse(event):
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.route('/generate-response-stream', methods=['POST'])
+def generate_response_stream():
+    """Same reply as /generate-response as server-sent events: token events, then done (or error)"""
+    data = request.json
+    user_input = data.get('text', '')
+    
+    if not user_input:
+        return {
+            "success": False,
+            "message": "No input provided"
+        }
+    
+    started = time.perf_counter()
+    deadline = turn_deadline()
+    language = request_language(data)
+    tokens = queue.Queue()
+    reply = reply_streams.submit(compose_reply, user_input, language, deadline,
+                                 lambda delta, at: tokens.put(delta))
+    reply.add_done_callback(lambda _: tokens.put(None))
+    
+    def events():
+        first_token_ms = None
+        while True:
+            delta = tokens.get()
+            if delta is None:
+                break
+            if first_token_ms is None:
+                first_token_ms = round(1000 * (time.perf_counter() - started), 1)
+            yield sse({"type": "token", "text": delta})
+        try:
+            text, route, intent, llm_ms = reply.result()
+        except Exception as e:
+            yield sse({"type": "error", "message": f"AI error: {str(e)}"})
+            return
+        log_record("response", started, user_input=user_input, reply=text, route=route, intent=intent,
+                   language=language, llm_ms=llm_ms, first_token_ms=first_token_ms)
+        # The full reply settles the text even if a fallback provider streamed it twice
+        yield sse({"type": "done", "reply": text, "language": language})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Text-to-speech endpoint
 @app.route('/generate-speech', methods=['POST'])
 def generate_speech():
     """Convert text to speech and return as base64"""
     data = request.json
     text = data.get('text', '')
+    codecs = data.get('codecs')
     
     if not text:
         return {
@@ -675,44 +1132,65 @@ def generate_speech():
             "message": "No text provided"
         }
     
+    started = time.perf_counter()
+    first_chunk_ms = None
+    deadline = turn_deadline()
     try:
-        # Configure speech synthesizer
-        config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-        config.speech_synthesis_voice_name = "id-ID-GadisNeural"
-        
-        # Use in-memory stream instead of file
-        stream = BytesIO()
-        audio_output_stream = speechsdk.audio.PushAudioOutputStream(stream)
-        audio_config = speechsdk.audio.AudioOutputConfig(stream=audio_output_stream)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=config, audio_config=audio_config)
-        
-        # Synthesize speech to memory
-        result = synthesizer.speak_text_async(text).get()
-        
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            # Get audio data as bytes
-            audio_data = result.audio_data
-            temp_path = "static/generated.wav"
-            with wave.open(temp_path, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(18000)
-                wf.writeframes(audio_data)
-
-            # Start lipsync
-            start_lipsync_with_ws(temp_path)
-            # Convert to base64 for web playback
-            # audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
+        # Audio, mouth and viseme tracks are produced once and fanned out to every sink
+        reply_tts = tts_by_language[request_language(data)]
+        banked = answer_bank.audio_for_text(text) if answer_bank else None
+        sample_rate = answer_bank.sample_rate if banked else reply_tts.sample_rate
+        if not banked:
+            banked = speculative.audio_for_text(text)
+        speech = span(deadline, "speech", text=text, sample_rate=sample_rate, banked=bool(banked))
+        player = BusPlayer(output_bus, OUTPUT_SAMPLE_RATE)
+        lipsync = StreamingLipsync(player, speech.mouth(player.send_mouth),
+                                   sample_rate, OUTPUT_SAMPLE_RATE,
+                                   target=OUTPUT_LOUDNESS_LUFS).start(lipsync_pool)
+        
+        # Banked and speculated answers play straight away; everything else is
+        # played and animated sentence by sentence as soon as it is synthesized
+        if banked:
+            block = sample_rate // 10 * 2
+            source = (banked[i:i + block] for i in range(0, len(banked), block))
+        else:
+            source = reply_tts.stream(text, deadline)
+        chunks = []
+        try:
+            # A synthesis stall past the deadline stops the half-played reply
+            with speculative.live(), deadline.hook(lipsync.cancel), speech:
+                for chunk in speech.chunks(source, keep_audio=bool(banked)):
+                    if first_chunk_ms is None:
+                        first_chunk_ms = round(1000 * (time.perf_counter() - started), 1)
+                    lipsync.feed(chunk)
+                    chunks.append(chunk)
+        finally:
+            lipsync.close()
+        # Once fully synthesized it plays to the end, unless the turn is cancelled
+        deadline.hook(lipsync.cancel, on_expiry=False)
+        audio_data = b"".join(chunks)
+        log_record("speech", started, text=text, route="cached" if banked else "tts", chars=len(text),
+                   language=request_language(data), first_chunk_ms=first_chunk_ms,
+                   audio_seconds=round(len(audio_data) / 2 / sample_rate, 2))
+
+        if audio_data:
+            if not codecs:
+                return {
+                    "success": True
+                }
             
+            # Remote clients get the reply in the best codec they can play
+            codec = negotiate(codecs)
+            audio_base64 = base64.b64encode(codec.encode(audio_data, sample_rate)).decode('utf-8')
             return {
                 "success": True,
-                # "audio": audio_base64
+                "audio": audio_base64,
+                "mime": codec.mime
             }
         else:
             return { 
                 "success": False,
-                "message": f"Speech synthesis failed: {result.reason}"
+                "message": "Speech synthesis produced no audio"
             }
     except Exception as e:
         return {
@@ -720,6 +1198,44 @@ def generate_speech():
             "message": f"Speech error: {str(e)}"
         }
 
+@app.route('/cancel-turn', methods=['POST'])
+def cancel_turn():
+    """Cancel a turn's in-flight upstream calls and playback (fetch aborted, page closed)"""
+    # navigator.sendBeacon cannot set headers, so the id may come as the body
+    turn_id = request.headers.get('X-Turn-Id') or request.get_data(as_text=True).strip()
+    if not turn_id:
+        return {
+            "success": False,
+            "message": "No turn id provided"
+        }
+    turns.cancel(turn_id)
+    return {
+        "success": True
+    }
+
+@app.route('/output-stream', methods=['GET'])
+def output_stream():
+    """Server-sent events with each reply's audio, mouth and viseme frames"""
+    sink = output_bus.add_sink(HTTPStreamSink(offset_ms=int(request.args.get('offset_ms', 0))))
+
+    def events():
+        try:
+            yield from sink.events()
+        finally:
+            # Client went away: stop delivering to it
+            output_bus.remove_sink(sink)
+
+    return Response(events(), mimetype='text/event-stream')
+
+@app.route('/output-stats', methods=['GET'])
+def output_stats():
+    """Per-sink delivered/dropped frame counts and lipsync worker load"""
+    return jsonify({
+        "success": True,
+        "data": output_bus.stats(),
+        "lipsync_pool": lipsync_pool.stats()
+    })
+
 @app.route('/get-knowledge', methods=['GET'])
 def get_knowledge():
     """API endpoint to get knowledge base information"""
@@ -728,6 +1244,154 @@ def get_knowledge():
         "data": UB_KNOWLEDGE_BASE
     })
 
+@app.route('/llm-stats', methods=['GET'])
+def llm_stats():
+    """Per-deployment latency EWMA and hedging counters"""
+    if llm_router is None:
+        return jsonify({
+            "success": False,
+            "message": "No Azure OpenAI router (LLM_PROVIDERS does not include azure)"
+        })
+    return jsonify({
+        "success": True,
+        "data": llm_router.stats()
+    })
+
+@app.route('/intent-stats', methods=['GET'])
+def intent_stats():
+    """Per-intent hit rates of the local router and LLM time saved"""
+    return jsonify({
+        "success": True,
+        "data": intent_router.stats()
+    })
+
+@app.route('/speculation-stats', methods=['GET'])
+def speculation_stats():
+    """Speculative pre-synthesis hit rate, latency saved and budget use"""
+    return jsonify({
+        "success": True,
+        "data": speculative.stats()
+    })
+
+@app.route('/provider-stats', methods=['GET'])
+def provider_stats():
+    """Per-provider latency and estimated cost for STT, chat and TTS"""
+    return jsonify({
+        "success": True,
+        "data": pipeline.stats()
+    })
+
+@app.route('/conversation-stats', methods=['GET'])
+def conversation_stats():
+    """Latency percentiles, top intents and cache opportunities from the conversation log"""
+    if conversation_log is None:
+        return jsonify({
+            "success": False,
+            "message": "Conversation log is off (set CONVERSATION_LOG_DIR to turn it on)"
+        })
+    hours = request.args.get('hours', type=float)
+    return jsonify({
+        "success": True,
+        "writer": conversation_log.stats(),
+        "data": summarize_log(CONVERSATION_LOG_DIR, time.time() - hours * 3600 if hours else None)
+    })
+
+@app.route('/diagnostics', methods=['GET'])
+def diagnostics_snapshot():
+    """Memory, per-part accounting, threads by origin and open sockets; ?objects=1 adds SDK object counts"""
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    data = diagnostics.snapshot(objects=request.args.get('objects') == '1')
+    data["streams"] = {"output_sinks": len(output_bus.stats()), "lipsync": lipsync_pool.stats()}
+    return jsonify({
+        "success": True,
+        "data": data
+    })
+
+@app.route('/diagnostics/allocations', methods=['GET', 'POST'])
+def diagnostics_allocations():
+    """POST {"action": "start"|"stop"} toggles tracemalloc; GET returns top allocators and growth since start.
+
+    Tracing stops by itself after "seconds" (at most 10 minutes); "frames" is capped at 25.
+    """
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('action') == 'start':
+            try:
+                params = number_params(data, frames=10, seconds=float(diagnostics.allocations.max_seconds))
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "message": str(e)
+                }), 400
+            diagnostics.allocations.start(params['frames'], params['seconds'])
+        elif data.get('action') == 'stop':
+            diagnostics.allocations.stop()
+        else:
+            return jsonify({
+                "success": False,
+                "message": "action must be start or stop"
+            }), 400
+        return jsonify({
+            "success": True,
+            "tracing": diagnostics.allocations.tracing
+        })
+    try:
+        top = diagnostics.allocations.top(min(number_params(request.args, top=20)['top'], 200),
+                                          request.args.get('group', 'lineno'))
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    if top is None:
+        return jsonify({
+            "success": False,
+            "message": "tracemalloc is off; POST {\"action\": \"start\"} first"
+        })
+    return jsonify({
+        "success": True,
+        "data": top
+    })
+
+@app.route('/diagnostics/profile', methods=['GET', 'POST'])
+def diagnostics_profile():
+    """POST {"action": "start", "seconds": 30, "interval_ms": 10} samples all threads into a folded-stacks file"""
+    denied = diagnostics_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('action') == 'start':
+            try:
+                params = number_params(data, seconds=30.0, interval_ms=10.0)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "message": str(e)
+                }), 400
+            started = diagnostics.profiler.start(params['seconds'], max(1.0, params['interval_ms']) / 1000)
+            if not started:
+                return jsonify({
+                    "success": False,
+                    "message": "Profiler is already running"
+                }), 409
+        elif data.get('action') == 'stop':
+            diagnostics.profiler.stop()
+        else:
+            return jsonify({
+                "success": False,
+                "message": "action must be start or stop"
+            }), 400
+    return jsonify({
+        "success": True,
+        "data": diagnostics.profiler.stats()
+    })
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -756,9 +1420,21 @@ if __name__ == '__main__':
     logger.info("Available endpoints:")
     logger.info("- / : Main interface")
     logger.info("- /recognize : Speech recognition")
+    logger.info("- /listen : Wake word gated speech recognition")
+    logger.info("- /recognize-upload : Speech recognition from browser audio")
     logger.info("- /generate-response : AI response generation")
+    logger.info("- /generate-response-stream : AI response as a token stream")
     logger.info("- /generate-speech : Text-to-speech")
+    logger.info("- /cancel-turn : Cancel a turn's upstream calls and playback")
+    logger.info("- /output-stream : Audio/mouth/viseme event stream for browser sinks")
+    logger.info("- /output-stats : Output sink buffer stats")
     logger.info("- /get-knowledge : Knowledge base API")
+    logger.info("- /llm-stats : LLM deployment latency stats")
+    logger.info("- /intent-stats : Local intent router hit rates")
+    logger.info("- /speculation-stats : Speculative TTS hit rate")
+    logger.info("- /provider-stats : STT/LLM/TTS provider latency and cost")
+    logger.info("- /conversation-stats : Conversation log analytics")
+    logger.info("- /diagnostics : Memory, thread, socket and profiler diagnostics")
     logger.info("- /health : Health check")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,380 @@
+import json
+import time
+import base64
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Frame:
+    """One output block of a reply: audio plus the tracks derived from it"""
+
+    __slots__ = ("reply_id", "index", "t", "pcm", "mouth", "viseme", "final")
+
+    def __init__(self, reply_id, index, t, pcm, mouth, viseme=None, final=False):
+        self.reply_id = reply_id
+        self.index = index
+        self.t = t  # seconds from the start of the reply
+        self.pcm = pcm
+        self.mouth = mouth
+        self.viseme = viseme
+        self.final = final  # empty end-of-reply marker (mouth closed)
+
+
+class Sink:
+    """Output with its own bounded buffer, worker thread and sync offset.
+
+    deliver() never blocks: when the buffer is full the oldest frame is
+    dropped, so a slow sink loses frames instead of stalling the bus. End of
+    reply markers are never dropped; a sink that missed one would wait for
+    that reply forever. Clocked
+    sinks wait until the frame's time (plus offset) before handling it;
+    audio sinks are paced by their device instead.
+    """
+
+    clocked = True
+
+    def __init__(self, name, buffer_frames=100, offset_ms=0):
+        self.name = name
+        self.offset = offset_ms / 1000
+        self.buffer_frames = buffer_frames
+        self._frames = deque()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._latest_reply = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.handled = 0
+        self._thread = threading.Thread(target=self._run, name=f"sink-{name}", daemon=True)
+        self._thread.start()
+
+    def deliver(self, frame, anchor):
+        with self._ready:
+            self.delivered += 1
+            if len(self._frames) >= self.buffer_frames:
+                self.dropped += 1
+                oldest = next((i for i, (f, _) in enumerate(self._frames) if not f.final), None)
+                if oldest is not None:
+                    del self._frames[oldest]
+                elif not frame.final:
+                    return
+            self._frames.append((frame, anchor))
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._frames and not self._closed:
+                    self._ready.wait()
+                if not self._frames:
+                    break
+                frame, anchor = self._frames.popleft()
+                self._latest_reply = max(self._latest_reply, frame.reply_id)
+            if self.clocked:
+                # Tracks like the mouth follow only the newest reply when replies overlap
+                if frame.reply_id < self._latest_reply:
+                    continue
+                delay = anchor + frame.t + self.offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                self.handle(frame)
+                self.handled += 1
+            except Exception as e:
+                logger.warning("Sink %s failed: %s", self.name, e)
+        self.shutdown()
+
+    def handle(self, frame):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+    def stats(self):
+        return {"sink": self.name, "delivered": self.delivered, "handled": self.handled,
+                "dropped": self.dropped, "buffered": len(self._frames), "offset_ms": round(self.offset * 1000)}
+
+
+class OutputBus:
+    """Publishes each reply's frames once to any number of sinks.
+
+    `policy` (see audio_device.POLICIES) also governs overlapping replies on
+    the bus: under "queue" a reply's first frame waits until the previous
+    reply has played out, so every sink stays in step with the audio; under
+    "replace" frames of a superseded reply are no longer published.
+    """
+
+    def __init__(self, lead_ms=0, policy="queue"):
+        self.lead = lead_ms / 1000
+        self.policy = policy
+        self._sinks = []
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(self._lock)
+        self._reply_id = 0
+        self._replies = {}  # reply_id -> [next frame index, anchor]
+        self._playing_until = 0.0
+
+    def add_sink(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+        sink.close()
+
+    def begin_reply(self):
+        with self._lock:
+            self._reply_id += 1
+            self._replies[self._reply_id] = [0, None]
+            return self._reply_id
+
+    def wait_turn(self, reply_id, max_wait=60.0):
+        """Under "queue", block until every earlier reply has ended and played out"""
+        if self.policy != "queue":
+            return
+        give_up = time.perf_counter() + max_wait
+        with self._turn:
+            while any(r < reply_id for r in self._replies) and time.perf_counter() < give_up:
+                self._turn.wait(give_up - time.perf_counter())
+            delay = min(self._playing_until, give_up) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def publish(self, t, pcm, mouth, viseme=None, reply_id=None, final=False):
+        """Send one frame to every sink; False if the reply was superseded"""
+        with self._lock:
+            reply_id = reply_id or self._reply_id
+            state = self._replies.get(reply_id)
+            if state is None or (self.policy == "replace" and reply_id < self._reply_id):
+                return False
+            if state[1] is None:
+                state[1] = time.perf_counter() + self.lead
+            frame = Frame(reply_id, state[0], t, pcm, mouth, viseme, final)
+            state[0] += 1
+            sinks = list(self._sinks)
+            anchor = state[1]
+        for sink in sinks:
+            sink.deliver(frame, anchor)
+        return True
+
+    def end_reply(self, reply_id, duration):
+        """Publish the end-of-reply marker and let the next queued reply start.
+
+        `duration` is the reply's length in seconds; a queued reply starts once
+        that much time has passed since this one's first frame.
+        """
+        self.publish(duration, b"", 0.0, "sil", reply_id=reply_id, final=True)
+        with self._turn:
+            state = self._replies.pop(reply_id, None)
+            if state is not None and state[1] is not None:
+                self._playing_until = max(self._playing_until, state[1] + duration)
+            self._turn.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return [sink.stats() for sink in self._sinks]
+
+
+def estimate_viseme(pcm, rate):
+    """Coarse viseme class from the spectral centroid: sil, O (rounded), A (open), I (spread)"""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if samples.size == 0 or np.sqrt(np.mean(samples ** 2)) < 300:
+        return "sil"
+    spectrum = np.abs(np.fft.rfft(samples))
+    freqs = np.fft.rfftfreq(samples.size, 1 / rate)
+    centroid = float((spectrum * freqs).sum() / (spectrum.sum() + 1e-9))
+    if centroid < 900:
+        return "O"
+    if centroid < 1800:
+        return "A"
+    return "I"
+
+
+class BusPlayer:
+    """Adapter so StreamingLipsync publishes to the bus instead of one device.
+
+    StreamingLipsync calls send_mouth(value) and then write(pcm) for every
+    block; the pair becomes one Frame. Sinks pace themselves, so write() only
+    has to keep the producer from running ahead of real time by too much.
+    """
+
+    def __init__(self, bus, rate, max_ahead=0.5):
+        self.bus = bus
+        self.rate = rate
+        self.max_ahead = max_ahead
+        self._mouth = 0.0
+        self._t = 0.0
+        self._started = None
+        self._closed = False
+        self.reply_id = bus.begin_reply()
+
+    def send_mouth(self, value):
+        self._mouth = value
+
+    def write(self, pcm):
+        if self._started is None:
+            self.bus.wait_turn(self.reply_id)
+            self._started = time.perf_counter()
+        if not self.bus.publish(self._t, pcm, self._mouth, estimate_viseme(pcm, self.rate),
+                                reply_id=self.reply_id):
+            return  # superseded: drop the rest of this reply without pacing
+        self._t += len(pcm) / 2 / self.rate
+        ahead = self._t - (time.perf_counter() - self._started)
+        if ahead > self.max_ahead:
+            time.sleep(ahead - self.max_ahead)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.bus.end_reply(self.reply_id, self._t)
+
+
+# ---------------------------------------------------------------------------
+# Concrete sinks
+# ---------------------------------------------------------------------------
+
+class DeviceSink(Sink):
+    """Plays frames through a shared OutputDevice; the device clock paces it"""
+
+    clocked = False
+
+    def __init__(self, device, name="pyaudio", offset_ms=0, **kwargs):
+        if offset_ms < 0:
+            raise ValueError(f"{name} offset_ms must be >= 0 (got {offset_ms}): audio cannot play early, "
+                             f"delay the other sinks instead")
+        self.device = device
+        # Not clocked, so the offset is applied as leading silence on each reply
+        self._silence_for_offset = bytes(2 * int(device.rate * offset_ms / 1000))
+        super().__init__(name, offset_ms=offset_ms, **kwargs)
+
+    def handle(self, frame):
+        if frame.final:
+            self.device.end(frame.reply_id)
+            return
+        if frame.index == 0 and self._silence_for_offset:
+            self.device.write(frame.reply_id, self._silence_for_offset)
+        self.device.write(frame.reply_id, frame.pcm)
+
+    def stats(self):
+        stats = super().stats()
+        stats["device"] = self.device.stats()
+        return stats
+
+
+class MouthSink(Sink):
+    """Calls send(value) with the mouth track, e.g. a VTube Studio connection"""
+
+    def __init__(self, send, name="vts", **kwargs):
+        self.send = send
+        super().__init__(name, **kwargs)
+
+    def handle(self, frame):
+        self.send(frame.mouth)
+
+
+class UnityWebSocketSink(Sink):
+    """Serves the mouth track to Unity avatars (UnityAvatarController) over WebSocket"""
+
+    def __init__(self, host="0.0.0.0", port=8765, name="unity", **kwargs):
+        import websockets
+        self._websockets = websockets
+        self._clients = set()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._serve, args=(host, port), name="unity-ws", daemon=True).start()
+        super().__init__(name, **kwargs)
+
+    def _serve(self, host, port):
+        asyncio.set_event_loop(self._loop)
+
+        async def handler(ws, path=None):
+            self._clients.add(ws)
+            try:
+                await ws.wait_closed()
+            finally:
+                self._clients.discard(ws)
+
+        self._loop.run_until_complete(self._websockets.serve(handler, host, port))
+        self._loop.run_forever()
+
+    def handle(self, frame):
+        message = json.dumps({"type": "mouth", "value": frame.mouth, "text": frame.viseme or ""})
+        for ws in list(self._clients):
+            asyncio.run_coroutine_threadsafe(ws.send(message), self._loop)
+
+
+class HTTPStreamSink(Sink):
+    """Per-client queue consumed by a streaming HTTP response (server-sent events)"""
+
+    def __init__(self, name="http", queue_frames=200, **kwargs):
+        self.queue = queue.Queue(maxsize=queue_frames)
+        super().__init__(name, **kwargs)
+
+    def handle(self, frame):
+        event = {"reply": frame.reply_id, "t": round(frame.t, 3), "mouth": round(frame.mouth, 3),
+                 "viseme": frame.viseme, "audio": base64.b64encode(frame.pcm).decode("ascii"),
+                 "final": frame.final}
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def events(self):
+        """Generator of SSE lines; stops when the sink is closed"""
+        while not self._closed:
+            try:
+                event = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {json.dumps(event)}\n\n"
+
+
+class NullSink(Sink):
+    def __init__(self, name="null", work=0.0, **kwargs):
+        self.work = work
+        super().__init__(name, **kwargs)
+
+    def handle(self, frame):
+        if self.work:
+            time.sleep(self.work)
+
+
+def benchmark(frames=500, block=960, rate=48000):
+    """Publisher-side cost of fan-out to 1, 10 and 100 sinks, plus one very slow sink"""
+    pcm = (np.zeros(block, dtype=np.int16)).tobytes()
+    for count in (1, 10, 100):
+        bus = OutputBus()
+        sinks = [bus.add_sink(NullSink(f"null-{i}", buffer_frames=frames, offset_ms=0)) for i in range(count)]
+        slow = bus.add_sink(NullSink("slow", work=0.5, buffer_frames=50))
+        bus.begin_reply()
+        start = time.perf_counter()
+        for i in range(frames):
+            bus.publish(i * block / rate - 10.0, pcm, 0.5)  # frames already due: no clock waits
+        publish_us = 1e6 * (time.perf_counter() - start) / frames
+        deadline = time.perf_counter() + 5
+        while time.perf_counter() < deadline and any(s.handled < frames for s in sinks):
+            time.sleep(0.01)
+        print(f"{count:>3} sinks: {publish_us:.1f} us per published frame, "
+              f"fast sinks handled {min(s.handled for s in sinks)}/{frames}, "
+              f"slow sink dropped {slow.dropped}")
+        for sink in sinks + [slow]:
+            sink.close()
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,652 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import vad
+import audio_dsp
+from deadline import Cancelled, DeadlineExceeded
+from session_recorder import span
+from language_id import (LANGUAGES, DEFAULT_LANGUAGE, Transcript, head_and_rest, language_for_locale,
+                         candidate_languages, build_language_id_from_env)
+from tts_pipeline import AzureChunkSynthesizer, SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Speech recognition
+# ---------------------------------------------------------------------------
+
+class Recognizer:
+    """Speech to text. Audio is 16-bit mono PCM; returns text or None"""
+
+    name = "recognizer"
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        raise NotImplementedError
+
+    def recognize_pcm(self, pcm, sample_rate=SAMPLE_RATE, deadline=None):
+        return self.recognize_stream([pcm], sample_rate, deadline=deadline)
+
+    def recognize_microphone(self, deadline=None):
+        return self.recognize_stream(record_utterance(deadline=deadline), SAMPLE_RATE, deadline=deadline)
+
+    def cost(self, audio_seconds):
+        return 0.0
+
+
+def record_utterance(sample_rate=SAMPLE_RATE, max_seconds=10.0, block=1600, deadline=None):
+    """Yield mic PCM from the first speech until the VAD sees it end"""
+    import pyaudio
+    detector = vad.VoiceActivityDetector(sample_rate)
+    done = threading.Event()
+    detector.subscribe("speech_end", lambda event, t: done.set())
+    p = pyaudio.PyAudio()
+    mic = p.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True, frames_per_buffer=block)
+    try:
+        for _ in range(int(max_seconds * sample_rate / block)):
+            speech = detector.process(np.frombuffer(mic.read(block, exception_on_overflow=False), dtype=np.int16) / 32768.0)
+            if speech.size:
+                yield (np.clip(speech, -1, 1) * 32767).astype(np.int16).tobytes()
+            if done.is_set() or (deadline is not None and deadline.cancelled):
+                break
+    finally:
+        mic.stop_stream()
+        mic.close()
+        p.terminate()
+
+
+class AzureRecognizer(Recognizer):
+    """Azure STT in one locale, or with at-start language identification
+    across the `auto_detect` locales in the same pass.
+
+    The recognizer for the next streamed utterance is created and connected
+    ahead of time, so neither a turn nor a switch to this language pays for
+    connection setup; a warm recognizer older than `warm_seconds` is replaced
+    because the service drops idle connections.
+    """
+
+    name = "azure-stt"
+
+    def __init__(self, speech_key, speech_region, language="id-ID", price_per_hour=1.0, auto_detect=None,
+                 warm_seconds=60.0):
+        import azure.cognitiveservices.speech as speechsdk
+        self._speechsdk = speechsdk
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.language = language
+        self.price_per_hour = price_per_hour
+        self.auto_detect = list(auto_detect) if auto_detect else None
+        self.warm_seconds = warm_seconds
+        self.config = self._config()
+        self._warm = {}  # sample rate -> (created, recognizer, push stream)
+        self._warm_lock = threading.Lock()
+        self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt-warm")
+        self._warmer.submit(self._warm_up, SAMPLE_RATE)
+
+    def _config(self):
+        config = self._speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
+        if not self.auto_detect:
+            config.speech_recognition_language = self.language
+        return config
+
+    def _recognizer(self, audio_config):
+        if self.auto_detect:
+            languages = self._speechsdk.languageconfig.AutoDetectSourceLanguageConfig(languages=self.auto_detect)
+            return self._speechsdk.SpeechRecognizer(speech_config=self.config, audio_config=audio_config,
+                                                    auto_detect_source_language_config=languages)
+        return self._speechsdk.SpeechRecognizer(speech_config=self.config, audio_config=audio_config)
+
+    def _connect(self, sample_rate):
+        """A new recognizer with an open connection, and the push stream feeding it"""
+        speechsdk = self._speechsdk
+        stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16,
+                                                          channels=1)
+        push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        recognizer = self._recognizer(speechsdk.audio.AudioConfig(stream=push_stream))
+        speechsdk.Connection.from_recognizer(recognizer).open(False)
+        return recognizer, push_stream
+
+    def _discard(self, recognizer, push_stream):
+        try:
+            self._speechsdk.Connection.from_recognizer(recognizer).close()
+            push_stream.close()
+        except Exception as e:
+            logger.debug("Could not close %s recognizer: %s", self.language, e)
+
+    def _warm_up(self, sample_rate):
+        """Connect the next recognizer in the background; the only place that fills `_warm`"""
+        with self._warm_lock:
+            warm = self._warm.get(sample_rate)
+        if warm is not None and time.monotonic() - warm[0] < self.warm_seconds:
+            return
+        try:
+            recognizer, push_stream = self._connect(sample_rate)
+        except Exception as e:
+            logger.debug("Could not pre-connect %s recognizer: %s", self.language, e)
+            return
+        with self._warm_lock:
+            replaced = self._warm.get(sample_rate)
+            self._warm[sample_rate] = (time.monotonic(), recognizer, push_stream)
+        if replaced is not None:
+            self._discard(replaced[1], replaced[2])
+
+    def _take(self, sample_rate):
+        """A connected recognizer for this utterance; the next one is prepared in the background"""
+        with self._warm_lock:
+            warm = self._warm.pop(sample_rate, None)
+        self._warmer.submit(self._warm_up, sample_rate)
+        if warm is not None:
+            if time.monotonic() - warm[0] < self.warm_seconds:
+                return warm[1], warm[2]
+            self._discard(warm[1], warm[2])
+        try:
+            return self._connect(sample_rate)
+        except Exception as e:
+            raise ProviderError(f"Azure recognizer could not connect: {e}")
+
+    def _result_text(self, result):
+        if result.reason != self._speechsdk.ResultReason.RecognizedSpeech:
+            return None
+        if not self.auto_detect:
+            return result.text
+        locale = self._speechsdk.AutoDetectSourceLanguageResult(result).language
+        return Transcript(result.text, language_for_locale(locale))
+
+    def _cancel_hook(self, recognizer):
+        # Dropping the connection makes a pending recognize_once future resolve as Canceled
+        return lambda: self._speechsdk.Connection.from_recognizer(recognizer).close()
+
+    def recognize_microphone(self, deadline=None):
+        audio_config = self._speechsdk.audio.AudioConfig(use_default_microphone=True)
+        recognizer = self._recognizer(audio_config)
+        future = recognizer.recognize_once_async()
+        if deadline is None:
+            return self._result_text(future.get())
+        with deadline.hook(self._cancel_hook(recognizer)):
+            result = future.get()
+        deadline.check()
+        return self._result_text(result)
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        recognizer, push_stream = self._take(sample_rate)
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(r=recognizer.recognize_once_async().get()),
+                                  daemon=True)
+        worker.start()
+        hook = deadline.hook(self._cancel_hook(recognizer)) if deadline is not None else None
+        try:
+            for chunk in chunks:
+                push_stream.write(chunk)
+                if not worker.is_alive() or (deadline is not None and deadline.cancelled):
+                    break  # the service already endpointed, or the turn is over
+            push_stream.close()
+            worker.join(None if deadline is None else deadline.remaining())
+        finally:
+            if hook is not None:
+                hook.remove()
+        if deadline is not None:
+            deadline.check()
+        if "r" not in result:
+            raise ProviderError("Azure recognition failed")
+        return self._result_text(result["r"])
+
+    def cost(self, audio_seconds):
+        return audio_seconds * self.price_per_hour / 3600
+
+
+class WhisperRecognizer(Recognizer):
+    """CPU-only local STT with faster-whisper (int8)"""
+
+    name = "whisper-stt"
+
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, model="small", language="id", threads=4, candidates=None):
+        from faster_whisper import WhisperModel
+        self.language = language  # None detects it, limited to `candidates`
+        self.candidates = candidates
+        # One model per process, however many languages use it
+        with self._models_lock:
+            if (model, threads) not in self._models:
+                self._models[model, threads] = WhisperModel(model, device="cpu", compute_type="int8",
+                                                            cpu_threads=threads)
+            self.model = self._models[model, threads]
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        audio = np.frombuffer(b"".join(chunks), dtype=np.int16).astype(np.float32) / 32768
+        if sample_rate != 16000:
+            resampler = audio_dsp.Resampler(sample_rate, 16000)
+            audio = np.concatenate((resampler.process(audio), resampler.flush()))
+        if audio.size == 0:
+            return None
+        segments, info = self.model.transcribe(audio, language=self.language, beam_size=1, vad_filter=False)
+        texts = []
+        # Segments are decoded lazily, so the deadline is checked between them
+        for segment in segments:
+            if deadline is not None:
+                deadline.check()
+            texts.append(segment.text.strip())
+        text = " ".join(texts).strip()
+        if not text:
+            return None
+        if self.language is None and (self.candidates is None or info.language in self.candidates):
+            return Transcript(text, info.language)
+        return text
+
+
+# ---------------------------------------------------------------------------
+# Chat models
+# ---------------------------------------------------------------------------
+
+class ChatModel:
+    """Reply text for a conversation. on_token(delta, at) receives the reply's
+    tokens with their arrival time (time.monotonic()), as far as the backend
+    streams them"""
+
+    name = "chat"
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        raise NotImplementedError
+
+    def cost(self, messages, reply):
+        return 0.0
+
+
+def _estimate_tokens(text):
+    return len(text) / 4
+
+
+class AzureChatModel(ChatModel):
+    """Hedged Azure OpenAI deployments (see llm_router.py)"""
+
+    name = "azure-llm"
+
+    def __init__(self, router, price_per_1k_input=0.00015, price_per_1k_output=0.0006):
+        self.router = router
+        self.price_per_1k_input = price_per_1k_input
+        self.price_per_1k_output = price_per_1k_output
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        return self.router.complete(messages, user_input, deadline=deadline, on_token=on_token)
+
+    def cost(self, messages, reply):
+        prompt = sum(_estimate_tokens(m["content"]) for m in messages)
+        return (prompt * self.price_per_1k_input + _estimate_tokens(reply or "") * self.price_per_1k_output) / 1000
+
+
+class OpenAICompatibleChatModel(ChatModel):
+    """Any local OpenAI-compatible server (llama.cpp, vLLM, Ollama, ...)"""
+
+    name = "local-llm"
+
+    def __init__(self, base_url, model, max_tokens=250, temperature=0.7):
+        from openai import OpenAI
+        self.client = OpenAI(base_url=base_url, api_key=os.getenv("LOCAL_LLM_KEY", "local"))
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        if deadline is not None:
+            deadline.check()
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                timeout=None if deadline is None else deadline.remaining(),
+            )
+        except Exception:
+            if deadline is not None:
+                deadline.check()
+            raise
+        reply = response.choices[0].message.content
+        if on_token is not None and reply:
+            on_token(reply, time.monotonic())
+        return reply
+
+
+# ---------------------------------------------------------------------------
+# Synthesizers: callables returning 16-bit mono PCM at SAMPLE_RATE
+# ---------------------------------------------------------------------------
+
+class AzureSynthesizer(AzureChunkSynthesizer):
+    name = "azure-tts"
+
+    def __init__(self, speech_key, speech_region, voice="id-ID-GadisNeural", ssml_builder=None,
+                 price_per_million_chars=16.0):
+        super().__init__(speech_key, speech_region, voice=voice, ssml_builder=ssml_builder)
+        self.price_per_million_chars = price_per_million_chars
+
+    def cost(self, text):
+        return len(text) * self.price_per_million_chars / 1e6
+
+
+class PiperSynthesizer:
+    """CPU-only local TTS through the piper CLI, resampled to the pipeline rate"""
+
+    name = "piper-tts"
+
+    def __init__(self, model_path, model_rate=22050, executable="piper"):
+        if shutil.which(executable) is None:
+            raise ProviderError(f"{executable} not found on PATH")
+        self.command = [executable, "--model", model_path, "--output_raw"]
+        self.model_rate = model_rate
+
+    def __call__(self, text, deadline=None):
+        process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        hook = deadline.hook(process.kill) if deadline is not None else None
+        try:
+            stdout, stderr = process.communicate(text.encode("utf-8"),
+                                                 timeout=None if deadline is None else deadline.remaining())
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise DeadlineExceeded("piper synthesis exceeded its deadline")
+        finally:
+            if hook is not None:
+                hook.remove()
+        if deadline is not None:
+            deadline.check()
+        if process.returncode:
+            raise ProviderError(f"piper exited with {process.returncode}: {stderr.decode(errors='replace')[:200]}")
+        audio = np.frombuffer(stdout, dtype=np.int16).astype(np.float32) / 32768
+        resampler = audio_dsp.Resampler(self.model_rate, SAMPLE_RATE)
+        audio = np.concatenate((resampler.process(audio), resampler.flush()))
+        return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+    def cost(self, text):
+        return 0.0
+
+
+# ---------------------------------------------------------------------------
+# Metering and routing
+# ---------------------------------------------------------------------------
+
+class ProviderMetrics:
+    def __init__(self, name, alpha=0.2):
+        self.name = name
+        self.alpha = alpha
+        self.calls = 0
+        self.errors = 0
+        self.latency_ewma = None
+        self.cost = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, cost=0.0, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.cost += cost
+            if not error:
+                self.latency_ewma = seconds if self.latency_ewma is None else \
+                    self.alpha * seconds + (1 - self.alpha) * self.latency_ewma
+
+    def stats(self):
+        with self._lock:
+            return {
+                "provider": self.name,
+                "calls": self.calls,
+                "errors": self.errors,
+                "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+                "cost": round(self.cost, 6),
+            }
+
+
+class ProviderChain:
+    """Tries providers in configured order, falling through on errors.
+
+    A provider whose latency EWMA exceeds `max_latency` is moved behind the
+    others until it recovers, so a slow region degrades to the local backend.
+    """
+
+    def __init__(self, kind, providers, max_latency=None):
+        if not providers:
+            raise ProviderError(f"No {kind} providers configured")
+        self.kind = kind
+        self.providers = providers
+        self.max_latency = max_latency
+        self.metrics = {p.name: ProviderMetrics(p.name) for p in providers}
+
+    def ordered(self):
+        if self.max_latency is None:
+            return list(self.providers)
+
+        def slow(provider):
+            ewma = self.metrics[provider.name].latency_ewma
+            return ewma is not None and ewma > self.max_latency
+
+        return sorted(self.providers, key=slow)
+
+    def call(self, method, *args, cost_args=None, **kwargs):
+        last_error = None
+        deadline = kwargs.get("deadline")
+        for provider in self.ordered():
+            if deadline is not None:
+                deadline.check()
+            start = time.perf_counter()
+            try:
+                result = getattr(provider, method)(*args, **kwargs)
+            except Cancelled:
+                # No fallback: the turn is over, not the provider
+                self.metrics[provider.name].record(time.perf_counter() - start, error=True)
+                raise
+            except Exception as e:
+                self.metrics[provider.name].record(time.perf_counter() - start, error=True)
+                logger.warning("%s provider %s failed: %s", self.kind, provider.name, e)
+                last_error = e
+                continue
+            cost = provider.cost(*cost_args(result)) if cost_args and hasattr(provider, "cost") else 0.0
+            self.metrics[provider.name].record(time.perf_counter() - start, cost)
+            return result
+        raise ProviderError(f"All {self.kind} providers failed: {last_error}")
+
+    def stats(self):
+        return [m.stats() for m in self.metrics.values()]
+
+
+class Pipeline:
+    """STT, chat and TTS provider chains with uniform metering.
+
+    `recognizers` and `synthesizers` are provider lists, or dicts of them per
+    candidate language (see language_id.py), default language first. With
+    several recognizer languages and a `language_id`, the first second of
+    each utterance picks the recognizer; recognizers that detect the language
+    themselves (Azure at-start auto-detect) go in a single list instead.
+    Transcripts carry the language they were recognized in.
+    """
+
+    def __init__(self, recognizers, chat_models, synthesizers, max_latency=None, language_id=None):
+        self.stt_by_language = self._chains("stt", recognizers, max_latency)
+        self.tts_by_language = self._chains("tts", synthesizers, max_latency)
+        self.default_language = next(iter(self.tts_by_language))
+        self.languages = list(dict.fromkeys([*self.tts_by_language, *self.stt_by_language]))
+        self.language_id = language_id
+        self.stt = next(iter(self.stt_by_language.values()))
+        self.llm = ProviderChain("llm", chat_models, max_latency)
+        self.tts = self.tts_by_language[self.default_language]
+
+    @staticmethod
+    def _chains(kind, providers, max_latency):
+        if isinstance(providers, dict):
+            return {code: ProviderChain(f"{kind}-{code}", p, max_latency) for code, p in providers.items()}
+        return {DEFAULT_LANGUAGE: ProviderChain(kind, providers, max_latency)}
+
+    def _identifies(self, language):
+        return language is None and self.language_id is not None and len(self.stt_by_language) > 1
+
+    def _transcript(self, text, language):
+        if not text:
+            return text
+        return Transcript(text, getattr(text, "language", None) or language)
+
+    # Recorded turns (see session_recorder.py) get a span per stage call.
+    # The SDK-owned microphone is recorded without its audio.
+
+    def recognize_microphone(self, deadline=None, language=None):
+        if self._identifies(language):
+            # Identification needs the audio, which the SDK microphone keeps to itself
+            return self.recognize_stream(record_utterance(deadline=deadline), SAMPLE_RATE, deadline=deadline)
+        language = language if language in self.stt_by_language else self.default_language
+        with span(deadline, "stt", source="microphone") as stage:
+            text = self._transcript(self.stt_by_language[language].call("recognize_microphone", deadline=deadline),
+                                    language)
+            stage.end(text=text, language=getattr(text, "language", None))
+        return text
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None, language=None):
+        with span(deadline, "stt", source="stream", sample_rate=sample_rate) as stage:
+            chunks = stage.chunks(chunks)
+            identified = {}
+            if self._identifies(language):
+                head, chunks = head_and_rest(chunks, sample_rate, self.language_id.seconds)
+                start = time.perf_counter()
+                language, confidence = self.language_id.identify(head, sample_rate, list(self.stt_by_language))
+                identified = {"lid_ms": round(1000 * (time.perf_counter() - start), 1),
+                              "lid_confidence": round(confidence, 3)}
+            language = language if language in self.stt_by_language else self.default_language
+            # Chunks are buffered so a fallback provider can replay the same audio
+            chunks = _Replayable(chunks)
+            text = self.stt_by_language[language].call(
+                "recognize_stream", chunks, sample_rate, deadline=deadline,
+                cost_args=lambda text: (chunks.nbytes / 2 / sample_rate,))
+            text = self._transcript(text, language)
+            stage.end(text=text, language=getattr(text, "language", None), **identified)
+        return text
+
+    def recognize_pcm(self, pcm, sample_rate=SAMPLE_RATE, deadline=None, language=None):
+        return self.recognize_stream([pcm], sample_rate, deadline=deadline, language=language)
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        """Reply text; on_token(delta, at) receives it as it streams (again from a fallback provider)"""
+        with span(deadline, "llm", user_input=user_input) as stage:
+            callbacks = [c for c in (stage.token if stage.id else None, on_token) if c is not None]
+            kwargs = {"on_token": lambda delta, at: [c(delta, at) for c in callbacks]} if callbacks else {}
+            reply = self.llm.call("complete", messages, user_input, deadline=deadline,
+                                  cost_args=lambda reply: (messages, reply), **kwargs)
+            stage.end(reply=reply)
+        return reply
+
+    def synthesize(self, text, deadline=None, language=None):
+        """Synthesizer callable usable by ParallelTTS; `language` picks the voice"""
+        chain = self.tts_by_language.get(language, self.tts)
+        with span(deadline, "tts", text=text) as stage:
+            pcm = chain.call("__call__", text, deadline=deadline, cost_args=lambda pcm: (text,))
+            stage.end(pcm=pcm)
+        return pcm
+
+    def stats(self):
+        stats = {"stt": self.stt.stats(), "llm": self.llm.stats(), "tts": self.tts.stats()}
+        for kind, chains in (("stt", self.stt_by_language), ("tts", self.tts_by_language)):
+            for code, chain in chains.items():
+                if chain is not self.stt and chain is not self.tts:
+                    stats[f"{kind}-{code}"] = chain.stats()
+        return stats
+
+
+class _Replayable:
+    """Iterable that records what it yields so it can be iterated again"""
+
+    def __init__(self, chunks):
+        self._source = iter(chunks)
+        self._seen = []
+        self.nbytes = 0
+
+    def __iter__(self):
+        yield from list(self._seen)
+        for chunk in self._source:
+            self._seen.append(chunk)
+            self.nbytes += len(chunk)
+            yield chunk
+
+
+def build_pipeline_from_env(speech_key, speech_region, llm_router=None, ssml_builder=None):
+    """Providers per stage from STT_PROVIDERS / LLM_PROVIDERS / TTS_PROVIDERS.
+
+    Each is a comma separated fallback order, e.g. ``azure,local``; ``fake``
+    providers need no network or models and run the whole pipeline offline.
+    With several LANGUAGES (e.g. ``id,en``) every language gets its own voice;
+    LANGUAGE_ID=azure (default) detects the language in the recognition pass,
+    LANGUAGE_ID=whisper picks a warm per-language recognizer from the first second.
+    """
+    languages = candidate_languages()
+    language_id = build_language_id_from_env() if len(languages) > 1 else None
+
+    def names(var, default):
+        return [n.strip() for n in os.getenv(var, default).split(",") if n.strip()]
+
+    def build(kind, name, language=DEFAULT_LANGUAGE):
+        if kind == "stt":
+            # language=None: one recognizer that detects the candidate language itself
+            if name == "azure":
+                if language is None:
+                    return AzureRecognizer(speech_key, speech_region,
+                                           auto_detect=[LANGUAGES[c]["locale"] for c in languages])
+                return AzureRecognizer(speech_key, speech_region, LANGUAGES[language]["locale"])
+            if name == "local":
+                return WhisperRecognizer(os.getenv("WHISPER_MODEL", "small"), language=language, candidates=languages)
+            if name == "fake":
+                from fake_providers import FakeRecognizer
+                return FakeRecognizer()
+        elif kind == "llm":
+            if name == "azure":
+                return AzureChatModel(llm_router)
+            if name == "local":
+                return OpenAICompatibleChatModel(os.getenv("LOCAL_LLM_URL", "http://localhost:8080/v1"),
+                                                 os.getenv("LOCAL_LLM_MODEL", "local"))
+            if name == "fake":
+                from fake_providers import FakeChatModel
+                return FakeChatModel()
+        elif kind == "tts":
+            if name == "azure":
+                # The SSML lexicon and number normalization are Indonesian
+                return AzureSynthesizer(speech_key, speech_region, voice=LANGUAGES[language]["voice"],
+                                        ssml_builder=ssml_builder if language == DEFAULT_LANGUAGE else None)
+            if name == "local":
+                if language == DEFAULT_LANGUAGE:
+                    model = os.getenv("PIPER_MODEL", "id_ID-news_tts-medium.onnx")
+                else:
+                    model = os.getenv(f"PIPER_MODEL_{language.upper()}")
+                    if not model:
+                        raise ProviderError(f"PIPER_MODEL_{language.upper()} is not set")
+                return PiperSynthesizer(model, int(os.getenv("PIPER_RATE", "22050")))
+            if name == "fake":
+                from fake_providers import FakeTTS
+                return FakeTTS(base_latency=0.0, per_char=0.0)
+        raise ProviderError(f"Unknown {kind} provider: {name}")
+
+    def chain(kind, var, language=DEFAULT_LANGUAGE):
+        providers = []
+        for name in names(var, "azure"):
+            try:
+                providers.append(build(kind, name, language))
+            except (ImportError, ProviderError) as e:
+                # A missing optional backend should not take the kiosk down
+                logger.warning("Skipping %s provider %s: %s", kind, name, e)
+        return providers
+
+    if len(languages) == 1:
+        stt, tts = chain("stt", "STT_PROVIDERS"), chain("tts", "TTS_PROVIDERS")
+    else:
+        tts = {code: chain("tts", "TTS_PROVIDERS", code) for code in languages}
+        if language_id is None:
+            stt = chain("stt", "STT_PROVIDERS", None)
+        else:
+            stt = {code: chain("stt", "STT_PROVIDERS", code) for code in languages}
+
+    max_latency = os.getenv("PROVIDER_MAX_LATENCY")
+    return Pipeline(stt, chain("llm", "LLM_PROVIDERS"), tts,
+                    max_latency=float(max_latency) if max_latency else None, language_id=language_id)
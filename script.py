@@ -4,7 +4,7 @@ import time
 import threading
 import numpy as np
 import pyaudio
-import wave
+import audio_io
 
 wav_path = "audio.wav"
 
@@ -38,22 +38,21 @@ def on_open(ws):
     ws.send(json.dumps(auth))
 
 def lipsync_wav(ws, wav_path):
-    wf = wave.open(wav_path, 'rb')
     chunk = 1024
+    info, samples = audio_io.open_wav(wav_path)
     # Setup audio playback
     p = pyaudio.PyAudio()
-    stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
-                    channels=wf.getnchannels(),
-                    rate=wf.getframerate(),
+    stream = p.open(format=audio_io.pyaudio_format(info, pyaudio),
+                    channels=info.channels,
+                    rate=info.sample_rate,
                     output=True)
     try:
-        while True:
-            data = wf.readframes(chunk)
-            if not data:
-                break
+        for start in range(0, info.nframes, chunk):
+            block = samples[start:start + chunk]
             # Play audio chunk
-            stream.write(data)
-            audio = np.frombuffer(data, dtype=np.int16)
+            stream.write(block.tobytes())
+            # Envelope on the int16 scale whatever the stored sample format is
+            audio = audio_io.to_float32(block, info) * 32768
             volume = np.linalg.norm(audio) / chunk
             mouth_value = min(volume / 500, 1.0)
             param = {
@@ -72,13 +71,12 @@ def lipsync_wav(ws, wav_path):
                     ]
                 }
             }
+            # stream.write blocks for the chunk's duration, which paces the mouth updates
             ws.send(json.dumps(param))
-            time.sleep(chunk / wf.getframerate())
     finally:
         stream.stop_stream()
         stream.close()
         p.terminate()
-        wf.close()
 
 ws = websocket.WebSocketApp(
     "ws://localhost:8001",
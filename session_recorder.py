@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import zipfile
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Bump when the event layout changes; load_session() refuses newer files
+SESSION_VERSION = 1
+
+
+class TurnTrace:
+    """Timestamped events and audio of one turn.
+
+    Events are ``[t, kind, span, data]`` with `t` in seconds since the turn
+    started (monotonic clock) and `span` tying together the start, chunk and
+    end events of one stage call, e.g. concurrent per-sentence TTS requests.
+    Audio is appended to a single per-turn blob and referenced from the event
+    data as ``"audio": [offset, length]``.
+    """
+
+    def __init__(self, turn_id=None):
+        self.turn_id = turn_id
+        self.wall = time.time()
+        self.t0 = time.monotonic()
+        self.events = []
+        self.blob = bytearray()
+        self._spans = 0
+        self._lock = threading.Lock()
+
+    def event(self, kind, span=0, at=None, **data):
+        t = (time.monotonic() if at is None else at) - self.t0
+        with self._lock:
+            self.events.append([round(t, 4), kind, span, data])
+
+    def audio(self, pcm):
+        with self._lock:
+            offset = len(self.blob)
+            self.blob += pcm
+        return [offset, len(pcm)]
+
+    def span(self, stage, **data):
+        with self._lock:
+            self._spans += 1
+            span_id = self._spans
+        return Span(self, stage, span_id, data)
+
+    @property
+    def duration(self):
+        with self._lock:
+            return self.events[-1][0] if self.events else 0.0
+
+
+class Span:
+    """One stage call within a turn; a context manager that records start and end"""
+
+    def __init__(self, trace, stage, span_id, data):
+        self.trace = trace
+        self.stage = stage
+        self.id = span_id
+        self.data = data
+        self.ended = False
+
+    def __enter__(self):
+        self.trace.event(f"{self.stage}.start", self.id, **self.data)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.ended:
+            self.end(**({"error": f"{exc_type.__name__}: {exc}"} if exc_type else {}))
+
+    def end(self, pcm=None, **data):
+        if pcm is not None:
+            data["audio"] = self.trace.audio(pcm)
+        self.ended = True
+        self.trace.event(f"{self.stage}.end", self.id, **data)
+
+    def token(self, delta, at=None):
+        """on_token callback for chat models"""
+        self.trace.event(f"{self.stage}.token", self.id, at=at, text=delta)
+
+    def chunks(self, chunks, keep_audio=True):
+        """Pass chunks through, recording when each one arrived"""
+        for chunk in chunks:
+            if keep_audio:
+                self.trace.event(f"{self.stage}.chunk", self.id, audio=self.trace.audio(chunk))
+            else:
+                self.trace.event(f"{self.stage}.chunk", self.id, bytes=len(chunk))
+            yield chunk
+
+    def mouth(self, send_mouth):
+        """Wrap a send_mouth callback so every lipsync message is recorded"""
+        def traced(value):
+            self.trace.event(f"{self.stage}.mouth", self.id, v=round(value, 3))
+            send_mouth(value)
+        return traced
+
+
+class _NullSpan:
+    id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def end(self, pcm=None, **data):
+        pass
+
+    def chunks(self, chunks, keep_audio=True):
+        return chunks
+
+    def mouth(self, send_mouth):
+        return send_mouth
+
+
+_null_span = _NullSpan()
+
+
+def span(deadline, stage, **data):
+    """Span on the turn's trace, or a no-op when the turn is not being recorded"""
+    trace = getattr(deadline, "trace", None)
+    if trace is None:
+        return _null_span
+    return trace.span(stage, **data)
+
+
+def build_id():
+    """BUILD_ID, else the current git commit, so sessions replayed on different builds can be told apart"""
+    if os.getenv("BUILD_ID"):
+        return os.getenv("BUILD_ID")
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=2, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class SessionRecorder:
+    """Writes turn traces to compact session files for offline replay.
+
+    A session file is a zip archive with a ``session.json`` header (format
+    version, build, start time) and one ``turn-NNNN.json`` / ``turn-NNNN.pcm``
+    pair per turn. A turn is written once the next one starts (or on close()),
+    so playback that outlives its request is still captured; turns shorter
+    than `min_turn_seconds` are dropped to keep only the slow ones. Files
+    rotate after `turns_per_file` turns. Writing happens on one background
+    thread, never in a request.
+    """
+
+    def __init__(self, directory, turns_per_file=50, min_turn_seconds=0.0, build=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.turns_per_file = turns_per_file
+        self.min_turn_seconds = min_turn_seconds
+        self.build = build if build is not None else build_id()
+        self.path = None
+        self._turns_in_file = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-writer")
+        self.written = 0
+        self.skipped = 0
+
+    def trace(self, turn_id):
+        """The turn's trace; starting a new turn finishes the previous ones"""
+        if not turn_id:
+            return None
+        with self._lock:
+            trace = self._pending.get(turn_id)
+            if trace is not None:
+                return trace
+            finished = list(self._pending.values())
+            self._pending = {turn_id: TurnTrace(turn_id)}
+            trace = self._pending[turn_id]
+        for old in finished:
+            self.finish(old)
+        return trace
+
+    def finish(self, trace):
+        with self._lock:
+            if self._pending.get(trace.turn_id) is trace:
+                del self._pending[trace.turn_id]
+        if trace.duration < self.min_turn_seconds or not trace.events:
+            self.skipped += 1
+            return None
+        return self._writer.submit(self._write, trace)
+
+    def _write(self, trace):
+        try:
+            if self.path is None or self._turns_in_file >= self.turns_per_file:
+                self.path = os.path.join(self.directory, time.strftime("session-%Y%m%d-%H%M%S.zip"))
+                self._turns_in_file = 0
+                with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as archive:
+                    archive.writestr("session.json", json.dumps({
+                        "version": SESSION_VERSION,
+                        "build": self.build,
+                        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    }))
+            self._turns_in_file += 1
+            name = f"turn-{self._turns_in_file:04d}"
+            with zipfile.ZipFile(self.path, "a", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr(name + ".json", json.dumps({
+                    "turn_id": trace.turn_id,
+                    "wall": trace.wall,
+                    "events": trace.events,
+                }, separators=(",", ":")))
+                if trace.blob:
+                    archive.writestr(name + ".pcm", bytes(trace.blob))
+            self.written += 1
+        except Exception as e:
+            logger.warning("Could not write session turn: %s", e)
+
+    def close(self):
+        """Write the turns still pending and wait for the writer"""
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        for trace in pending:
+            self.finish(trace)
+        self._writer.shutdown(wait=True)
+
+    def stats(self):
+        return {"path": self.path, "written": self.written, "skipped": self.skipped,
+                "pending": len(self._pending)}
+
+
+def load_session(path):
+    """Header dict with a "turns" list of {turn_id, wall, events, blob}"""
+    with zipfile.ZipFile(path) as archive:
+        header = json.loads(archive.read("session.json"))
+        if header.get("version", 0) > SESSION_VERSION:
+            raise ValueError(f"{path} is session format v{header['version']}, "
+                             f"this build reads up to v{SESSION_VERSION}")
+        names = set(archive.namelist())
+        turns = []
+        for name in sorted(n for n in names if n.startswith("turn-") and n.endswith(".json")):
+            turn = json.loads(archive.read(name))
+            pcm = name[:-5] + ".pcm"
+            turn["blob"] = archive.read(pcm) if pcm in names else b""
+            turns.append(turn)
+    header["turns"] = turns
+    return header
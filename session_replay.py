@@ -0,0 +1,338 @@
+import sys
+import time
+import logging
+import tempfile
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from deadline import Deadline, sleep
+from providers import Recognizer, ChatModel, Pipeline, ProviderError
+from session_recorder import SessionRecorder, load_session, span
+from tts_pipeline import ParallelTTS, SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedTurn:
+    """Spans of one recorded turn, rebuilt from its event list"""
+
+    def __init__(self, turn):
+        self.turn_id = turn.get("turn_id")
+        self.blob = turn.get("blob", b"")
+        spans = {}
+        for t, kind, span_id, data in turn["events"]:
+            stage, what = kind.rsplit(".", 1)
+            s = spans.setdefault(span_id, {"stage": stage, "start": t, "end": None, "data": {},
+                                           "result": {}, "chunks": [], "tokens": [], "mouth": []})
+            if what == "start":
+                s["start"], s["data"] = t, data
+            elif what == "end":
+                s["end"], s["result"] = t, data
+            elif what == "chunk":
+                s["chunks"].append((t, data))
+            elif what == "token":
+                s["tokens"].append((t, data["text"]))
+            elif what == "mouth":
+                s["mouth"].append((t, data["v"]))
+        self.spans = sorted(spans.values(), key=lambda s: s["start"])
+
+    def audio(self, ref):
+        offset, length = ref
+        return self.blob[offset:offset + length]
+
+    def first(self, stage):
+        return next((s for s in self.spans if s["stage"] == stage), None)
+
+
+# ---------------------------------------------------------------------------
+# Upstream stand-ins: answer from the recording with the recorded latency
+# ---------------------------------------------------------------------------
+
+class ReplayRecognizer(Recognizer):
+    name = "replay-stt"
+
+    def __init__(self, time_scale=1.0):
+        self.time_scale = time_scale
+        self.turn = None
+
+    def _answer(self, seconds, deadline):
+        s = self.turn.first("stt")
+        sleep(self.time_scale * seconds, deadline)
+        if "error" in s["result"]:
+            raise ProviderError(s["result"]["error"])
+        return s["result"].get("text")
+
+    def recognize_stream(self, chunks, sample_rate=SAMPLE_RATE, deadline=None):
+        for _ in chunks:
+            pass
+        s = self.turn.first("stt")
+        # Only the time from the end of the audio to the transcript is the service's
+        last = s["chunks"][-1][0] if s["chunks"] else s["start"]
+        return self._answer(s["end"] - last, deadline)
+
+    def recognize_microphone(self, deadline=None):
+        s = self.turn.first("stt")
+        return self._answer(s["end"] - s["start"], deadline)
+
+
+class ReplayChatModel(ChatModel):
+    name = "replay-llm"
+
+    def __init__(self, time_scale=1.0):
+        self.time_scale = time_scale
+        self.turn = None
+
+    def complete(self, messages, user_input="", deadline=None, on_token=None):
+        s = self.turn.first("llm")
+        at = s["start"]
+        for t, delta in s["tokens"]:
+            sleep(self.time_scale * (t - at), deadline)
+            at = t
+            if on_token is not None:
+                on_token(delta, time.monotonic())
+        sleep(self.time_scale * (s["end"] - at), deadline)
+        if "error" in s["result"]:
+            raise ProviderError(s["result"]["error"])
+        return s["result"].get("reply")
+
+
+class ReplaySynthesizer:
+    """Recorded audio per sentence after the recorded latency.
+
+    Sentences the recording does not have (a build that splits text
+    differently) get silence of a plausible length after the mean latency.
+    """
+
+    name = "replay-tts"
+
+    def __init__(self, time_scale=1.0, chars_per_second=14):
+        self.time_scale = time_scale
+        self.chars_per_second = chars_per_second
+        self.turn = None
+        self._indexed = None
+        self._calls = {}
+        self._mean_latency = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self):
+        self._calls = defaultdict(list)
+        latencies = []
+        for s in self.turn.spans:
+            if s["stage"] == "tts" and s["end"] is not None and "audio" in s["result"]:
+                latency = s["end"] - s["start"]
+                self._calls[s["data"]["text"]].append((latency, self.turn.audio(s["result"]["audio"])))
+                latencies.append(latency)
+        self._mean_latency = float(np.mean(latencies)) if latencies else 0.0
+        self._indexed = self.turn
+
+    def __call__(self, text, deadline=None):
+        with self._lock:
+            if self._indexed is not self.turn:
+                self._index()
+            calls = self._calls.get(text)
+            if calls:
+                latency, pcm = calls.pop(0)
+            else:
+                latency = self._mean_latency
+                pcm = b"\0\0" * int(SAMPLE_RATE * len(text) / self.chars_per_second)
+        sleep(self.time_scale * latency, deadline)
+        return pcm
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+def _paced(recorded, s):
+    """Recorded input audio, released at its original pace"""
+    start = time.monotonic()
+    for t, data in s["chunks"]:
+        delay = (t - s["start"]) - (time.monotonic() - start)
+        if delay > 0:
+            time.sleep(delay)
+        yield recorded.audio(data["audio"])
+
+
+def _replay_turn(recorded, pipeline, tts, deadline):
+    from streaming_lipsync import StreamingLipsync, ClockPlayer
+
+    for s in recorded.spans:
+        if s["stage"] == "stt":
+            if s["data"].get("source") == "stream":
+                pipeline.recognize_stream(_paced(recorded, s), s["data"].get("sample_rate", SAMPLE_RATE),
+                                          deadline=deadline)
+            else:
+                pipeline.recognize_microphone(deadline=deadline)
+        elif s["stage"] == "llm":
+            user_input = s["data"].get("user_input", "")
+            pipeline.complete([{"role": "user", "content": user_input}], user_input, deadline=deadline)
+        elif s["stage"] == "speech":
+            # Same path as /generate-speech, played on a clock instead of a sound card
+            text, banked = s["data"]["text"], s["data"].get("banked", False)
+            sample_rate = s["data"].get("sample_rate", SAMPLE_RATE)
+            with span(deadline, "speech", text=text, sample_rate=sample_rate, banked=banked) as speech:
+                lipsync = StreamingLipsync(ClockPlayer(sample_rate), speech.mouth(lambda value: None),
+                                           sample_rate, sample_rate).start()
+                if banked:
+                    source = (recorded.audio(data["audio"]) for _, data in s["chunks"] if "audio" in data)
+                else:
+                    source = tts.stream(text, deadline)
+                try:
+                    for chunk in speech.chunks(source, keep_audio=banked):
+                        lipsync.feed(chunk)
+                finally:
+                    lipsync.close()
+                speech.end()
+            lipsync.join()
+
+
+def replay(path, time_scale=1.0, out_dir=None, tts_workers=4, build=None):
+    """Drive the local pipeline from a session file; returns the path of the replayed session.
+
+    Upstream services answer from the recording with their recorded latency
+    multiplied by `time_scale` (0 answers at once); recorded input audio is
+    fed at its original pace. Stages run back to back, without the client's
+    think time between requests. The replay is itself recorded, so it can be
+    compared with the original or with a replay on another build.
+    """
+    session = load_session(path)
+    recognizer, chat, synthesizer = ReplayRecognizer(time_scale), ReplayChatModel(time_scale), ReplaySynthesizer(time_scale)
+    pipeline = Pipeline([recognizer], [chat], [synthesizer])
+    tts = ParallelTTS(pipeline.synthesize, max_workers=tts_workers)
+    recorder = SessionRecorder(out_dir or tempfile.mkdtemp(prefix="replay-"), turns_per_file=10 ** 6, build=build)
+    for turn in session["turns"]:
+        recorded = RecordedTurn(turn)
+        recognizer.turn = chat.turn = synthesizer.turn = recorded
+        deadline = Deadline(None, name=f"replay {recorded.turn_id}")
+        deadline.trace = recorder.trace(recorded.turn_id or str(id(recorded)))
+        try:
+            _replay_turn(recorded, pipeline, tts, deadline)
+        except Exception as e:
+            logger.warning("Replay of turn %s failed: %s", recorded.turn_id, e)
+    recorder.close()
+    return recorder.path
+
+
+# ---------------------------------------------------------------------------
+# Stage timings
+# ---------------------------------------------------------------------------
+
+def turn_timings(recorded):
+    """Stage name -> list of durations in seconds for one turn"""
+    timings = defaultdict(list)
+    for s in recorded.spans:
+        if s["end"] is None or "error" in s["result"]:
+            continue
+        stage, start = s["stage"], s["start"]
+        timings[stage].append(s["end"] - start)
+        if stage == "stt" and s["chunks"]:
+            timings["stt_after_audio"].append(s["end"] - s["chunks"][-1][0])
+        elif stage == "llm" and s["tokens"]:
+            timings["llm_first_token"].append(s["tokens"][0][0] - start)
+        elif stage == "speech":
+            if s["chunks"]:
+                timings["speech_first_chunk"].append(s["chunks"][0][0] - start)
+            if s["mouth"]:
+                timings["speech_first_mouth"].append(s["mouth"][0][0] - start)
+                timings["speech_playback"].append(s["mouth"][-1][0] - start)
+    return timings
+
+
+def report(path):
+    """Per-stage count, p50, p95 and max in milliseconds over every turn of a session"""
+    session = load_session(path)
+    values = defaultdict(list)
+    for turn in session["turns"]:
+        for stage, durations in turn_timings(RecordedTurn(turn)).items():
+            values[stage].extend(durations)
+    stages = {}
+    for stage, durations in sorted(values.items()):
+        ms = 1000 * np.array(durations)
+        stages[stage] = {"n": len(durations), "p50": round(float(np.percentile(ms, 50)), 1),
+                         "p95": round(float(np.percentile(ms, 95)), 1), "max": round(float(ms.max()), 1)}
+    return {"build": session.get("build"), "turns": len(session["turns"]), "stages": stages}
+
+
+def diff(path_a, path_b):
+    """Stage timings of two sessions side by side, with the p50/p95 change of b against a"""
+    a, b = report(path_a), report(path_b)
+    rows = []
+    for stage in sorted(set(a["stages"]) | set(b["stages"])):
+        sa, sb = a["stages"].get(stage), b["stages"].get(stage)
+        row = {"stage": stage, "a": sa, "b": sb}
+        if sa and sb:
+            row["p50_delta_ms"] = round(sb["p50"] - sa["p50"], 1)
+            row["p95_delta_ms"] = round(sb["p95"] - sa["p95"], 1)
+        rows.append(row)
+    return {"a": {"build": a["build"], "turns": a["turns"]}, "b": {"build": b["build"], "turns": b["turns"]},
+            "stages": rows}
+
+
+def print_diff(result):
+    print(f"a: build {result['a']['build']}, {result['a']['turns']} turns")
+    print(f"b: build {result['b']['build']}, {result['b']['turns']} turns")
+    print(f"{'stage':<20}{'a p50':>10}{'b p50':>10}{'delta':>10}{'a p95':>10}{'b p95':>10}{'delta':>10}")
+    for row in result["stages"]:
+        a, b = row["a"] or {}, row["b"] or {}
+        print(f"{row['stage']:<20}{a.get('p50', '-'):>10}{b.get('p50', '-'):>10}{row.get('p50_delta_ms', '-'):>10}"
+              f"{a.get('p95', '-'):>10}{b.get('p95', '-'):>10}{row.get('p95_delta_ms', '-'):>10}")
+
+
+def demo(turns=3, out_dir=None):
+    """Record a session through fake upstreams, then replay it at full and half upstream latency"""
+    from fake_providers import FakeRecognizer, FakeChatModel, FakeTTS
+
+    out_dir = out_dir or tempfile.mkdtemp(prefix="session-demo-")
+    pipeline = Pipeline([FakeRecognizer(["apa itu AI Center", "aku suka matematika"], delay=0.3)],
+                        [FakeChatModel("AI Center UB adalah pusat riset kecerdasan buatan. "
+                                       "Ada pelatihan dan workshop rutin untuk mahasiswa.", delay=0.4)],
+                        [FakeTTS(base_latency=0.2, per_char=0.002)])
+    tts = ParallelTTS(pipeline.synthesize, max_workers=2)
+    recorder = SessionRecorder(out_dir, build="demo")
+    utterance = (2000 * np.sin(2 * np.pi * 180 * np.arange(SAMPLE_RATE) / SAMPLE_RATE)).astype(np.int16).tobytes()
+    for i in range(turns):
+        deadline = Deadline(None)
+        deadline.trace = recorder.trace(f"demo-{i}")
+        pipeline.recognize_stream((utterance[j:j + 3200] for j in range(0, len(utterance), 3200)), deadline=deadline)
+        reply = pipeline.complete([], "", deadline=deadline)
+        with span(deadline, "speech", text=reply, sample_rate=SAMPLE_RATE, banked=False) as speech:
+            for _ in speech.chunks(tts.stream(reply, deadline), keep_audio=False):
+                pass
+            speech.end()
+    recorder.close()
+    original = recorder.path
+    full = replay(original, 1.0, build="replay-x1.0")
+    half = replay(original, 0.5, build="replay-x0.5")
+    return original, full, half
+
+
+USAGE = """usage:
+  python session_replay.py report SESSION
+  python session_replay.py replay SESSION [TIME_SCALE] [OUT_DIR]
+  python session_replay.py diff SESSION_A SESSION_B
+  python session_replay.py demo"""
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == "report" and len(args) == 1:
+        for stage, row in report(args[0])["stages"].items():
+            print(f"{stage:<20}{row}")
+    elif command == "replay" and 1 <= len(args) <= 3:
+        replayed = replay(args[0], float(args[1]) if len(args) > 1 else 1.0, args[2] if len(args) > 2 else None)
+        print(f"replayed session: {replayed}")
+        print_diff(diff(args[0], replayed))
+    elif command == "diff" and len(args) == 2:
+        print_diff(diff(*args))
+    elif command == "demo":
+        original, full, half = demo()
+        print(f"recorded {original}")
+        print_diff(diff(original, full))
+        print()
+        print_diff(diff(full, half))
+    else:
+        print(USAGE)
+        sys.exit(1)
@@ -0,0 +1,211 @@
+import time
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from deadline import Deadline, Cancelled
+
+logger = logging.getLogger(__name__)
+
+
+class Speculation:
+    __slots__ = ("key", "text", "future", "deadline", "started", "synth_seconds")
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.future = None
+        self.deadline = None
+        self.started = False
+        self.synth_seconds = None
+
+
+class SpeculativeTTS:
+    """Pre-synthesizes the replies the next user turn is most likely to need.
+
+    speculate() takes a list of (key, text) predictions, cancels whatever was
+    speculated for the previous turn and queues the new ones on a single
+    background worker. The worker yields to live synthesis (see live()) and
+    stops once `budget_chars` characters were spent within the last hour, so
+    speculation never competes with a real reply or runs up the TTS bill.
+    take(key) commits a prediction: it returns its (text, pcm) when the audio
+    is ready or already being made, and None for a miss.
+    """
+
+    def __init__(self, synthesize, top_k=3, budget_chars=20000, timeout=15.0):
+        self.synthesize = synthesize
+        self.top_k = top_k
+        self.budget_chars = budget_chars
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._live = 0
+        self._current = {}
+        self._committed = {}  # text -> pcm of the last hit, for /generate-speech
+        self._spent = deque()  # (time, chars) within the budget window
+        self.popularity = Counter()
+        self.predicted = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_chars = 0
+        self.saved_seconds = 0.0
+
+    # -- live synthesis gate ------------------------------------------------
+
+    class _Live:
+        def __init__(self, engine):
+            self.engine = engine
+
+        def __enter__(self):
+            with self.engine._lock:
+                self.engine._live += 1
+
+        def __exit__(self, *exc):
+            with self.engine._idle:
+                self.engine._live -= 1
+                self.engine._idle.notify_all()
+
+    def live(self):
+        """Context manager around real synthesis; speculation waits while it runs"""
+        return self._Live(self)
+
+    # -- speculation --------------------------------------------------------
+
+    def _budget_left(self, now):
+        while self._spent and now - self._spent[0][0] > 3600:
+            self._spent.popleft()
+        return self.budget_chars - sum(chars for _, chars in self._spent)
+
+    def speculate(self, predictions):
+        """Replace the current speculation with the top-k (key, text) predictions"""
+        self.discard()
+        with self._lock:
+            for key, text in predictions[:self.top_k]:
+                spec = Speculation(key, text)
+                self._current[key] = spec
+                spec.future = self._executor.submit(self._run, spec)
+                self.predicted += 1
+
+    def _run(self, spec):
+        with self._idle:
+            while self._live:
+                self._idle.wait()
+            if self._current.get(spec.key) is not spec:
+                return None
+            now = time.monotonic()
+            if self._budget_left(now) < len(spec.text):
+                logger.debug("Speculation budget spent, skipping %s", spec.key)
+                return None
+            self._spent.append((now, len(spec.text)))
+            spec.started = True
+            # Bounded like a live turn, and cancelled outright by discard()
+            spec.deadline = Deadline(self.timeout, name=f"speculation {spec.key}")
+        start = time.perf_counter()
+        try:
+            pcm = self.synthesize(spec.text, deadline=spec.deadline)
+        except Cancelled:
+            return None
+        spec.synth_seconds = time.perf_counter() - start
+        return pcm
+
+    def take(self, key, deadline=None):
+        """(text, pcm) for a predicted key, or None when it was not speculated"""
+        if key is None:
+            return None
+        with self._lock:
+            self.popularity[key] += 1
+            speculated = bool(self._current)
+            spec = self._current.pop(key, None)
+            if spec is None:
+                self.misses += speculated
+                return None
+        if not spec.started and spec.future.cancel():
+            with self._lock:
+                self.misses += 1
+            return None
+        # Finished or in flight: waiting is never slower than starting over
+        try:
+            pcm = spec.future.result(None if deadline is None else deadline.remaining())
+        except FutureTimeout:
+            if spec.deadline is not None:
+                spec.deadline.cancel("turn deadline")
+            pcm = None
+        with self._lock:
+            if not pcm:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += spec.synth_seconds or 0.0
+            self._committed = {spec.text: pcm}
+        return spec.text, pcm
+
+    def audio_for_text(self, text):
+        with self._lock:
+            return self._committed.pop(text, None)
+
+    def discard(self):
+        """Drop every outstanding speculation; started ones count as wasted"""
+        with self._lock:
+            current, self._current = self._current, {}
+        for spec in current.values():
+            if not spec.future.cancel() and spec.started:
+                spec.deadline.cancel("discarded")
+                with self._lock:
+                    self.wasted_chars += len(spec.text)
+
+    def stats(self):
+        with self._lock:
+            committed = self.hits + self.misses
+            return {
+                "predicted": self.predicted,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / committed, 3) if committed else None,
+                "latency_saved_s": round(self.saved_seconds, 2),
+                "budget_chars_per_hour": self.budget_chars,
+                "chars_spent_last_hour": self.budget_chars - self._budget_left(time.monotonic()),
+                "wasted_chars": self.wasted_chars,
+            }
+
+
+def counseling_predictions(awaiting_interests, popularity, mapping, compose, exclude=()):
+    """Single-interest answers ranked by how often visitors picked them.
+
+    Only right after the assistant asked for the visitor's interests (the
+    session's explicit dialogue state); any other reply predicts nothing.
+    """
+    from answer_bank import entry_key
+    if not awaiting_interests:
+        return []
+    ranked = sorted(mapping, key=lambda c: -popularity[entry_key([c])])
+    return [(entry_key([c]), compose([c], mapping)) for c in ranked if entry_key([c]) not in exclude]
+
+
+def benchmark(turns=60, seed=0, talk_seconds=0.6):
+    """Simulated counseling turns with a slow fake synthesizer: hit rate and time saved"""
+    import random
+    from knowledge_base import MINAT_BAKAT_MAPPING
+    from answer_bank import compose_answer, entry_key
+
+    def synthesize(text, deadline=None):
+        time.sleep(0.001 * len(text))  # ~0.2 s per answer
+        return b"\x00\x00" * len(text)
+
+    rng = random.Random(seed)
+    # Skewed interest distribution, like real open-day traffic
+    weights = {c: w for c, w in zip(MINAT_BAKAT_MAPPING, (8, 5, 3, 4, 4, 1, 1, 2, 1, 1))}
+    engine = SpeculativeTTS(synthesize, top_k=3, budget_chars=100000)
+    for _ in range(turns):
+        engine.speculate(counseling_predictions(True, engine.popularity,
+                                                MINAT_BAKAT_MAPPING, compose_answer))
+        time.sleep(talk_seconds)  # the user is talking
+        choice = rng.choices(list(weights), weights=list(weights.values()))[0]
+        engine.take(entry_key([choice]))
+    engine.discard()
+    return engine.stats()
+
+
+if __name__ == '__main__':
+    print(benchmark())
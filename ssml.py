@@ -0,0 +1,166 @@
+import re
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+
+# Indonesian letter names used to spell out unknown abbreviations
+_LETTERS = {
+    "a": "a", "b": "be", "c": "ce", "d": "de", "e": "e", "f": "ef", "g": "ge",
+    "h": "ha", "i": "i", "j": "je", "k": "ka", "l": "el", "m": "em", "n": "en",
+    "o": "o", "p": "pe", "q": "ki", "r": "er", "s": "es", "t": "te", "u": "u",
+    "v": "ve", "w": "we", "x": "eks", "y": "ye", "z": "zet",
+}
+
+# How UB abbreviations are actually said on campus; anything else is spelled out
+PRONUNCIATIONS = {
+    "UB": "u be",
+    "FMIPA": "ef mipa",
+    "FKIP": "ef kip",
+    "FISIP": "fisip",
+    "FPet": "ef pet",
+    "FPIK": "ef pik",
+    "AI": "e i",
+    "GPU": "ji pi yu",
+}
+
+_DIGITS = ["nol", "satu", "dua", "tiga", "empat", "lima", "enam", "tujuh", "delapan", "sembilan"]
+_SCALES = [(10 ** 12, "triliun"), (10 ** 9, "miliar"), (10 ** 6, "juta"), (1000, "ribu")]
+_MONTHS = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli",
+           "Agustus", "September", "Oktober", "November", "Desember"]
+
+
+def spell_letters(word):
+    return " ".join(_LETTERS.get(c, c) for c in word.lower())
+
+
+def terbilang(n):
+    """Integer to Indonesian words, e.g. 1250 -> 'seribu dua ratus lima puluh'"""
+    if n < 0:
+        return "minus " + terbilang(-n)
+    if n < 10:
+        return _DIGITS[n]
+    if n < 20:
+        if n == 10:
+            return "sepuluh"
+        if n == 11:
+            return "sebelas"
+        return _DIGITS[n - 10] + " belas"
+    if n < 100:
+        tens, rest = divmod(n, 10)
+        return _DIGITS[tens] + " puluh" + (" " + _DIGITS[rest] if rest else "")
+    if n < 1000:
+        hundreds, rest = divmod(n, 100)
+        head = "seratus" if hundreds == 1 else _DIGITS[hundreds] + " ratus"
+        return head + (" " + terbilang(rest) if rest else "")
+    for scale, name in _SCALES:
+        if n >= scale:
+            count, rest = divmod(n, scale)
+            head = "seribu" if scale == 1000 and count == 1 else terbilang(count) + " " + name
+            return head + (" " + terbilang(rest) if rest else "")
+    return str(n)
+
+
+def _trie_pattern(words):
+    """Compile words into a prefix-sharing regex so matching is a single trie walk"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if end else body
+
+    return build(trie)
+
+
+def lexicon_from_knowledge_base(knowledge_base):
+    """Abbreviation -> spoken form, from the faculty keys plus known extras"""
+    lexicon = {}
+    for key in knowledge_base.get("fakultas", {}):
+        lexicon[key] = PRONUNCIATIONS.get(key, spell_letters(key))
+    for key, spoken in PRONUNCIATIONS.items():
+        lexicon.setdefault(key, spoken)
+    return lexicon
+
+
+class SSMLBuilder:
+    """Single-pass Indonesian text normalizer and SSML builder.
+
+    Dates, times, ordinals, numbers, percentages and lexicon abbreviations are
+    matched by one compiled regex, so normalizing a sentence is one scan no
+    matter how large the lexicon is. Built SSML is cached per sentence.
+    """
+
+    def __init__(self, lexicon, voice="id-ID-GadisNeural", rate=None, cache_size=4096):
+        self.lexicon = dict(lexicon)
+        self.voice = voice
+        self.rate = rate
+        abbreviations = _trie_pattern(sorted(self.lexicon, key=len, reverse=True))
+        self._pattern = re.compile(
+            r"(?P<date>\b(?P<d>\d{1,2})[/-](?P<m>\d{1,2})[/-](?P<y>\d{4})\b)"
+            r"|(?P<time>\bpukul\s+(?P<hh>\d{1,2})[.:](?P<mm>\d{2})\b)"
+            r"|(?P<ordinal>\bke-(?P<ord>\d+)\b)"
+            r"|(?P<number>(?<![\w.,])(?P<int>\d{1,3}(?:\.\d{3})+|\d+)(?:,(?P<frac>\d+))?(?![\w])(?P<pct>\s?%)?)"
+            r"|(?P<abbr>\b" + abbreviations + r"\b)"
+            r"|(?P<xml>[&<>])"
+        )
+        self.build = lru_cache(maxsize=cache_size)(self._build)
+
+    def _render(self, match, ssml):
+        kind = match.lastgroup
+        if kind == "xml":
+            return escape(match.group()) if ssml else match.group()
+        if kind == "abbr":
+            word = match.group()
+            spoken = self.lexicon[word]
+            return f"<sub alias={quoteattr(spoken)}>{escape(word)}</sub>" if ssml else spoken
+        if kind == "date":
+            month = int(match.group("m"))
+            if not 1 <= month <= 12:
+                return match.group()
+            return f"{terbilang(int(match.group('d')))} {_MONTHS[month - 1]} {terbilang(int(match.group('y')))}"
+        if kind == "time":
+            minutes = int(match.group("mm"))
+            spoken = "pukul " + terbilang(int(match.group("hh")))
+            return spoken + (" lewat " + terbilang(minutes) + " menit" if minutes else "")
+        if kind == "ordinal":
+            n = int(match.group("ord"))
+            return "pertama" if n == 1 else "ke" + terbilang(n)
+        digits = match.group("int").replace(".", "")
+        if len(digits) > 15:
+            # Phone or ID numbers: read digit by digit
+            spoken = " ".join(_DIGITS[int(c)] for c in digits)
+        else:
+            spoken = terbilang(int(digits))
+        if match.group("frac"):
+            spoken += " koma " + " ".join(_DIGITS[int(c)] for c in match.group("frac"))
+        if match.group("pct"):
+            spoken += " persen"
+        return spoken
+
+    def normalize(self, text):
+        """Plain-text spoken form, cheap enough for streaming token output"""
+        return self._pattern.sub(lambda m: self._render(m, False), text)
+
+    def fragment(self, text):
+        """Normalized, XML-escaped sentence body with <sub> aliases"""
+        return self._pattern.sub(lambda m: self._render(m, True), text)
+
+    def _build(self, sentence):
+        body = self.fragment(sentence)
+        if self.rate:
+            body = f'<prosody rate="{self.rate}">{body}</prosody>'
+        return (
+            '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="id-ID">'
+            f'<voice name="{self.voice}">{body}</voice></speak>'
+        )
+
+    def ssml(self, text):
+        """SSML document for text, cached on the whitespace-normalized sentence"""
+        return self.build(" ".join(text.split()))
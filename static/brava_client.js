@@ -0,0 +1,362 @@
+// Streaming pieces of the Brava web client: server-sent events over fetch(),
+// a conversation area that keeps only a window of messages in the DOM, and a
+// Web Audio playback queue. Loaded by the page as window.BravaClient; run it
+// with node for the perceived-latency and memory benchmark against a local
+// stub server (no browser needed):
+//
+//     node static/brava_client.js [TOKENS [TOKEN_MS [MESSAGES]]]
+(function (root, factory) {
+    if (typeof module === 'object' && module.exports) {
+        module.exports = factory();
+    } else {
+        root.BravaClient = factory();
+    }
+})(typeof self !== 'undefined' ? self : this, function () {
+    'use strict';
+
+    const LABELS = { user: 'Anda:', assistant: 'Brava:' };
+
+    // EventSource cannot POST or send the X-Turn-Id header, so the
+    // text/event-stream body of a fetch() response is parsed here
+    async function* readEvents(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let end;
+            while ((end = buffer.indexOf('\n\n')) >= 0) {
+                const data = buffer.slice(0, end).split('\n')
+                    .filter(line => line.startsWith('data:'))
+                    .map(line => line.slice(line[5] === ' ' ? 6 : 5))
+                    .join('\n');
+                buffer = buffer.slice(end + 2);
+                if (data) yield JSON.parse(data);
+            }
+        }
+    }
+
+    function decodeBase64(text) {
+        const binary = atob(text);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+        return bytes;
+    }
+
+    // Conversation area with at most `windowSize` messages in the DOM. Every
+    // message (up to `limit`) is kept as plain text and rendered again when
+    // the visitor scrolls back to it; text is set through text nodes, so
+    // nothing is parsed as HTML and streamed tokens only append to one node.
+    class Transcript {
+        constructor(container, options = {}) {
+            this.container = container;
+            this.document = options.document || container.ownerDocument;
+            this.windowSize = options.windowSize || 30;
+            this.limit = options.limit || 500;
+            this.step = Math.max(1, Math.floor(this.windowSize / 3));
+            this.messages = [];
+            // The rendered window is messages[start, end)
+            this.start = 0;
+            this.end = 0;
+            container.addEventListener('scroll', () => this._onScroll());
+        }
+
+        get rendered() {
+            return this.end - this.start;
+        }
+
+        add(role, text = '') {
+            const message = { role, text, node: null, bubble: null, body: null };
+            this.messages.push(message);
+            if (this.messages.length > this.limit) {
+                this._unmount(0);
+                this.messages.shift();
+                this.start = Math.max(0, this.start - 1);
+                this.end = Math.max(0, this.end - 1);
+            }
+            if (this.end === this.messages.length - 1) {
+                this._mount(this.end++, null);
+                while (this.rendered > this.windowSize) this._unmount(this.start++);
+            } else {
+                // Scrolled back in the history: a new message brings the latest ones into view
+                for (let i = this.start; i < this.end; i++) this._unmount(i);
+                this.end = this.messages.length;
+                this.start = Math.max(0, this.end - this.windowSize);
+                for (let i = this.start; i < this.end; i++) this._mount(i, null);
+            }
+            this.scrollToEnd();
+            return message;
+        }
+
+        append(message, delta) {
+            message.text += delta;
+            if (message.body) {
+                message.body.appendData(delta);
+                if (this.end === this.messages.length) this.scrollToEnd();
+            }
+        }
+
+        settle(message, text) {
+            if (message.text === text) return;
+            message.text = text;
+            if (message.body) message.body.data = text;
+        }
+
+        scrollToEnd() {
+            this.container.scrollTop = this.container.scrollHeight;
+        }
+
+        _mount(index, before) {
+            const message = this.messages[index];
+            const doc = this.document;
+            const node = doc.createElement('div');
+            node.className = 'conversation';
+            const bubble = doc.createElement('div');
+            bubble.className = `message ${message.role}-message`;
+            const label = doc.createElement('div');
+            label.className = `message-label ${message.role}-label`;
+            label.appendChild(doc.createTextNode(LABELS[message.role] || message.role));
+            const body = doc.createElement('div');
+            message.body = doc.createTextNode(message.text);
+            body.appendChild(message.body);
+            bubble.appendChild(label);
+            bubble.appendChild(body);
+            node.appendChild(bubble);
+            this.container.insertBefore(node, before);
+            message.node = node;
+            message.bubble = bubble;
+        }
+
+        _unmount(index) {
+            const message = this.messages[index];
+            if (message.node) message.node.remove();
+            message.node = message.bubble = message.body = null;
+        }
+
+        _onScroll() {
+            const area = this.container;
+            if (area.scrollTop < 40 && this.start > 0) {
+                // Render earlier messages above, keeping the visible ones in place
+                const height = area.scrollHeight;
+                for (let n = 0; n < this.step && this.start > 0; n++) {
+                    this.start--;
+                    this._mount(this.start, this.messages[this.start + 1].node);
+                }
+                while (this.rendered > this.windowSize) this._unmount(--this.end);
+                area.scrollTop += area.scrollHeight - height;
+            } else if (area.scrollTop + area.clientHeight > area.scrollHeight - 40 && this.end < this.messages.length) {
+                for (let n = 0; n < this.step && this.end < this.messages.length; n++) this._mount(this.end++, null);
+                const height = area.scrollHeight;
+                while (this.rendered > this.windowSize) this._unmount(this.start++);
+                area.scrollTop -= height - area.scrollHeight;
+            }
+        }
+    }
+
+    // Reply audio scheduled back to back on one AudioContext, chunk by chunk,
+    // instead of one <audio> element with a data: URL per reply
+    class AudioQueue {
+        constructor(context) {
+            this.context = context;
+            this.nextTime = 0;
+            this.sources = new Set();
+            this.onidle = null;
+        }
+
+        static create() {
+            const Context = typeof window !== 'undefined' && (window.AudioContext || window.webkitAudioContext);
+            return Context ? new AudioQueue(new Context()) : null;
+        }
+
+        get playing() {
+            return this.sources.size > 0;
+        }
+
+        // Seconds of audio scheduled but not yet played
+        get buffered() {
+            return Math.max(0, this.nextTime - this.context.currentTime);
+        }
+
+        enqueuePcm16(bytes, sampleRate) {
+            const samples = new Int16Array(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + (bytes.byteLength & ~1)));
+            const buffer = this.context.createBuffer(1, samples.length, sampleRate);
+            const channel = buffer.getChannelData(0);
+            for (let i = 0; i < samples.length; i++) channel[i] = samples[i] / 32768;
+            return this.enqueueBuffer(buffer);
+        }
+
+        async enqueueEncoded(bytes) {
+            const buffer = await this.context.decodeAudioData(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.byteLength));
+            return this.enqueueBuffer(buffer);
+        }
+
+        enqueueBuffer(buffer) {
+            if (this.context.state === 'suspended') this.context.resume();
+            const source = this.context.createBufferSource();
+            source.buffer = buffer;
+            source.connect(this.context.destination);
+            // A small lead keeps the first chunk from being clipped
+            const startAt = Math.max(this.context.currentTime + 0.02, this.nextTime);
+            source.start(startAt);
+            this.nextTime = startAt + buffer.duration;
+            this.sources.add(source);
+            source.onended = () => {
+                this.sources.delete(source);
+                if (!this.sources.size && this.onidle) this.onidle();
+            };
+            return startAt;
+        }
+
+        stop() {
+            for (const source of this.sources) {
+                source.onended = null;
+                source.stop();
+            }
+            this.sources.clear();
+            this.nextTime = 0;
+        }
+    }
+
+    // Perceived-latency marks of one turn, in ms since it started
+    class TurnMetrics {
+        constructor(now = () => performance.now()) {
+            this.now = now;
+            this.started = now();
+            this.marks = {};
+        }
+
+        mark(name) {
+            if (!(name in this.marks)) this.marks[name] = Math.round(this.now() - this.started);
+            return this.marks[name];
+        }
+    }
+
+    // Client memory as far as the browser tells: JS heap (Chrome only) and DOM size
+    function clientMemory(transcript) {
+        const heap = typeof performance !== 'undefined' && performance.memory;
+        return {
+            heap_mb: heap ? Math.round(heap.usedJSHeapSize / 2 ** 20 * 10) / 10 : null,
+            messages: transcript.messages.length,
+            rendered: transcript.rendered,
+        };
+    }
+
+    return { readEvents, decodeBase64, Transcript, AudioQueue, TurnMetrics, clientMemory };
+});
+
+
+if (typeof module === 'object' && require.main === module) {
+    // Benchmark: a stub server streams a reply as /generate-response-stream
+    // does, into a Transcript on a minimal DOM stand-in
+    const http = require('http');
+    const { readEvents, Transcript, TurnMetrics } = module.exports;
+    const [tokens, tokenMs, messageCount] = process.argv.slice(2).map(Number);
+    const TOKENS = tokens || 60;
+    const TOKEN_MS = tokenMs || 25;
+    const MESSAGES = messageCount || 5000;
+
+    class FakeNode {
+        constructor(tagName, data = '') {
+            this.tagName = tagName;
+            this.data = data;
+            this.childNodes = [];
+            this.parentNode = null;
+            this.className = '';
+            this.scrollTop = 0;
+            this.clientHeight = 400;
+        }
+        get scrollHeight() {
+            return 60 * this.childNodes.length;
+        }
+        appendChild(node) {
+            return this.insertBefore(node, null);
+        }
+        insertBefore(node, before) {
+            if (node.parentNode) node.remove();
+            const index = before ? this.childNodes.indexOf(before) : -1;
+            if (index < 0) this.childNodes.push(node);
+            else this.childNodes.splice(index, 0, node);
+            node.parentNode = this;
+            return node;
+        }
+        remove() {
+            if (!this.parentNode) return;
+            const siblings = this.parentNode.childNodes;
+            siblings.splice(siblings.indexOf(this), 1);
+            this.parentNode = null;
+        }
+        appendData(text) {
+            this.data += text;
+        }
+        addEventListener(type, listener) {
+            this.listener = listener;
+        }
+    }
+    const fakeDocument = {
+        createElement: tagName => new FakeNode(tagName),
+        createTextNode: text => new FakeNode('#text', text),
+    };
+    const countNodes = node => 1 + node.childNodes.reduce((n, child) => n + countNodes(child), 0);
+    const heapMb = () => {
+        if (global.gc) global.gc();
+        return process.memoryUsage().heapUsed / 2 ** 20;
+    };
+
+    const words = 'Fakultas Ilmu Komputer punya program studi Teknik Informatika dan Sistem Informasi'.split(' ');
+    const server = http.createServer((request, response) => {
+        response.writeHead(200, { 'Content-Type': 'text/event-stream' });
+        let sent = 0;
+        const reply = [];
+        const timer = setInterval(() => {
+            if (sent < TOKENS) {
+                const text = words[sent++ % words.length] + ' ';
+                reply.push(text);
+                response.write(`data: ${JSON.stringify({ type: 'token', text })}\n\n`);
+            } else {
+                clearInterval(timer);
+                response.end(`data: ${JSON.stringify({ type: 'done', reply: reply.join('') })}\n\n`);
+            }
+        }, TOKEN_MS);
+    });
+
+    server.listen(0, '127.0.0.1', async () => {
+        const url = `http://127.0.0.1:${server.address().port}/generate-response-stream`;
+        const area = new FakeNode('div');
+        const transcript = new Transcript(area, { document: fakeDocument });
+        const metrics = new TurnMetrics();
+        const message = transcript.add('assistant');
+        const response = await fetch(url, { method: 'POST' });
+        for await (const event of readEvents(response)) {
+            if (event.type === 'token') {
+                transcript.append(message, event.text);
+                metrics.mark('first_token');
+            } else if (event.type === 'done') {
+                transcript.settle(message, event.reply);
+                metrics.mark('reply');
+            }
+        }
+        server.close();
+
+        // A long-running kiosk: the DOM must stay bounded however long the history gets
+        const before = heapMb();
+        for (let i = 0; i < MESSAGES; i++) {
+            transcript.add(i % 2 ? 'assistant' : 'user', `pesan ${i} `.repeat(20));
+        }
+        const scrolled = transcript.rendered;
+        area.scrollTop = 0;
+        area.listener();
+        console.log(JSON.stringify({
+            tokens: TOKENS,
+            first_token_ms: metrics.marks.first_token,
+            whole_reply_ms: metrics.marks.reply,
+            perceived_saving_ms: metrics.marks.reply - metrics.marks.first_token,
+            messages: transcript.messages.length,
+            rendered: scrolled,
+            window_after_scroll_up: [transcript.start, transcript.end],
+            dom_nodes: countNodes(area),
+            heap_mb_added: Math.round((heapMb() - before) * 10) / 10,
+        }));
+    });
+}
@@ -0,0 +1,286 @@
+import sys
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import audio_dsp
+
+logger = logging.getLogger(__name__)
+
+
+def mouth_value(block):
+    """Mouth opening in [0, 1] from int16-scale samples.
+
+    Same curve as the original lipsync_wav (norm / 1024 / 500), expressed in
+    RMS so it does not depend on the block size.
+    """
+    if block.size == 0:
+        return 0.0
+    rms = float(np.sqrt(np.mean(np.square(block, dtype=np.float64))))
+    return min(rms / 16000, 1.0)
+
+
+class ClockPlayer:
+    """Null device that blocks for the audio's duration and records start time"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started_at = None
+        self.samples = 0
+
+    def write(self, pcm):
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+        n = len(pcm) // 2
+        self.samples += n
+        time.sleep(n / self.rate)
+
+    def close(self):
+        pass
+
+
+class StreamingLipsync:
+    """Plays TTS audio and drives the mouth as chunks arrive.
+
+    feed() accepts 16-bit mono PCM at `rate_in` from any thread, e.g. the
+    per-sentence chunks of ParallelTTS.stream(). Chunks are resampled and
+    loudness-normalized block by block, then held in a jitter buffer until
+    `prebuffer_ms` of audio is queued; after that each output block is sent to
+    the mouth right before it is written to the player, so both start together.
+    """
+
+    def __init__(self, player, send_mouth, rate_in, rate_out, block_ms=20, prebuffer_ms=60,
+                 target=-16.0):
+        self.player = player
+        self.send_mouth = send_mouth
+        self.block = int(rate_out * block_ms / 1000)
+        self.prebuffer_blocks = max(1, prebuffer_ms // block_ms)
+        self.resampler = audio_dsp.Resampler(rate_in, rate_out)
+        self.normalizer = audio_dsp.LoudnessNormalizer(rate_out, target=target)
+        self._blocks = queue.Queue()
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.state = "created"  # created -> queued -> playing -> done | cancelled
+        self.first_chunk_at = None
+        self.playback_started_at = None
+        self.underruns = 0
+        self.cancelled = False
+
+    def start(self, pool=None):
+        """Play on a LipsyncPool worker, or on a thread of its own without one"""
+        self.state = "queued"
+        if pool is not None:
+            pool.submit(self)
+        else:
+            threading.Thread(target=self._run, name="lipsync", daemon=True).start()
+        return self
+
+    def feed(self, pcm):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+        with self._lock:
+            self._push(self.resampler.process(samples))
+
+    def close(self):
+        """Mark end of stream; playback drains what is buffered"""
+        with self._lock:
+            self._push(self.resampler.flush(), final=True)
+        self._blocks.put(None)
+
+    def cancel(self):
+        """Stop playback now (turn cancelled or synthesizer stalled); safe from any thread"""
+        self.cancelled = True
+        # Drop what is queued and wake the playback thread wherever it waits
+        while True:
+            try:
+                self._blocks.get_nowait()
+            except queue.Empty:
+                break
+        self._blocks.put(None)
+
+    def join(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def startup_latency(self):
+        """Seconds from the first TTS byte to the first played block"""
+        if self.first_chunk_at is None or self.playback_started_at is None:
+            return None
+        return self.playback_started_at - self.first_chunk_at
+
+    def _push(self, samples, final=False):
+        samples = np.concatenate((self._pending, self.normalizer.process(samples)))
+        n = samples.size // self.block
+        for i in range(n):
+            self._blocks.put(samples[i * self.block:(i + 1) * self.block])
+        self._pending = samples[n * self.block:]
+        if final and self._pending.size:
+            self._blocks.put(self._pending)
+            self._pending = np.zeros(0, dtype=np.float32)
+
+    def _run(self):
+        self.state = "playing"
+        buffered = []
+        finished = False
+        # Jitter buffer: wait for a few blocks (or the end) before starting playback
+        while len(buffered) < self.prebuffer_blocks:
+            block = self._blocks.get()
+            if block is None:
+                finished = True
+                break
+            buffered.append(block)
+        try:
+            self.playback_started_at = time.perf_counter()
+            for block in buffered:
+                if self.cancelled:
+                    return
+                self._play(block)
+            while not finished and not self.cancelled:
+                try:
+                    block = self._blocks.get(timeout=0.05)
+                except queue.Empty:
+                    # Synthesizer fell behind: close the mouth until audio resumes
+                    self.underruns += 1
+                    self._mouth(0.0)
+                    block = self._blocks.get()
+                if block is None:
+                    break
+                self._play(block)
+        finally:
+            # Whatever the mouth or the player does, the turn waiting on _done must be released
+            self._mouth(0.0)
+            try:
+                self.player.close()
+            finally:
+                self.state = "cancelled" if self.cancelled else "done"
+                self._done.set()
+
+    def discard(self):
+        """Finish a job that will never run (its pool shut down)"""
+        self.cancelled = True
+        self.state = "cancelled"
+        self.player.close()
+        self._done.set()
+
+    def _mouth(self, value):
+        try:
+            self.send_mouth(value)
+        except Exception as e:
+            logger.debug("Mouth update failed: %s", e)
+
+    def _play(self, block):
+        pcm = (np.clip(block, -1.0, 32767 / 32768) * 32768).astype(np.int16)
+        self._mouth(mouth_value(pcm))
+        self.player.write(pcm.tobytes())
+
+
+class LipsyncPool:
+    """Fixed set of playback workers shared by every reply.
+
+    Jobs beyond `workers` wait in FIFO order instead of each reply spawning a
+    thread; shutdown() cancels what is playing and discards what is queued.
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lipsync")
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.cancelled = 0
+
+    def submit(self, lipsync):
+        with self._lock:
+            self._jobs.add(lipsync)
+        future = self._executor.submit(lipsync._run)
+        future.add_done_callback(lambda f: self._finished(lipsync, f))
+        return future
+
+    def _finished(self, lipsync, future):
+        if future.cancelled():
+            lipsync.discard()
+        with self._lock:
+            self._jobs.discard(lipsync)
+            if lipsync.state == "cancelled":
+                self.cancelled += 1
+            else:
+                self.completed += 1
+
+    def join(self, timeout=None):
+        """Wait for every submitted job to finish"""
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.join(timeout)
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs]
+            return {
+                "workers": self.workers,
+                "playing": states.count("playing"),
+                "queued": states.count("queued"),
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+            }
+
+
+class TimedFakeSynthesizer:
+    """Emits PCM chunks on a timer, like a streaming synthesizer, for tests and benchmarks"""
+
+    def __init__(self, first_byte=0.2, chunk_ms=100, realtime_factor=0.3, rate=16000):
+        self.first_byte = first_byte
+        self.chunk = int(rate * chunk_ms / 1000)
+        self.interval = chunk_ms / 1000 * realtime_factor
+        self.rate = rate
+
+    def stream(self, seconds, on_chunk, on_close):
+        def run():
+            time.sleep(self.first_byte)
+            t = np.arange(int(seconds * self.rate)) / self.rate
+            audio = (8000 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))).astype(np.int16)
+            for start in range(0, audio.size, self.chunk):
+                on_chunk(audio[start:start + self.chunk].tobytes())
+                time.sleep(self.interval)
+            on_close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+def benchmark(seconds=3.0, rate_out=48000):
+    mouth = []
+    player = ClockPlayer(rate_out)
+    lipsync = StreamingLipsync(player, lambda value: mouth.append((time.perf_counter(), value)),
+                               16000, rate_out).start()
+    fake = TimedFakeSynthesizer()
+    start = time.perf_counter()
+    fake.stream(seconds, lipsync.feed, lipsync.close)
+    lipsync.join()
+    first_mouth = next(t for t, value in mouth if value > 0)
+    return {
+        "first_tts_byte_ms": round(1000 * (lipsync.first_chunk_at - start), 1),
+        "startup_latency_ms": round(1000 * lipsync.startup_latency, 1),
+        "mouth_vs_audio_ms": round(1000 * (first_mouth - player.started_at), 1),
+        "underruns": lipsync.underruns,
+        "played_seconds": round(player.samples / rate_out, 2),
+    }
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    print(benchmark(seconds))
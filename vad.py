@@ -0,0 +1,139 @@
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def frame_features(frames):
+    """Energy (dBFS), zero-crossing rate and spectral flatness per frame row"""
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    power = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]), axis=1)) ** 2 + 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy, zcr, flatness
+
+
+class VoiceActivityDetector:
+    """Streaming energy + zero-crossing + spectral flatness VAD.
+
+    Features are computed for every frame of a block at once; a small state
+    machine with onset frames and a hangover turns frame decisions into speech
+    segments. Speech (with `pad_ms` of lead-in) is returned from process(),
+    everything else is dropped. Subscribers get "speech_start" and
+    "speech_end" events with the sample position of the boundary.
+    """
+
+    def __init__(self, rate=SAMPLE_RATE, frame_ms=20, onset_frames=3, hangover_ms=300,
+                 pad_ms=200, margin_db=9.0, max_flatness=0.45):
+        self.rate = rate
+        self.frame = int(rate * frame_ms / 1000)
+        self.onset_frames = onset_frames
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.margin_db = margin_db
+        self.max_flatness = max_flatness
+        self._pad = deque(maxlen=max(1, pad_ms // frame_ms))
+        self._subscribers = {"speech_start": [], "speech_end": []}
+        self.reset()
+
+    def reset(self):
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._position = 0  # samples consumed, in whole frames
+        self._noise_db = None
+        self._run = 0  # consecutive speech-like frames
+        self._silence = 0  # consecutive non-speech frames while in speech
+        self.in_speech = False
+        self._pad.clear()
+
+    def subscribe(self, event, callback):
+        self._subscribers[event].append(callback)
+
+    def _emit(self, event, position):
+        for callback in self._subscribers[event]:
+            callback(event, position / self.rate)
+
+    def classify(self, frames):
+        energy, zcr, flatness = frame_features(frames)
+        if self._noise_db is None:
+            self._noise_db = float(np.percentile(energy, 10))
+        # Noise has a flat spectrum or very high zero-crossing rate; voiced speech has neither
+        speechy = (flatness < self.max_flatness) & (zcr < 0.35)
+        return energy, (energy > self._noise_db + self.margin_db) & speechy
+
+    def process(self, samples):
+        """Feed float32 samples; returns the speech audio to forward (may be empty)"""
+        samples = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        n = samples.size // self.frame
+        self._pending = samples[n * self.frame:]
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = samples[:n * self.frame].reshape(n, self.frame)
+        energy, decisions = self.classify(frames)
+
+        out = []
+        for i in range(n):
+            position = self._position + i * self.frame
+            if not self.in_speech:
+                # Slowly track the noise floor while nobody is talking
+                self._noise_db = 0.95 * self._noise_db + 0.05 * float(energy[i])
+                self._run = self._run + 1 if decisions[i] else 0
+                self._pad.append(frames[i])
+                if self._run >= self.onset_frames:
+                    self.in_speech = True
+                    self._silence = 0
+                    start = position - (len(self._pad) - 1) * self.frame
+                    self._emit("speech_start", start)
+                    out.extend(self._pad)
+                    self._pad.clear()
+            else:
+                out.append(frames[i])
+                self._silence = 0 if decisions[i] else self._silence + 1
+                if self._silence >= self.hangover_frames:
+                    self.in_speech = False
+                    self._run = 0
+                    self._emit("speech_end", position + self.frame)
+        self._position += n * self.frame
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    @property
+    def latency(self):
+        """Seconds between the true speech onset and the speech_start event"""
+        return self.onset_frames * self.frame / self.rate
+
+
+def trim_pcm16(pcm, rate=SAMPLE_RATE):
+    """Drop non-speech from a whole int16 recording before sending it to STT"""
+    vad = VoiceActivityDetector(rate)
+    speech = vad.process(np.frombuffer(pcm, dtype=np.int16) / 32768.0)
+    return (np.clip(speech, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def benchmark(samples, rate, block=1600, label=""):
+    vad = VoiceActivityDetector(rate)
+    segments = []
+    vad.subscribe("speech_start", lambda event, t: segments.append([t, None]))
+    vad.subscribe("speech_end", lambda event, t: segments[-1].__setitem__(1, t))
+    start = time.process_time()
+    kept = sum(vad.process(samples[i:i + block]).size for i in range(0, samples.size, block))
+    cpu = time.process_time() - start
+    seconds = samples.size / rate
+    print(f"{label}: {seconds:.1f}s audio, CPU {1000 * cpu / seconds:.2f} ms per audio second, "
+          f"kept {100 * kept / samples.size:.0f}%, onset latency {1000 * vad.latency:.0f} ms, "
+          f"{len(segments)} segments")
+    return segments
+
+
+if __name__ == '__main__':
+    import audio_io
+    path = sys.argv[1] if len(sys.argv) > 1 else "audio.wav"
+    info, data = audio_io.open_wav(path)
+    speech = audio_io.to_float32(data, info).mean(axis=1)
+    benchmark(speech, info.sample_rate, label=path)
+    rng = np.random.default_rng(0)
+    benchmark((0.05 * rng.standard_normal(info.sample_rate * 10)).astype(np.float32),
+              info.sample_rate, label="white noise")
+    noisy = speech + (0.01 * rng.standard_normal(speech.size)).astype(np.float32)
+    benchmark(noisy, info.sample_rate, label=f"{path} + noise")
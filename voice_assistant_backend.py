@@ -6,6 +6,7 @@ from openai import AzureOpenAI
 from dotenv import load_dotenv
 import base64
 from io import BytesIO
+from language_id import LANGUAGES, language_for_locale
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +25,18 @@ client = AzureOpenAI(
     azure_endpoint=AZURE_OPENAI_ENDPOINT,
 )
 
+# Visitors may speak any of these; the language is detected at the start of each
+# utterance and the reply voice follows it
+CANDIDATE_LANGUAGES = [c.strip() for c in os.getenv("LANGUAGES", "en,id").split(",") if c.strip()]
+recognition_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
+auto_detect_config = speechsdk.languageconfig.AutoDetectSourceLanguageConfig(
+    languages=[LANGUAGES[c]["locale"] for c in CANDIDATE_LANGUAGES])
+
+def request_language(data):
+    """Language the client was told by /recognize; each request carries its own"""
+    language = (data or {}).get('language')
+    return language if language in CANDIDATE_LANGUAGES else CANDIDATE_LANGUAGES[0]
+
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # Disable caching
 
@@ -96,6 +109,12 @@ HTML_PAGE = '''
     </div>
     
     <script>
+        // Ask for Opus when the browser can play it; it is ~10x smaller than WAV
+        function supportedCodecs() {
+            const probe = document.createElement('audio');
+            return probe.canPlayType('audio/ogg; codecs=opus') ? ['opus', 'wav'] : ['wav'];
+        }
+        
         document.getElementById('activateBtn').addEventListener('click', async function() {
             document.querySelectorAll('audio').forEach(audio => audio.remove());
             
@@ -116,6 +135,7 @@ HTML_PAGE = '''
                 }
                 
                 const userInput = recognitionData.text;
+                const language = recognitionData.language;
                 
                 // Display user input
                 conversationDiv.innerHTML += `
@@ -158,7 +178,7 @@ HTML_PAGE = '''
                 const speechResponse = await fetch('/generate-speech', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ text: reply })
+                    body: JSON.stringify({ text: reply, language: language, codecs: supportedCodecs() })
                 });
                 
                 const speechData = await speechResponse.json();
@@ -179,8 +199,8 @@ HTML_PAGE = '''
                 audioElement.autoplay = true;
 
                 const source = document.createElement('source');
-                source.src = `data:audio/wav;base64,${speechData.audio}`;
-                source.type = 'audio/wav';
+                source.src = `data:${speechData.mime};base64,${speechData.audio}`;
+                source.type = speechData.mime;
 
                 audioElement.appendChild(source);
 
@@ -216,19 +236,21 @@ def index():
 @app.route('/recognize', methods=['POST'])
 def recognize():
     """Capture and transcribe speech from microphone"""
-    config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-    config.speech_recognition_language = "en-US"
     audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
-    recognizer = speechsdk.SpeechRecognizer(speech_config=config, audio_config=audio_config)
+    recognizer = speechsdk.SpeechRecognizer(speech_config=recognition_config,
+                                            auto_detect_source_language_config=auto_detect_config,
+                                            audio_config=audio_config)
     
     try:
         print("Listening...")
         result = recognizer.recognize_once_async().get()
         
         if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            locale = speechsdk.AutoDetectSourceLanguageResult(result).language
             return {
                 "success": True,
-                "text": result.text
+                "text": result.text,
+                "language": language_for_locale(locale) or CANDIDATE_LANGUAGES[0]
             }
         else:
             return {
@@ -286,6 +308,7 @@ def generate_speech():
     """Convert text to speech and return as base64"""
     data = request.json
     text = data.get('text', '')
+    codecs = data.get('codecs') or ['wav']
     
     if not text:
         return {
@@ -296,7 +319,15 @@ def generate_speech():
     try:
         # Configure speech synthesizer
         config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-        config.speech_synthesis_voice_name = "en-US-JennyNeural"
+        config.speech_synthesis_voice_name = LANGUAGES[request_language(data)]["voice"]
+        
+        # Let the service encode Opus directly when the client can play it
+        if 'opus' in codecs:
+            config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Ogg16Khz16BitMonoOpus)
+            mime = 'audio/ogg; codecs=opus'
+        else:
+            config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm)
+            mime = 'audio/wav'
         
         # Use in-memory stream instead of file
         stream = BytesIO()
@@ -316,7 +347,8 @@ def generate_speech():
             
             return {
                 "success": True,
-                "audio": audio_base64
+                "audio": audio_base64,
+                "mime": mime
             }
         else:
             return {
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import glob
+import logging
+
+import numpy as np
+
+import audio_io
+import audio_dsp
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME = 400  # 25 ms analysis window
+HOP = 160  # 10 ms hop
+
+
+def _mel_filterbank(n_mels=26, n_fft=512, rate=SAMPLE_RATE, fmin=60.0, fmax=7600.0):
+    def to_mel(f):
+        return 2595 * np.log10(1 + f / 700)
+
+    def to_hz(m):
+        return 700 * (10 ** (m / 2595) - 1)
+
+    edges = to_hz(np.linspace(to_mel(fmin), to_mel(fmax), n_mels + 2))
+    bins = np.floor((n_fft + 1) * edges / rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for i in range(n_mels):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        bank[i, left:center] = (np.arange(left, center) - left) / max(1, center - left)
+        bank[i, center:right] = (right - np.arange(center, right)) / max(1, right - center)
+    return bank
+
+
+_MEL = _mel_filterbank()
+_WINDOW = np.hamming(FRAME).astype(np.float32)
+_N_MFCC = 13
+_DCT = np.cos(np.pi / _MEL.shape[0] * (np.arange(_MEL.shape[0]) + 0.5)[None, :] * np.arange(_N_MFCC)[:, None]).astype(np.float32)
+
+
+def mfcc(samples):
+    """MFCCs (without c0) for float32 16 kHz samples, one row per 10 ms hop"""
+    if samples.size < FRAME:
+        return np.zeros((0, _N_MFCC - 1), dtype=np.float32)
+    n = 1 + (samples.size - FRAME) // HOP
+    index = np.arange(FRAME)[None, :] + HOP * np.arange(n)[:, None]
+    frames = samples[index] * _WINDOW
+    power = np.abs(np.fft.rfft(frames, 512)) ** 2
+    log_mel = np.log(power @ _MEL.T + 1e-8)
+    return (log_mel @ _DCT.T)[:, 1:]
+
+
+def _normalize(features):
+    # Cepstral mean/variance normalization makes templates robust to mic gain
+    return (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+
+
+def dtw_distance(template, window):
+    """Subsequence DTW: best match of template anywhere inside window, per frame.
+
+    Diagonal, vertical and horizontal steps are all allowed, so the spoken
+    phrase may be faster or slower than the template by any factor; the match
+    starts at any window frame for free.
+    """
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    acc = np.empty_like(cost)
+    acc[0] = cost[0]  # the match may start at any window frame
+    for i in range(1, cost.shape[0]):
+        prev = acc[i - 1]
+        entry = np.minimum(prev, np.concatenate(([np.inf], prev[:-1])))
+        # With horizontal steps acc[i, j] = cost[i, j] + min(entry[j], acc[i, j - 1]), i.e.
+        # min over k <= j of entry[k] + cost[i, k..j]: a running minimum over prefix sums
+        running = np.cumsum(cost[i])
+        acc[i] = running + np.minimum.accumulate(entry - (running - cost[i]))
+    return float(acc[-1].min()) / cost.shape[0]
+
+
+def load_templates(directory):
+    """Normalized MFCC templates from every WAV recording in directory"""
+    templates = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        templates.append(_normalize(mfcc(read_mono16k(path))))
+    if not templates:
+        raise FileNotFoundError(f"No wake word templates in {directory}")
+    return templates
+
+
+def read_mono16k(path):
+    info, samples = audio_io.open_wav(path)
+    mono = audio_io.to_float32(samples, info).mean(axis=1)
+    if info.sample_rate != SAMPLE_RATE:
+        resampler = audio_dsp.Resampler(info.sample_rate, SAMPLE_RATE)
+        mono = np.concatenate((resampler.process(mono), resampler.flush()))
+    return mono
+
+
+class RingBuffer:
+    """Fixed-size float32 ring buffer; reads return the newest samples in order"""
+
+    def __init__(self, size):
+        self.data = np.zeros(size, dtype=np.float32)
+        self.filled = 0
+        self._pos = 0
+
+    def extend(self, samples):
+        samples = samples[-self.data.size:]
+        end = self._pos + samples.size
+        if end <= self.data.size:
+            self.data[self._pos:end] = samples
+        else:
+            split = self.data.size - self._pos
+            self.data[self._pos:] = samples[:split]
+            self.data[:end - self.data.size] = samples[split:]
+        self._pos = end % self.data.size
+        self.filled = min(self.data.size, self.filled + samples.size)
+
+    def latest(self, n=None):
+        n = self.filled if n is None else min(n, self.filled)
+        index = (self._pos - n + np.arange(n)) % self.data.size
+        return self.data[index]
+
+    def clear(self):
+        self.filled = 0
+        self._pos = 0
+
+    def __len__(self):
+        return self.filled
+
+
+class WakeWordDetector:
+    """Spotter for "Halo Brava" over a ring buffer of 16 kHz mic frames.
+
+    Audio goes into a ring buffer holding `preroll` seconds. Every `check_every`
+    seconds the newest window is scored against the templates with DTW, unless
+    its energy is below the noise gate, which keeps idle CPU close to zero.
+    The threshold is a per-frame DTW distance; tune it with evaluate().
+    """
+
+    def __init__(self, templates, threshold=2.2, preroll=1.5, check_every=0.1,
+                 energy_gate=0.005, refractory=1.0):
+        self.templates = templates
+        self.threshold = threshold
+        self.window = int(max(len(t) for t in templates) * 1.3) * HOP + FRAME
+        self.ring = RingBuffer(max(int(preroll * SAMPLE_RATE), self.window))
+        self.check_every = int(check_every * SAMPLE_RATE)
+        self.energy_gate = energy_gate
+        self.refractory = int(refractory * SAMPLE_RATE)
+        self._since_check = 0
+        self._since_detect = self.refractory
+        self.last_score = None
+
+    def feed(self, samples):
+        """Add float32 samples; returns True when the wake word was just heard"""
+        samples = np.asarray(samples, dtype=np.float32)
+        self.ring.extend(samples)
+        self._since_check += samples.size
+        self._since_detect += samples.size
+        if self._since_check < self.check_every or len(self.ring) < self.window:
+            return False
+        self._since_check = 0
+        if self._since_detect < self.refractory:
+            return False
+
+        recent = self.ring.latest(self.window)
+        if np.sqrt(np.mean(recent ** 2)) < self.energy_gate:
+            return False
+        features = _normalize(mfcc(recent))
+        self.last_score = min(dtw_distance(t, features) for t in self.templates)
+        if self.last_score < self.threshold:
+            self._since_detect = 0
+            return True
+        return False
+
+    def preroll(self):
+        """Buffered audio (as int16 PCM bytes) to send ahead of the live stream"""
+        audio = self.ring.latest()
+        return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def evaluate(detector, clips_dir, block=1600):
+    """Offline run over labeled clips: positives/*.wav and negatives/*.wav"""
+    report = {"audio_seconds": 0.0, "cpu_seconds": 0.0, "true_accepts": 0, "positives": 0,
+              "false_accepts": 0, "negative_hours": 0.0}
+    for label in ("positives", "negatives"):
+        for path in sorted(glob.glob(os.path.join(clips_dir, label, "*.wav"))):
+            audio = read_mono16k(path)
+            detector.ring.clear()
+            detector._since_detect = detector.refractory
+            start = time.process_time()
+            hits = sum(detector.feed(audio[i:i + block]) for i in range(0, audio.size, block))
+            report["cpu_seconds"] += time.process_time() - start
+            report["audio_seconds"] += audio.size / SAMPLE_RATE
+            if label == "positives":
+                report["positives"] += 1
+                report["true_accepts"] += int(hits > 0)
+            else:
+                report["false_accepts"] += hits
+                report["negative_hours"] += audio.size / SAMPLE_RATE / 3600
+    report["cpu_ms_per_audio_second"] = 1000 * report["cpu_seconds"] / max(report["audio_seconds"], 1e-9)
+    report["detection_rate"] = report["true_accepts"] / max(report["positives"], 1)
+    report["false_accepts_per_hour"] = report["false_accepts"] / max(report["negative_hours"], 1e-9)
+    return report
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("usage: python wakeword.py TEMPLATES_DIR CLIPS_DIR")
+        sys.exit(1)
+    detector = WakeWordDetector(load_templates(sys.argv[1]))
+    for key, value in evaluate(detector, sys.argv[2]).items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")